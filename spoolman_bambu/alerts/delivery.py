@@ -0,0 +1,137 @@
+"""Asynchronous webhook delivery of alerts.
+
+Alerts are emitted on the MQTT threads, which must never wait on a webhook. They are handed to a bounded queue on the
+event loop, oldest dropped first once it is full, and a worker posts them to every webhook in batches. Alerts of the
+same key queued together are deduplicated to the latest, and a failed post is retried with exponential backoff.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_BATCH_SIZE = 50
+# How long to wait for more alerts to batch with the first, in seconds
+DEFAULT_BATCH_WAIT = 2
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 2
+
+
+def deduplicate(alerts: list[dict]) -> list[dict]:
+    """Keep only the latest alert of each key, in the order the keys were first queued."""
+    latest = {}
+    for alert in alerts:
+        latest.pop(alert["key"], None)
+        latest[alert["key"]] = alert
+    return list(latest.values())
+
+
+class WebhookDelivery:
+    def __init__(
+        self,
+        urls: list[str],
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_wait: float = DEFAULT_BATCH_WAIT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+        timeout: float = 5,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.urls = urls
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.transport = transport
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {"queued": 0, "sent": 0, "dropped": 0, "failed": 0}
+
+    def set_urls(self, urls: list[str]) -> None:
+        """Replace the webhooks, batches already being posted go to the old ones."""
+        self.urls = urls
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "pending": self.queue.qsize() if self.queue is not None else 0}
+
+    def _put(self, alert: dict) -> None:
+        if self.queue.full():
+            # The oldest alert is the most likely to have been superseded
+            self.queue.get_nowait()
+            self.stats["dropped"] += 1
+            logger.warning("Alert delivery queue is full, dropped the oldest alert")
+        self.queue.put_nowait(alert)
+        self.stats["queued"] += 1
+
+    def enqueue(self, alert: dict) -> None:
+        """Queue an alert for delivery, safe to call from any thread and never waits."""
+        if self.loop is None or len(self.urls) == 0:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, alert)
+        except RuntimeError:
+            # The loop has been closed during shutdown
+            logger.debug("Alert %s not queued, delivery has stopped", alert["key"])
+
+    async def post(self, client: httpx.AsyncClient, url: str, alerts: list[dict]) -> bool:
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                await asyncio.sleep(self.retry_delay * (2 ** (attempt - 1)))
+            try:
+                response = await client.post(url, json={"alerts": alerts}, timeout=self.timeout)
+                if response.status_code < 300:
+                    return True
+                logger.warning("Alert webhook %s responded %s", url, response.status_code)
+                # Only retry errors which may be temporary
+                if response.status_code < 500 and response.status_code != 429:
+                    return False
+            except httpx.HTTPError as e:
+                logger.warning("Alert webhook %s unreachable: %s", url, e)
+        return False
+
+    async def next_batch(self) -> list[dict]:
+        alerts = [await self.queue.get()]
+        deadline = self.loop.time() + self.batch_wait
+        while len(alerts) < self.batch_size:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                alerts.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return deduplicate(alerts)
+
+    async def run(self) -> None:
+        """Deliver queued alerts until cancelled."""
+        async with httpx.AsyncClient(transport=self.transport) as client:
+            while True:
+                alerts = await self.next_batch()
+                results = await asyncio.gather(*(self.post(client, url, alerts) for url in self.urls))
+                for url, sent in zip(self.urls, results):
+                    if sent:
+                        self.stats["sent"] += len(alerts)
+                    else:
+                        self.stats["failed"] += len(alerts)
+                        logger.error("Failed to deliver %s alerts to webhook %s", len(alerts), url)
+
+    def start(self) -> None:
+        """Start delivering, must be called from the event loop."""
+        if self.task is None:
+            self.loop = asyncio.get_running_loop()
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+            if len(self.urls) > 0:
+                self.task = asyncio.create_task(self.run())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,220 @@
+"""Threshold alert rules, evaluated incrementally as tray, AMS and printer values change.
+
+- low_stock: a tray's remaining grams or % is at or below its threshold
+- material_low_stock: the grams remaining of a material across the fleet is at or below its threshold
+- humidity: an AMS unit's humidity is above its limit
+- offline: a printer hasn't reported for longer than its limit
+
+Each rule is only evaluated when the value it watches changes, offline being the exception as it depends on the time.
+An alert is only emitted when it starts firing or is resolved, never while it stays in the same state, and it is only
+resolved once the value is back past the threshold by the hysteresis margin, so a value hovering around the threshold
+doesn't flap.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from spoolman_bambu import events
+
+logger = logging.getLogger(__name__)
+
+ALERT_LOW_STOCK = "low_stock"
+ALERT_MATERIAL_LOW_STOCK = "material_low_stock"
+ALERT_HUMIDITY = "humidity"
+ALERT_OFFLINE = "offline"
+
+STATE_FIRING = "firing"
+STATE_RESOLVED = "resolved"
+
+# An alert is resolved once its value is this fraction of the threshold back past it
+HYSTERESIS = 0.1
+
+
+@dataclass(frozen=True)
+class AlertRules:
+    """Thresholds of the rules, 0 disables a rule."""
+
+    low_stock_grams: float = 0
+    low_stock_percent: float = 0
+    material_low_stock_grams: float = 0
+    humidity: float = 0
+    offline_minutes: float = 0
+
+
+def is_low(value: float, threshold: float, firing: bool) -> bool:
+    """Check if a value is low, once firing it has to rise past the threshold by the hysteresis margin to clear."""
+    if threshold <= 0:
+        return False
+    return value <= threshold * (1 + HYSTERESIS) if firing else value <= threshold
+
+
+def is_high(value: float, limit: float, firing: bool) -> bool:
+    """Check if a value is high, once firing it has to drop past the limit by the hysteresis margin to clear."""
+    if limit <= 0:
+        return False
+    return value > limit * (1 - HYSTERESIS) if firing else value > limit
+
+
+class AlertEngine:
+    def __init__(self, rules: AlertRules, emit: Optional[Callable[[dict], None]] = None):
+        """
+        Evaluate the alert rules.
+
+        :param rules: The thresholds.
+        :param emit: Called with each alert that starts firing or is resolved, from the thread that evaluated it. Every
+            such alert is also published as an event.
+        """
+        self.rules = rules
+        self.emit = emit
+        # Evaluated from every printer's MQTT thread and the offline check
+        self.lock = threading.Lock()
+        # key -> the firing alert
+        self.firing: dict[str, dict] = {}
+        # (printer id, slot) -> the material of the tray, so the material a swapped out tray was is evaluated too
+        self.tray_materials: dict[tuple, str] = {}
+
+    def set_rules(self, rules: AlertRules) -> None:
+        """Replace the thresholds, firing alerts are re-evaluated against them as new values are reported."""
+        with self.lock:
+            self.rules = rules
+
+    def _set(self, key: str, firing: bool, alert: dict) -> Optional[dict]:
+        """Record the state of an alert, returning it if it started firing or was resolved."""
+        with self.lock:
+            current = self.firing.get(key)
+            if firing == (current is not None):
+                if current is not None:
+                    # Still firing, keep the latest value for the API without emitting it again
+                    current["value"] = alert["value"]
+                return None
+            if firing:
+                alert = {**alert, "key": key, "state": STATE_FIRING, "since": time.time()}
+                self.firing[key] = alert
+            else:
+                alert = {**current, "value": alert["value"], "state": STATE_RESOLVED, "resolved": time.time()}
+                del self.firing[key]
+
+        logger.info("Alert %s %s: %s", key, alert["state"], alert["value"])
+        events.publish(events.EVENT_ALERT, alert)
+        if self.emit is not None:
+            self.emit(alert)
+        return alert
+
+    def _is_firing(self, key: str) -> bool:
+        with self.lock:
+            return key in self.firing
+
+    def evaluate_tray(self, printer_id: str, tray) -> list[str]:
+        """Evaluate the low stock rule of a changed tray, returning the materials whose fleet total to re-evaluate."""
+        key = f"{ALERT_LOW_STOCK}:{printer_id}:{tray.slot}"
+        materials = []
+        with self.lock:
+            previous_material = self.tray_materials.pop((printer_id, tray.slot), None)
+        if previous_material is not None:
+            materials.append(previous_material)
+
+        # Nothing is known about an empty slot or a spool without a reading, so an alert for the slot is resolved
+        if tray.is_empty() or tray.remain < 0:
+            self._set(key, False, {"value": None})
+            return materials
+
+        with self.lock:
+            self.tray_materials[(printer_id, tray.slot)] = tray.tray_type
+        if tray.tray_type not in materials:
+            materials.append(tray.tray_type)
+
+        grams = round(tray.remain / 100 * tray.weight, 2)
+        firing = self._is_firing(key)
+        low = is_low(grams, self.rules.low_stock_grams, firing) or is_low(
+            tray.remain, self.rules.low_stock_percent, firing
+        )
+        self._set(
+            key,
+            low,
+            {
+                "type": ALERT_LOW_STOCK,
+                "printer_id": printer_id,
+                "slot": tray.slot,
+                "tray_uuid": tray.tray_uuid,
+                "material": tray.tray_type,
+                "color": tray.color,
+                "value": grams,
+                "percent": tray.remain,
+                "threshold": self.rules.low_stock_grams,
+            },
+        )
+        return materials
+
+    def remove_tray(self, printer_id: str, slot: str) -> list[str]:
+        """Resolve the low stock alert of a slot whose AMS unit is gone, returning the material to re-evaluate."""
+        with self.lock:
+            material = self.tray_materials.pop((printer_id, slot), None)
+        self._set(f"{ALERT_LOW_STOCK}:{printer_id}:{slot}", False, {"value": None})
+        return [material] if material is not None else []
+
+    def evaluate_material(self, material: str, remaining_grams: float) -> None:
+        key = f"{ALERT_MATERIAL_LOW_STOCK}:{material}"
+        low = is_low(remaining_grams, self.rules.material_low_stock_grams, self._is_firing(key))
+        self._set(
+            key,
+            low,
+            {
+                "type": ALERT_MATERIAL_LOW_STOCK,
+                "material": material,
+                "value": round(remaining_grams, 2),
+                "threshold": self.rules.material_low_stock_grams,
+            },
+        )
+
+    def evaluate_ams(self, printer_id: str, ams_unit) -> None:
+        key = f"{ALERT_HUMIDITY}:{printer_id}:{ams_unit.id}"
+        high = is_high(ams_unit.humidity, self.rules.humidity, self._is_firing(key))
+        self._set(
+            key,
+            high,
+            {
+                "type": ALERT_HUMIDITY,
+                "printer_id": printer_id,
+                "ams_id": ams_unit.id,
+                "value": ams_unit.humidity,
+                "threshold": self.rules.humidity,
+            },
+        )
+
+    def remove_ams(self, printer_id: str, ams_id: str) -> None:
+        """Resolve the humidity alert of a disconnected AMS unit."""
+        self._set(f"{ALERT_HUMIDITY}:{printer_id}:{ams_id}", False, {"value": None})
+
+    def evaluate_offline(self, printer_id: str, offline_seconds: Optional[float]) -> None:
+        """Evaluate the offline rule of a printer, from how long it has gone without reporting, None if online."""
+        key = f"{ALERT_OFFLINE}:{printer_id}"
+        offline = (
+            self.rules.offline_minutes > 0
+            and offline_seconds is not None
+            and offline_seconds > self.rules.offline_minutes * 60
+        )
+        self._set(
+            key,
+            offline,
+            {
+                "type": ALERT_OFFLINE,
+                "printer_id": printer_id,
+                "value": round(offline_seconds / 60, 1) if offline_seconds is not None else 0,
+                "threshold": self.rules.offline_minutes,
+            },
+        )
+
+    def remove_printer(self, printer_id: str) -> None:
+        """Drop the alerts of a removed printer without emitting them."""
+        with self.lock:
+            for key in [key for key, alert in self.firing.items() if alert.get("printer_id") == printer_id]:
+                del self.firing[key]
+            for tray_key in [tray_key for tray_key in self.tray_materials if tray_key[0] == printer_id]:
+                del self.tray_materials[tray_key]
+
+    def get_firing(self) -> list[dict]:
+        with self.lock:
+            return sorted((dict(alert) for alert in self.firing.values()), key=lambda alert: alert["since"])
@@ -0,0 +1,44 @@
+import logging
+
+from datetime import datetime, timezone
+
+from fastapi import APIRouter
+
+from spoolman_bambu import state
+from spoolman_bambu.api.v1.models import Alert, AlertDeliveryStats, Alerts
+from spoolman_bambu.exceptions import ItemNotFoundError
+
+logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
+
+router = APIRouter(
+    prefix="/alerts",
+    tags=["alerts"],
+)
+
+
+@router.get(
+    "",
+    name="List alerts",
+    description=(
+        "Get the low stock, humidity and offline alerts which are firing, and the webhook delivery counts. Alerts "
+        "starting to fire or resolving are also streamed as alert events."
+    ),
+    response_model_exclude_none=True,
+    responses={
+        200: {"model": Alerts},
+    },
+)
+async def alerts() -> Alerts:
+    engine = app_state.get_alerts()
+    delivery = app_state.get_alert_delivery()
+    if engine is None or delivery is None:
+        raise ItemNotFoundError("Alerts are not initialised.")
+
+    return Alerts(
+        firing=[
+            Alert(**{**alert, "since": datetime.fromtimestamp(alert["since"], timezone.utc)})
+            for alert in engine.get_firing()
+        ],
+        delivery=AlertDeliveryStats(**delivery.get_stats()),
+    )
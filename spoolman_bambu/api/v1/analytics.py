@@ -0,0 +1,51 @@
+import logging
+import time
+
+from typing import Annotated
+
+from fastapi import APIRouter, Query
+
+from spoolman_bambu import state
+from spoolman_bambu.api.v1.models import Analytics
+from spoolman_bambu.exceptions import ItemNotFoundError
+
+logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"],
+)
+
+
+def get_loaded_trays() -> dict:
+    trays = {}
+    for printer in app_state.get_printers():
+        printer_state = printer.get_printer_state()
+        if printer_state is None:
+            continue
+        for tray in printer_state.get_trays():
+            trays[(printer_state.printer_id, tray.slot)] = tray
+    return trays
+
+
+@router.get(
+    "",
+    name="Get consumption analytics",
+    description=(
+        "Get the filament consumed, usage rate and projected run-out time of every spool used over a window, "
+        "along with the totals per material, color and printer. Results are cached until new samples are recorded."
+    ),
+    response_model_exclude_none=True,
+    responses={
+        200: {"model": Analytics},
+    },
+)
+def analytics(
+    window_hours: Annotated[float, Query(gt=0, description="Length of the window ending now, in hours.")] = 168,
+) -> Analytics:
+    fleet_analytics = app_state.get_analytics()
+    if fleet_analytics is None:
+        raise ItemNotFoundError("Analytics are not initialised.")
+
+    return Analytics(**fleet_analytics.get_analytics(window_hours * 3600, get_loaded_trays(), time.time()))
@@ -0,0 +1,93 @@
+import json
+import logging
+
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Header, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from spoolman_bambu import state
+from spoolman_bambu.api.v1.printer import get_printer_info
+from spoolman_bambu.events import event_ring
+
+logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"],
+)
+
+# A comment is sent when there have been no events for this long, so proxies don't close the idle stream
+KEEPALIVE_INTERVAL = 15
+# How long a client should wait before reconnecting, in milliseconds
+RETRY_INTERVAL = 3000
+
+
+def format_event(event_id: str, event_type: str, data) -> str:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+def build_snapshot() -> dict:
+    """Build the current state of every printer and its trays, sent to clients that can't replay the events."""
+    printers = []
+    for printer in app_state.get_printers():
+        printer_info = jsonable_encoder(get_printer_info(printer))
+        printer_info["ams"] = printer.get_tray_state().get_changes()
+        printers.append(printer_info)
+
+    spoolman = app_state.get_spoolman()
+    return {
+        "printers": printers,
+        "spoolman_status": spoolman.get_status() if spoolman is not None else None,
+    }
+
+
+def parse_last_event_id(last_event_id: Optional[str]) -> Optional[int]:
+    # An id from before a restart can't be replayed, so the client is sent a snapshot like a new one
+    return event_ring.parse_id(last_event_id) if last_event_id is not None else None
+
+
+async def stream_events(request: Request, last_id: Optional[int]):
+    yield f"retry: {RETRY_INTERVAL}\n\n"
+
+    events = event_ring.get_since(last_id) if last_id is not None else None
+    while True:
+        if events is None:
+            # Taken before the snapshot is built, so anything published meanwhile is sent again rather than missed
+            last_id = event_ring.get_sequence()
+            yield format_event(event_ring.format_id(last_id), "snapshot", build_snapshot())
+        else:
+            for event_id, event_type, timestamp, data in events:
+                yield format_event(event_ring.format_id(event_id), event_type, {"time": timestamp, **data})
+                last_id = event_id
+
+        if await request.is_disconnected():
+            return
+        await event_ring.wait(last_id, KEEPALIVE_INTERVAL)
+        events = event_ring.get_since(last_id)
+        if events is not None and len(events) == 0:
+            yield ": keepalive\n\n"
+
+
+@router.get(
+    "",
+    name="Listen to events",
+    description=(
+        "Stream printer, AMS tray and Spoolman sync events as Server-Sent Events. A new client is first sent a "
+        "snapshot event with the current state. A client reconnecting with the Last-Event-ID header is sent only the "
+        "events it missed, or a new snapshot if it is too far behind for them to be replayed."
+    ),
+    response_class=StreamingResponse,
+)
+async def events(
+    request: Request,
+    last_event_id: Annotated[Optional[str], Header(description="Id of the last event received.")] = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_events(request, parse_last_event_id(last_event_id)),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
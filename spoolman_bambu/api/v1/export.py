@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+from datetime import datetime, timezone
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from spoolman_bambu import env, export, state
+from spoolman_bambu.api.v1.models import Message
+
+logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
+
+router = APIRouter(
+    prefix="/export",
+    tags=["export"],
+)
+
+ExportFormat = Annotated[Literal["csv", "ndjson"], Query(description="Format of the export.")]
+
+
+def export_response(name: str, export_format: str, columns: tuple, rows) -> StreamingResponse:
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return StreamingResponse(
+        export.stream_rows(export_format, columns, rows),
+        media_type=export.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}-{timestamp}.{export_format}"'},
+    )
+
+
+@router.get(
+    "/printers",
+    name="Export printers",
+    description="Stream the status of every printer as CSV or NDJSON.",
+    response_class=StreamingResponse,
+)
+async def printers(format: ExportFormat = "csv") -> StreamingResponse:
+    printer_snapshot = export.snapshot_printers(app_state.get_printers())
+    return export_response("printers", format, export.PRINTER_COLUMNS, iter(printer_snapshot))
+
+
+@router.get(
+    "/trays",
+    name="Export trays",
+    description=(
+        "Stream every tray loaded in every printer, joined with the Spoolman spool it is bound to, as CSV or NDJSON."
+    ),
+    response_class=StreamingResponse,
+)
+async def trays(format: ExportFormat = "csv") -> StreamingResponse:
+    tray_snapshot = export.snapshot_trays(app_state.get_printers())
+    return export_response("trays", format, export.TRAY_COLUMNS, export.iter_tray_rows(tray_snapshot))
+
+
+@router.get(
+    "/spools",
+    name="Export spools",
+    description=(
+        "Stream the active Spoolman spools of Bambu Lab filaments as CSV or NDJSON, along with the tray each is "
+        "claimed by. Served from the Spoolman response cache when it is fresh."
+    ),
+    response_class=StreamingResponse,
+    responses={503: {"model": Message}},
+)
+async def spools(format: ExportFormat = "csv") -> StreamingResponse:
+    spoolman = app_state.get_spoolman()
+    # The cached list is copied for each caller, so it is a consistent snapshot to stream from
+    spoolman_spools = await asyncio.to_thread(spoolman.get_spools) if spoolman is not None else None
+    if not isinstance(spoolman_spools, list):
+        return JSONResponse(status_code=503, content={"message": "Spoolman spools could not be fetched"})
+
+    tag = env.get_settings().spoolman_tag_api
+    return export_response("spools", format, export.SPOOL_COLUMNS, export.iter_spool_rows(spoolman_spools, tag))
@@ -0,0 +1,79 @@
+import logging
+
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Query
+
+from spoolman_bambu import state
+from spoolman_bambu.api.v1.models import HistorySample, HistorySeries
+from spoolman_bambu.api.v1.printer import get_printer
+from spoolman_bambu.exceptions import ItemNotFoundError
+
+logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
+
+router = APIRouter(
+    prefix="/history",
+    tags=["history"],
+)
+
+
+def get_history():
+    history = app_state.get_history()
+    if history is None:
+        raise ItemNotFoundError("History is not initialised.")
+    return history
+
+
+@router.get(
+    "/{printer_id}",
+    name="List history series",
+    description="Get the names of the time-series recorded for a printer.",
+    responses={
+        200: {"model": list[str]},
+    },
+)
+async def series(printer_id: int) -> list[str]:
+    return get_history().get_series_names(get_printer(printer_id).get_printer_id())
+
+
+@router.get(
+    "/{printer_id}/{series}",
+    name="Get history series",
+    description=(
+        "Get the samples of a time-series between start and end, defaulting to the last 24 hours. "
+        "With the auto resolution the finest resolution which still covers the whole range is returned."
+    ),
+    response_model_exclude_none=True,
+    responses={
+        200: {"model": HistorySeries},
+    },
+)
+async def query(
+    printer_id: int,
+    series: str,
+    start: Annotated[Optional[datetime], Query(description="Start of the range, defaults to 24 hours ago.")] = None,
+    end: Annotated[Optional[datetime], Query(description="End of the range, defaults to now.")] = None,
+    resolution: Annotated[Literal["auto", "raw", "minute", "hour"], Query()] = "auto",
+) -> HistorySeries:
+    serial = get_printer(printer_id).get_printer_id()
+    if end is None:
+        end = datetime.now(timezone.utc)
+    if start is None:
+        start = end - timedelta(days=1)
+
+    result = get_history().query(serial, series, start.timestamp(), end.timestamp(), resolution)
+    if result is None:
+        raise ItemNotFoundError(f"No history series {series} found for printer {printer_id}.")
+
+    resolution, samples = result
+    return HistorySeries(
+        printer_id=serial,
+        series=series,
+        resolution=resolution,
+        samples=[
+            HistorySample(time=datetime.fromtimestamp(timestamp, timezone.utc), value=value)
+            for timestamp, value in samples
+        ],
+    )
@@ -33,13 +33,21 @@ router = APIRouter(
 )
 async def info() -> Info:
     """Return general info about the API and statuses."""
+    # Settings are resolved once, so this doesn't read the environment or touch the filesystem per request
+    settings = env.get_settings()
+    health_monitor = app_state.get_health_monitor()
     return Info(
-        version=env.get_version(),
-        debug_mode=env.is_debug_mode(),
-        automatic_backups=env.is_automatic_backup_enabled(),
+        version=settings.version,
+        debug_mode=settings.debug_mode,
+        automatic_backups=settings.automatic_backup,
+        logging_level=logging.getLevelName(settings.logging_level),
+        log_format=settings.log_format,
+        base_path=settings.base_path,
+        spoolman_tag=settings.spoolman_tag,
         spoolman_connected=app_state.get_spoolman().get_status(),
         spoolman_last_status_check=app_state.get_spoolman().get_last_status_check(),
-        data_dir=str(env.get_data_dir().resolve()),
-        logs_dir=str(env.get_logs_dir().resolve()),
-        backups_dir=str(env.get_backups_dir().resolve()),
+        spoolman_latency=health_monitor.get_latency_stats()["average"] if health_monitor is not None else None,
+        data_dir=str(settings.data_dir),
+        logs_dir=str(settings.logs_dir),
+        backups_dir=str(settings.backups_dir),
     )
@@ -0,0 +1,47 @@
+import logging
+
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from spoolman_bambu import state
+from spoolman_bambu.api.v1.models import Inventory
+from spoolman_bambu.exceptions import ItemNotFoundError
+
+logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
+
+router = APIRouter(
+    prefix="/inventory",
+    tags=["inventory"],
+)
+
+
+@router.get(
+    "",
+    name="Get fleet inventory",
+    description=(
+        "Get the grams loaded and remaining per material, color and printer, and the number of empty and invalid "
+        "trays. Served from totals kept up to date as trays change. Send the ETag back as If-None-Match to get a "
+        "304 response while nothing has changed."
+    ),
+    responses={
+        200: {"model": Inventory},
+        304: {"description": "Nothing has changed since the ETag."},
+    },
+)
+async def inventory(
+    if_none_match: Annotated[Optional[str], Header(description="ETag of the inventory last received.")] = None,
+) -> Response:
+    fleet_inventory = app_state.get_inventory()
+    if fleet_inventory is None:
+        raise ItemNotFoundError("Inventory is not initialised.")
+
+    # Taken from the same version as the body, a tray may change at any moment
+    content = fleet_inventory.get_inventory()
+    etag = fleet_inventory.get_etag(content["version"])
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=jsonable_encoder(content), headers={"ETag": etag})
@@ -0,0 +1,55 @@
+import logging
+
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Query
+
+from spoolman_bambu import state
+from spoolman_bambu.api.v1.models import ActiveJob, JobUsage
+from spoolman_bambu.exceptions import ItemNotFoundError
+
+logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"],
+)
+
+
+@router.get(
+    "",
+    name="List job usage",
+    description=(
+        "Get the filament used by the most recent print jobs, newest first, one entry per job and tray it used. "
+        "Optionally only the jobs of one printer, by its serial number."
+    ),
+    responses={
+        200: {"model": list[JobUsage]},
+    },
+)
+async def usage(
+    printer_id: Annotated[Optional[str], Query(description="Serial number of the printer.")] = None,
+    limit: Annotated[int, Query(ge=1, le=10000)] = 100,
+) -> list[JobUsage]:
+    ledger = app_state.get_job_ledger()
+    if ledger is None:
+        raise ItemNotFoundError("Job ledger is not initialised.")
+    return [JobUsage(**record) for record in ledger.read(printer_id, limit)]
+
+
+@router.get(
+    "/active",
+    name="List active jobs",
+    description="Get the job each printer is working on and the filament it has used so far.",
+    responses={
+        200: {"model": list[ActiveJob]},
+    },
+)
+async def active() -> list[ActiveJob]:
+    jobs = []
+    for printer in app_state.get_printers():
+        job = printer.get_job_tracker().get_job()
+        if job is not None:
+            jobs.append(ActiveJob(**job))
+    return jobs
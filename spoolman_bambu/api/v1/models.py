@@ -32,20 +32,219 @@ class PrinterInfo(BaseModel):
     printer_ip: str = Field(examples=["192.168.0.1"])
     status: str = Field(examples=["connected"])
     ams_unit_count: Optional[int] = Field(examples=["2"])
-    ams_active_spools_count: Optional[int] = Field(examples=["3"])
+    ams_active_spools_count: Optional[int] = Field(None, examples=["3"])
     last_mqtt_message: Optional[SpoolmanDateTime] = Field(examples=["null", "2025-01-09T16:17:12.081846Z"])
     last_mqtt_ams_message: Optional[SpoolmanDateTime] = Field(examples=["null", "2025-01-09T16:17:12.081846Z"])
 
 
+class AmsTray(BaseModel):
+    slot: str = Field(description="AMS unit id followed by the tray id.", examples=["A0"])
+    ams_id: str = Field(examples=["A"])
+    tray_id: str = Field(examples=["0"])
+    tray_uuid: Optional[str] = Field(None, description="Not set for an empty tray.", examples=["0123456789ABCDEF"])
+    tray_type: Optional[str] = Field(None, examples=["PLA"])
+    sub_brands: Optional[str] = Field(None, examples=["PLA Basic"])
+    color: Optional[str] = Field(None, examples=["FF0000FF"])
+    colors: list[str] = Field(description="Colors of a multi-color spool.", examples=[["FF0000FF"]])
+    remain: Optional[int] = Field(None, description="Remaining filament in %, if known.", examples=[80])
+    weight: float = Field(examples=[1000.0])
+    spool_id: Optional[int] = Field(None, description="Spoolman spool bound to the tray, if synced.", examples=[3])
+    remaining_weight: Optional[float] = Field(None, description="Remaining weight of the bound spool.", examples=[800])
+
+
+class PrinterAms(BaseModel):
+    printer_id: str = Field(examples=["X1PXXAXXXXXXXXX"])
+    version: str = Field(
+        description="Pass as since to only get the trays that change after this.", examples=["1760000000000000000-42"]
+    )
+    full: bool = Field(description="Whether every tray is included, rather than only the changed trays.")
+    trays: list[AmsTray] = Field(description="The trays loaded, or those changed since the requested version.")
+    removed: list[str] = Field(description="Slots of disconnected AMS units since the requested version.")
+
+
 class Info(BaseModel):
     version: str = Field(examples=["0.7.0"])
     debug_mode: bool = Field(examples=[False])
     automatic_backups: bool = Field(examples=[True])
+    logging_level: Optional[str] = Field(None, examples=["INFO"])
+    log_format: Optional[str] = Field(None, examples=["text"])
+    base_path: Optional[str] = Field(None, examples=[""])
+    spoolman_tag: Optional[str] = Field(None, examples=["Tag"])
     data_dir: str = Field(examples=["/home/app/.local/share/spoolman"])
     logs_dir: str = Field(examples=["/home/app/.local/share/spoolman"])
     backups_dir: str = Field(examples=["/home/app/.local/share/spoolman/backups"])
     spoolman_connected: str = Field(examples=[True])
     spoolman_last_status_check: Optional[SpoolmanDateTime] = Field(examples=["null", "2025-01-09T16:17:12.081846Z"])
+    spoolman_latency: Optional[float] = Field(
+        None, description="Average latency of recent Spoolman health checks, in seconds.", examples=[0.012]
+    )
+
+
+class HistorySample(BaseModel):
+    time: SpoolmanDateTime = Field(description="When the sample was taken. UTC Timezone.")
+    value: float = Field(examples=[80.0])
+
+
+class HistorySeries(BaseModel):
+    printer_id: str = Field(examples=["X1PXXAXXXXXXXXX"])
+    series: str = Field(
+        description="Series name, a tray slot or AMS unit id followed by the measurement.",
+        examples=["A0.remain", "A.humidity", "A.temp"],
+    )
+    resolution: str = Field(description="Resolution of the samples.", examples=["raw", "minute", "hour"])
+    samples: list[HistorySample] = Field(description="Samples in time order.")
+
+
+class AnalyticsSpool(BaseModel):
+    printer_id: str = Field(examples=["X1PXXAXXXXXXXXX"])
+    slot: Optional[str] = Field(
+        None, description="Slot the spool is loaded in, not set once unloaded.", examples=["A0"]
+    )
+    tray_uuid: str = Field(examples=["0123456789ABCDEF0123456789ABCDEF"])
+    material: str = Field(examples=["PLA"])
+    color: str = Field(examples=["FF0000FF"])
+    remain: float = Field(description="Remaining filament at the end of the window, in %.", examples=[80.0])
+    remaining_weight: float = Field(description="Remaining filament, in grams.", examples=[800.0])
+    grams_consumed: float = Field(description="Filament consumed during the window, in grams.", examples=[120.5])
+    usage_rate: float = Field(description="Average consumption over the window, in grams per hour.", examples=[0.7])
+    run_out: Optional[SpoolmanDateTime] = Field(
+        None, description="Projected run-out time at the current usage rate. UTC Timezone."
+    )
+
+
+class AnalyticsGroup(BaseModel):
+    key: str = Field(description="The material, color or printer id of the group.", examples=["PLA"])
+    spool_count: int = Field(examples=[4])
+    grams_consumed: float = Field(description="Filament consumed during the window, in grams.", examples=[480.0])
+    usage_rate: float = Field(description="Average consumption over the window, in grams per hour.", examples=[2.9])
+    remaining_weight: float = Field(description="Remaining filament across the group, in grams.", examples=[2400.0])
+    run_out: Optional[SpoolmanDateTime] = Field(
+        None, description="Projected run-out time of the whole group at the current usage rate. UTC Timezone."
+    )
+
+
+class Analytics(BaseModel):
+    start: SpoolmanDateTime = Field(description="Start of the window. UTC Timezone.")
+    end: SpoolmanDateTime = Field(description="End of the window. UTC Timezone.")
+    spools: list[AnalyticsSpool] = Field(
+        description="Consumption of each spool with samples in the window, including spools unloaded or used up."
+    )
+    materials: list[AnalyticsGroup] = Field(description="Consumption per material, highest first.")
+    colors: list[AnalyticsGroup] = Field(description="Consumption per color, highest first.")
+    printers: list[AnalyticsGroup] = Field(description="Consumption per printer, highest first.")
+
+
+class Alert(BaseModel):
+    key: str = Field(description="Identifies the alert, an alert is only sent again once it resolves.")
+    type: Literal["low_stock", "material_low_stock", "humidity", "offline"] = Field(examples=["low_stock"])
+    state: Literal["firing", "resolved"] = Field(examples=["firing"])
+    printer_id: Optional[str] = Field(None, examples=["X1PXXAXXXXXXXXX"])
+    slot: Optional[str] = Field(None, description="Tray of a low stock alert.", examples=["A0"])
+    ams_id: Optional[str] = Field(None, description="AMS unit of a humidity alert.", examples=["A"])
+    material: Optional[str] = Field(None, examples=["PLA"])
+    value: Optional[float] = Field(
+        None, description="Grams remaining, humidity or minutes offline, as of the last change.", examples=[80.0]
+    )
+    threshold: float = Field(examples=[100.0])
+    since: SpoolmanDateTime = Field(description="When the alert started firing. UTC Timezone.")
+
+
+class AlertDeliveryStats(BaseModel):
+    queued: int = Field(description="Alerts queued for the webhooks.", examples=[12])
+    sent: int = Field(description="Alerts delivered, counted per webhook.", examples=[12])
+    dropped: int = Field(description="Alerts dropped because the queue was full.", examples=[0])
+    failed: int = Field(description="Alerts which could not be delivered, counted per webhook.", examples=[0])
+    pending: int = Field(description="Alerts waiting to be delivered.", examples=[0])
+
+
+class Alerts(BaseModel):
+    firing: list[Alert] = Field(description="Alerts which are firing, oldest first.")
+    delivery: AlertDeliveryStats
+
+
+class InventoryGroup(BaseModel):
+    key: str = Field(description="The material, color or printer id of the group.", examples=["PLA"])
+    trays: int = Field(description="Number of trays in the group.", examples=[4])
+    empty_trays: int = Field(description="Number of trays with nothing loaded.", examples=[0])
+    invalid_trays: int = Field(description="Number of trays whose spool can't be read, or is used up.", examples=[0])
+    loaded_weight: float = Field(description="Full weight of the loaded spools, in grams.", examples=[4000.0])
+    remaining_weight: float = Field(description="Filament remaining on the loaded spools, in grams.", examples=[2400])
+
+
+class Inventory(BaseModel):
+    version: int = Field(description="Bumped whenever any tray changes.", examples=[42])
+    trays: int = Field(description="Number of trays across the fleet.", examples=[16])
+    empty_trays: int = Field(description="Number of trays with nothing loaded.", examples=[2])
+    invalid_trays: int = Field(description="Number of trays whose spool can't be read, or is used up.", examples=[1])
+    loaded_weight: float = Field(description="Full weight of the loaded spools, in grams.", examples=[13000.0])
+    remaining_weight: float = Field(description="Filament remaining on the loaded spools, in grams.", examples=[7800])
+    materials: list[InventoryGroup] = Field(description="Loaded spools per material, most remaining first.")
+    colors: list[InventoryGroup] = Field(description="Loaded spools per color, most remaining first.")
+    printers: list[InventoryGroup] = Field(description="Trays per printer, most remaining first.")
+
+
+class JobUsage(BaseModel):
+    printer_id: str = Field(examples=["X1PXXAXXXXXXXXX"])
+    job_id: str = Field(description="Task id reported by the printer, if known.", examples=["123456789"])
+    name: Optional[str] = Field(None, description="Name of the job.", examples=["Benchy"])
+    state: str = Field(description="State the job ended in.", examples=["FINISH"])
+    start: SpoolmanDateTime = Field(description="When the job started. UTC Timezone.")
+    end: SpoolmanDateTime = Field(description="When the job ended. UTC Timezone.")
+    slot: str = Field(examples=["A0"])
+    tray_uuid: str = Field(examples=["0123456789ABCDEF0123456789ABCDEF"])
+    spool_id: Optional[int] = Field(None, description="Spoolman spool bound to the tray, if synced.", examples=[3])
+    grams: float = Field(description="Filament the job used from the tray, in grams.", examples=[12.5])
+
+
+class ActiveJob(BaseModel):
+    printer_id: str = Field(examples=["X1PXXAXXXXXXXXX"])
+    job_id: str = Field(examples=["123456789"])
+    name: Optional[str] = Field(None, examples=["Benchy"])
+    gcode_state: Optional[str] = Field(None, examples=["RUNNING"])
+    progress: Optional[int] = Field(None, description="Progress of the job, in %.", examples=[42])
+    start: SpoolmanDateTime = Field(description="When the job started. UTC Timezone.")
+    active_slot: Optional[str] = Field(None, description="Slot of the tray feeding the extruder.", examples=["A0"])
+    grams: float = Field(description="Filament used so far, in grams.", examples=[5.0])
+
+
+class ReconcileAction(BaseModel):
+    action: Literal["create", "claim", "patch", "release"] = Field(examples=["claim"])
+    printer_id: str = Field(description="Printer the tray is loaded in, or the released spool is located at.")
+    slot: Optional[str] = Field(None, description="Slot of the tray, not set for a released spool.", examples=["A0"])
+    tray_uuid: str = Field(examples=["0123456789ABCDEF0123456789ABCDEF"])
+    spool_id: Optional[int] = Field(None, description="Spool to patch, not set for a create.", examples=[3])
+    patch: Optional[dict] = Field(None, description="Patch sent to the spool.")
+    external_id: Optional[str] = Field(None, description="External filament of a created spool.")
+    filament_id: Optional[int] = Field(None, description="Filament of a created spool, not set if it is created too.")
+    filament: Optional[dict] = Field(None, description="Filament created for a created spool.")
+    spool: Optional[dict] = Field(None, description="Spool created.")
+    error: Optional[str] = Field(None, description="Why the action failed to be applied.")
+
+
+class ReconcileTray(BaseModel):
+    printer_id: str = Field(examples=["X1PXXAXXXXXXXXX"])
+    slot: str = Field(examples=["A0"])
+    tray_uuid: str = Field(examples=["0123456789ABCDEF0123456789ABCDEF"])
+
+
+class ReconcilePlan(BaseModel):
+    time: SpoolmanDateTime = Field(description="When the plan was made.")
+    actions: list[ReconcileAction] = Field(description="Writes which bring Spoolman in line with the trays.")
+    unmatched: list[ReconcileTray] = Field(description="Trays which don't match any Bambu Lab filament.")
+    in_sync: int = Field(description="Number of trays whose spool is already up to date.", examples=[12])
+
+
+class ReconcileResult(BaseModel):
+    plan: ReconcilePlan
+    applied: int = Field(description="Number of actions applied.", examples=[3])
+    skipped: int = Field(
+        description=(
+            "Number of creates and claims already synced by the printer, patches of held or changed trays and "
+            "releases of trays loaded again."
+        ),
+        examples=[0],
+    )
+    failed: list[ReconcileAction] = Field(description="Actions which failed to be applied.")
 
 
 class HealthCheck(BaseModel):
@@ -58,6 +257,11 @@ class PrinterConfig(BaseModel):
     printer_code: str = Field(examples=["XXXXXXXX"])
 
 
+class PrinterConfigUpdate(BaseModel):
+    printer_ip: Optional[str] = Field(None, examples=["192.168.0.1"])
+    printer_code: Optional[str] = Field(None, examples=["XXXXXXXX"])
+
+
 class MultiColorDirection(Enum):
     """Enum for multi-color direction."""
 
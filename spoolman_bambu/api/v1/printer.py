@@ -9,8 +9,11 @@ from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, field_validator
 
-from spoolman_bambu import env, state
-from spoolman_bambu.api.v1.models import PrinterInfo
+from spoolman_bambu import env, events, state
+from spoolman_bambu.api.v1.models import Message, PrinterAms, PrinterConfig, PrinterConfigUpdate, PrinterInfo
+from spoolman_bambu.bambu import fleet
+from spoolman_bambu.bambu.bambu import Bambu
+from spoolman_bambu.exceptions import ItemNotFoundError
 from spoolman_bambu.ws import websocket_manager
 
 
@@ -22,6 +25,9 @@ router = APIRouter(
     tags=["printer"],
 )
 
+# Fleet changes are applied one at a time, each only starts or stops the printer it changes
+fleet_lock = asyncio.Lock()
+
 
 @router.get(
     "",
@@ -36,8 +42,8 @@ async def printer() -> JSONResponse:
     """Return general info about the API and statuses."""
     active_printers = []
     printers = app_state.get_printers()
-    for index, printer in enumerate(printers):
-        active_printers.append(get_printer_info(index + 1, printer))
+    for printer in printers:
+        active_printers.append(get_printer_info(printer))
 
     # Set x-total-count header for pagination
     return JSONResponse(
@@ -79,14 +85,119 @@ async def notify_any(
 async def get(
     printer_id: int,
 ) -> PrinterInfo:
-    active_printer = None
-    printers = app_state.get_printers()
-    for index, printer in enumerate(printers):
-        if index == (printer_id - 1):
-            active_printer = get_printer_info(index + 1, printer)
+    return get_printer_info(get_printer(printer_id))
+
+
+@router.get(
+    "/{printer_id}/ams",
+    name="Get printer AMS trays",
+    description=(
+        "Get the trays loaded in the AMS units of a printer, with the Spoolman spool bound to each. "
+        "Pass the version of a previous response as since to only get the trays that changed after it. "
+        "If the service was restarted or the printer reconnected since that version every tray is returned, with full "
+        "set."
+    ),
+    responses={404: {"model": Message}},
+)
+async def get_ams(
+    printer_id: int,
+    since: Annotated[Optional[str], Query(description="Version of a previous response.")] = None,
+) -> PrinterAms:
+    printer = get_printer(printer_id)
+    return PrinterAms(printer_id=printer.get_printer_id(), **printer.get_tray_state().get_changes(since))
+
+
+@router.post(
+    "",
+    name="Add printer",
+    description=(
+        "Add a printer and connect to it, without affecting the other printers. "
+        "The printer configuration is persisted in the data directory."
+    ),
+    response_model_exclude_none=True,
+    responses={409: {"model": Message}},
+)
+async def add(config: PrinterConfig) -> PrinterInfo:
+    async with fleet_lock:
+        if app_state.get_printer(config.printer_id) is not None:
+            return JSONResponse(
+                status_code=409,
+                content={"message": f"Printer {config.printer_id} already exists."},
+            )
+
+        # Connecting blocks while it waits for the printer, so keep it off the event loop
+        printer = await asyncio.to_thread(Bambu, config.printer_id, config.printer_ip, config.printer_code)
+        await asyncio.to_thread(fleet.save_printer_config, config)
+        number = await asyncio.to_thread(fleet.get_printer_number, config.printer_id)
+        app_state.add_printer(printer, number)
+        logger.info("Printer %s added", config.printer_id)
+
+        return get_printer_info(printer)
 
-    if active_printer is not None:
-        return active_printer
+
+@router.patch(
+    "/{printer_id}",
+    name="Update printer",
+    description=(
+        "Update the IP address or access code of a printer, reconnecting only that printer. "
+        "The printer configuration is persisted in the data directory."
+    ),
+    response_model_exclude_none=True,
+    responses={404: {"model": Message}},
+)
+async def update(printer_id: int, config_update: PrinterConfigUpdate) -> PrinterInfo:
+    async with fleet_lock:
+        current = get_printer(printer_id)
+        config = PrinterConfig(
+            printer_id=current.get_printer_id(),
+            printer_ip=config_update.printer_ip or current.get_printer_ip(),
+            printer_code=config_update.printer_code or current.get_printer_code(),
+        )
+
+        # The replacement connects with the same MQTT client id and restores the snapshot the running printer saves
+        # when it stops, so the running printer is stopped first
+        await asyncio.to_thread(current.stop)
+        try:
+            printer = await asyncio.to_thread(Bambu, config.printer_id, config.printer_ip, config.printer_code)
+        except Exception:
+            logger.exception(
+                "Printer %s failed to be updated, reconnecting it with its previous configuration", config.printer_id
+            )
+            previous = await asyncio.to_thread(
+                Bambu, current.get_printer_id(), current.get_printer_ip(), current.get_printer_code()
+            )
+            app_state.add_printer(previous)
+            raise
+        await asyncio.to_thread(fleet.save_printer_config, config)
+        # Replaced in place, so the printer keeps its id
+        app_state.add_printer(printer)
+        logger.info("Printer %s updated", config.printer_id)
+
+        return get_printer_info(printer)
+
+
+@router.delete(
+    "/{printer_id}",
+    name="Remove printer",
+    description="Disconnect and remove a printer, without affecting the other printers.",
+    responses={404: {"model": Message}},
+)
+async def delete(printer_id: int) -> Message:
+    async with fleet_lock:
+        printer = get_printer(printer_id)
+        await asyncio.to_thread(printer.stop)
+        await asyncio.to_thread(fleet.remove_printer_config, printer.get_printer_id())
+        app_state.remove_printer(printer.get_printer_id())
+        inventory = app_state.get_inventory()
+        if inventory is not None:
+            inventory.remove_printer(printer.get_printer_id())
+        alerts = app_state.get_alerts()
+        if alerts is not None:
+            alerts.remove_printer(printer.get_printer_id())
+        events.publish(events.EVENT_PRINTER, {"printer_id": printer.get_printer_id(), "status": "removed"})
+        logger.info("Printer %s removed", printer.get_printer_id())
+
+        return Message(message="Success!")
 
 
 @router.websocket(
@@ -108,13 +219,21 @@ async def notify(
         websocket_manager.disconnect(("printer", str(printer_id)), websocket)
 
 
-def get_printer_info(index, printer) -> PrinterInfo:
+def get_printer(printer_id: int):
+    printer = app_state.get_printer_by_number(printer_id)
+    if printer is None:
+        raise ItemNotFoundError(f"No printer with id {printer_id} found.")
+    return printer
+
+
+def get_printer_info(printer) -> PrinterInfo:
     return PrinterInfo(
-        id=(index + 1),
+        id=app_state.get_printer_number(printer.get_printer_id()),
         printer_ip=printer.get_printer_ip(),
         printer_id=printer.get_printer_id(),
         status=printer.get_status(),
         ams_unit_count=printer.get_ams_unit_count(),
+        ams_active_spools_count=printer.get_ams_active_spools_count(),
         last_mqtt_message=printer.get_last_mqtt_message(),
         last_mqtt_ams_message=printer.get_last_mqtt_ams_message(),
     )
@@ -13,7 +13,7 @@ from starlette.responses import Response
 from spoolman_bambu import env, state
 from spoolman_bambu.exceptions import ItemNotFoundError
 
-from . import info, models, printer, spoolman
+from . import alerts, analytics, events, export, history, info, inventory, jobs, models, printer, spoolman
 
 logger = logging.getLogger(__name__)
 app_state = state.get_current_state()
@@ -50,6 +50,13 @@ async def health() -> models.HealthCheck:
 
 
 # Add routers
+app.include_router(alerts.router)
+app.include_router(analytics.router)
+app.include_router(events.router)
+app.include_router(export.router)
+app.include_router(history.router)
 app.include_router(info.router)
+app.include_router(inventory.router)
+app.include_router(jobs.router)
 app.include_router(printer.router)
 app.include_router(spoolman.router)
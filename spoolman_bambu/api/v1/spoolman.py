@@ -9,7 +9,9 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, field_validator
 
 from spoolman_bambu import env, state
-from spoolman_bambu.api.v1.models import Spool
+from spoolman_bambu.api.v1.models import Message, ReconcilePlan, ReconcileResult, Spool
+from spoolman_bambu.bambu import reconcile as reconciler
+from spoolman_bambu.exceptions import SpoolmanUnavailableError
 
 # from spoolman.extra_fields import EntityType, get_extra_fields, validate_extra_field_dict
 
@@ -37,7 +39,7 @@ router = APIRouter(
 )
 def find() -> JSONResponse:
     spoolman_spools = app_state.get_spoolman_spools()
-    logger.info(f"Pre response: {spoolman_spools}")
+    logger.debug("Pre response: %s spools", len(spoolman_spools) if spoolman_spools is not None else None)
     # Set x-total-count header for pagination
     return JSONResponse(
         content=jsonable_encoder(
@@ -45,3 +47,50 @@ def find() -> JSONResponse:
             exclude_none=True,
         ),
     )
+
+
+@router.get(
+    "/cache",
+    name="Get Spoolman cache stats",
+    description=(
+        "Get the hit, miss, revalidation and invalidation counts of the Spoolman response cache, "
+        "along with the TTL and number of cached entries of each resource."
+    ),
+    responses={
+        200: {"model": dict[str, dict[str, int]]},
+    },
+)
+def cache() -> dict[str, dict[str, int]]:
+    return app_state.get_spoolman().cache.get_stats()
+
+
+@router.get(
+    "/reconcile",
+    name="Plan reconciliation",
+    description=(
+        "Dry run of the reconciliation of every printer's trays against Spoolman. Returns the creates, claims, "
+        "patches and releases that would be applied, without applying them."
+    ),
+    responses={503: {"model": Message}},
+)
+def reconcile_plan() -> ReconcilePlan:
+    try:
+        return reconciler.plan()
+    except SpoolmanUnavailableError as e:
+        return JSONResponse(status_code=503, content={"message": str(e)})
+
+
+@router.post(
+    "/reconcile",
+    name="Reconcile",
+    description=(
+        "Reconcile every printer's trays against Spoolman now, rather than waiting for the scheduled reconciliation. "
+        "Returns the plan that was applied and the actions that failed."
+    ),
+    responses={503: {"model": Message}},
+)
+def reconcile() -> ReconcileResult:
+    try:
+        return reconciler.reconcile()
+    except SpoolmanUnavailableError as e:
+        return JSONResponse(status_code=503, content={"message": str(e)})
@@ -2,8 +2,11 @@ import logging
 import datetime
 import json
 
-from spoolman_bambu import env, state
-from spoolman_bambu.exceptions import ItemCreateError, ItemUpdateError
+from spoolman_bambu import env, events, state
+from spoolman_bambu.exceptions import ItemCreateError, ItemUpdateError, SpoolmanUnavailableError
+from spoolman_bambu.log import REPORT_SAMPLE_RATE
+from spoolman_bambu.spoolman.index import get_spool_tray_uuid
+from spoolman_bambu.spoolman.locks import filament_locks, tray_locks
 
 logger = logging.getLogger(__name__)
 
@@ -14,166 +17,350 @@ processing_empty_prefix = "   "
 
 app_state = state.get_current_state()
 
-spoolman_custom_tag = env.get_spoolman_tag()
-spoolman_custom_tag_api = spoolman_custom_tag.lower()
-
 
 def tray_validator(tray) -> bool:
-    # Check if we have a valid tray with more than 1 key being id
-    if len(tray.keys()) == 1 and "id" in tray:
-        logger.info(f"{processing_empty_prefix}  - Tray is empty skipping...")
+    # Check if we have a valid tray, empty slots only report their id
+    if tray.is_empty():
+        logger.info("%s  - Tray is empty skipping...", processing_empty_prefix)
         return False
 
     # If or
     # - remaining filament is less than 0
     # - tray_uuid invalid (all 0's)
     # - tray_colour invalid (all 0's)
-    if (
-        tray["remain"] <= 0
-        or tray["tray_uuid"] == "00000000000000000000000000000000"
-        or tray["tray_color"] == "00000000"
-    ):
-        logger.info(f"{processing_empty_prefix}  - Tray is invalid or empty skipping...")
+    if not tray.is_valid():
+        logger.info("%s  - Tray is invalid or empty skipping...", processing_empty_prefix)
         return False
 
     return True
 
 
-def process_ams(printer_id, last_ams_data, ams_data, time):
-    amsId = env.convert_id_to_char(ams_data["id"])
-    spoolman_instance = app_state.get_spoolman()
-
-    # logger.info(f"Processing AMS Spool {last_ams_data}")
-    logger.info(f"Processing AMS Spool {amsId not in last_ams_data.keys()}")
-    logger.info(f"Processing AMS Spool {amsId in last_ams_data.keys()}")
-    if amsId in last_ams_data.keys():
-        logger.info(f"Processing AMS Spool {last_ams_data[amsId] != ams_data}")
+def process_ams(printer_id, snapshot, ams_unit, time, held=None):
+    """Sync the changed trays of an AMS unit with Spoolman.
+
+    If held trays are given, a print is running in the print sync mode, so the weight updates of trays already bound
+    to a spool are held rather than written.
+    """
+    amsId = ams_unit.id
+
+    # Only process trays which have changed since they were last processed, this includes trays restored from the
+    # persisted snapshot so unchanged trays are skipped straight after a restart
+    changed_trays = []
+    for tray in ams_unit.trays:
+        fingerprint = tray.fingerprint()
+        if not snapshot.is_unchanged(tray.slot, fingerprint):
+            changed_trays.append((fingerprint, tray))
+
+    if len(changed_trays) == 0:
+        logger.debug(
+            "Processing AMS %s AMS: [%s] skipped as data has not changed",
+            printer_id,
+            amsId,
+            extra={"sample_rate": REPORT_SAMPLE_RATE},
+        )
+        return
 
-    # if last ams data not cached yet or the cached data has changed since last checked process
-    if amsId not in last_ams_data.keys() or (amsId in last_ams_data.keys() and last_ams_data[amsId] != ams_data):
-        spoolman_spools = spoolman_instance.get_spools()
-        spoolman_internal_filaments = spoolman_instance.get_internal_filament()
-        spoolamn_external_filaments = spoolman_instance.get_external_filament()
+    logger.info("Processing AMS")
+    logger.info(" %s AMS: [%s] (Temp: %s'C Hum: %s%%)", printer_id, amsId, ams_unit.temp, ams_unit.humidity)
+    logger.debug(" Tray data %s", ams_unit.trays, extra={"sample_rate": REPORT_SAMPLE_RATE})
 
-        logger.info(f"Processing AMS")
-        logger.info(f" {printer_id} AMS: [{amsId}] (Temp: {ams_data['temp']}'C Hum: {ams_data['humidity']}%)")
+    # Spoolman data is only fetched once the first tray that can't use its snapshot binding needs it
+    spoolman_data = None
+    external_matches = {}
 
-        # TODO: Check if the data has changed since the last check?
-        logger.info(f" Tray data {ams_data['tray']}")
+    try:
+        for fingerprint, tray in changed_trays:
+            slot = tray.slot
+            logger.info("%s AMS Spool for %s AMS Tray: [%s]", processing_prefix, printer_id, slot)
+            app_state.get_spoolman().index.set_tray_slot(printer_id, slot, tray.tray_uuid)
 
-        for tray in ams_data["tray"]:
-            trayId = tray["id"]
-            logger.info(f"{processing_prefix} AMS Spool for {printer_id} AMS Tray: [{amsId}{trayId}]")
+            # A held tray swapped out of its slot is written before the slot is reused
+            swapped = held.take_swapped(tray) if held is not None else None
+            if swapped is not None:
+                flush_held_trays(printer_id, snapshot, [swapped])
 
             # Sanity check tray data and ignore any basically empty spools
             if tray_validator(tray):
-
-                # Adjust PETG Translucent color stats, so its accessable in Spoolman
-                if tray["tray_sub_brands"] == "PETG Translucent" and tray["tray_color"] == "00000000":
-                    tray["tray_color"] = "FFFFFF00"
-
                 logger.info(
-                    f"{processing_empty_prefix}  {amsId}{trayId} {tray['tray_sub_brands']} {tray['tray_color']} ({tray['remain']}%) [[{tray['tray_uuid']}]]..."
+                    "%s  %s %s %s (%s%%) [[%s]]...",
+                    processing_empty_prefix,
+                    slot,
+                    tray.sub_brands,
+                    tray.color,
+                    tray.remain,
+                    tray.tray_uuid,
                 )
 
-                # Check if this spool exists in external spoolman
-                external_filament_match = check_spool_matches_external(spoolamn_external_filaments, tray)
-                # Check if this spool already exists in spoolman
-                internal_filament_matches = check_spool_matches_internal(
-                    spoolman_internal_filaments, external_filament_match, tray
-                )
-
-                active_spool_found = False
-                unclaimed_spool_found = None
-                unclaimed_spool_found_index = None
-                claimed_spool_found = None
-                claimed_spool_found_index = None
-                # Iterate over the active spools in spoolman and look for matches with the info above
-                for spool_index, spool in enumerate(spoolman_spools):
-                    # See if we matched anything
-                    # TODO: sanity check should always be 1 match?
-                    if len(internal_filament_matches) > 0:
-                        # Check if the matched filament matches the current spool
-                        if internal_filament_matches[0]["external_id"] == spool["filament"]["external_id"]:
-                            # Check if the tag[TAG] extra data is either empty/unclaimed or it is set and it matches the
-                            # currently being processed AMS tray
-                            # If matching spool has been found but no tag key set claim it
-                            if spoolman_custom_tag_api not in spool["extra"].keys():
-                                logger.info(
-                                    f"{processing_empty_prefix}  - Checking tags IF unclaimed: {spool['extra']}"
-                                )
-                                # spoolman_spools[spool_index] = update_existing_spool(spool, tray, time)
-                                unclaimed_spool_found_index = spool_index
-                                unclaimed_spool_found = spool
-                                active_spool_found = True
-                            elif (
-                                spoolman_custom_tag_api in spool["extra"].keys()
-                                and spool["extra"][spoolman_custom_tag_api] == '""'
-                            ):
-                                logger.info(
-                                    f"{processing_empty_prefix}  - Checking tags ELIF unclaimed: {spool['extra']}"
+                binding = snapshot.get_slot(slot)
+                if (
+                    held is not None
+                    and binding is not None
+                    and binding["spool_id"] is not None
+                    and binding["tray_uuid"] == tray.tray_uuid
+                ):
+                    # Left out of the snapshot until it is flushed, so it is synced again after a restart
+                    held.hold(fingerprint, tray, time)
+                    logger.info("%s  - Held weight update of spool %s...", processing_empty_prefix, binding["spool_id"])
+                    continue
+
+                try:
+                    # Only one thread writes the spool of a tray at a time, the binding is checked again once held
+                    with tray_locks.hold(tray.tray_uuid):
+                        spool = update_bound_spool(binding, tray, printer_id, time)
+                        if spool is None:
+                            if spoolman_data is None:
+                                spoolman_spools, spoolman_internal_filaments, color_index = fetch_spoolman_data()
+                                # Color match every changed tray of the unit in one batch
+                                external_matches = color_index.match_trays(
+                                    [changed_tray for _, changed_tray in changed_trays if changed_tray.is_valid()]
                                 )
-                                # spoolman_spools[spool_index] = update_existing_spool(spool, tray, time)
-                                unclaimed_spool_found_index = spool_index
-                                unclaimed_spool_found = spool
-                                active_spool_found = True
-                            # if matching spool has tag set
-                            elif (
-                                spoolman_custom_tag_api in spool["extra"].keys()
-                                and spool["extra"][spoolman_custom_tag_api] == f"\"{tray['tray_uuid']}\""
-                            ):
-                                logger.info(
-                                    f"{processing_empty_prefix}  - Checking tags ELIF claimed: {spool['extra']}"
-                                )
-                                # spoolman_spools[spool_index] = update_existing_spool(spool, tray, time)
-                                claimed_spool_found_index = spool_index
-                                claimed_spool_found = spool
-                                active_spool_found = True
-                            else:
-                                logger.info(f"{processing_empty_prefix}  - Checking tags ELSE: {spool['extra']}")
-
-                # This is not currently in spoolman
-                if not active_spool_found:
-                    if len(internal_filament_matches) == 0:
-                        logger.info(f"{processing_empty_prefix}  - Create internal filament and spool...")
-                        new_spool = create_new_filament_and_spool(external_filament_match, tray, printer_id, time)
-                    else:
-                        logger.info(f"{processing_empty_prefix}  - Create spool...")
-                        new_spool = create_new_spool(internal_filament_matches[0], tray, printer_id, time)
-                    # Append new spool to the list, not that it should matter as will be re-fetched in next iteration
-                    spoolman_spools.append(new_spool)
-                # At least one match has been found
+                                spoolman_data = (spoolman_spools, spoolman_internal_filaments)
+                            spool = process_tray(printer_id, tray, time, *spoolman_data, external_matches.get(slot))
+                except SpoolmanUnavailableError:
+                    logger.warning(
+                        "%s  - Spoolman is unavailable, tray %s not synced...", processing_empty_prefix, slot
+                    )
+                    if (
+                        binding is not None
+                        and binding["spool_id"] is not None
+                        and binding["tray_uuid"] == tray.tray_uuid
+                    ):
+                        # The patch was journaled, so treat the tray as synced with the journaled weight
+                        remaining_weight = calculate_spool_remaining_weight(tray.weight, tray.remain)
+                        snapshot.set_slot(slot, fingerprint, tray.tray_uuid, binding["spool_id"], remaining_weight)
+                    continue
+
+                if spool is not None:
+                    set_synced_slot(printer_id, snapshot, fingerprint, tray, spool)
                 else:
-                    # Check and update the claimed spool first
-                    if claimed_spool_found is not None:
-                        logger.info(f"{processing_empty_prefix}  - Update existing claimed spool...")
-                        spoolman_spools[claimed_spool_found_index] = update_existing_spool(
-                            claimed_spool_found, tray, printer_id, time
-                        )
-                    # use an unclaimed spool
-                    elif claimed_spool_found is None and unclaimed_spool_found is not None:
-                        logger.info(f"{processing_empty_prefix}  - Claim unclaimed spool...")
-                        spoolman_spools[unclaimed_spool_found_index] = update_existing_spool(
-                            unclaimed_spool_found, tray, printer_id, time
-                        )
-
-            logger.info(f"{processing_empty_prefix}  Processed AMS Spool for {printer_id} AMS: {amsId}{trayId}")
-            logger.info("")
-            logger.info("")
-        last_ams_data[amsId] = ams_data
-
-    # otherwise skip processing as it is the same
-    else:
-        logger.info(f"Processing AMS {printer_id} AMS: [{amsId}] skipped as data has not changed")
+                    snapshot.set_slot(slot, fingerprint)
+            else:
+                snapshot.set_slot(slot, fingerprint)
+
+            logger.info("%s  Processed AMS Spool for %s AMS: %s", processing_empty_prefix, printer_id, slot)
+    finally:
+        # Persist whatever was processed, even if a later tray failed
+        snapshot.save()
+
+
+def set_synced_slot(printer_id, snapshot, fingerprint, tray, spool):
+    snapshot.set_slot(tray.slot, fingerprint, tray.tray_uuid, spool["id"], spool.get("remaining_weight"))
+    events.publish(
+        events.EVENT_SYNC,
+        {
+            "printer_id": printer_id,
+            "slot": tray.slot,
+            "tray_uuid": tray.tray_uuid,
+            "spool_id": spool["id"],
+            "remaining_weight": spool.get("remaining_weight"),
+        },
+    )
+
+
+def flush_held_trays(printer_id, snapshot, held_trays) -> int:
+    """Write the held weight updates of trays to their bound spools, returning the number of trays synced."""
+    synced = 0
+    try:
+        for fingerprint, tray, time in held_trays:
+            binding = snapshot.get_slot(tray.slot)
+            try:
+                with tray_locks.hold(tray.tray_uuid):
+                    spool = update_bound_spool(binding, tray, printer_id, time)
+            except SpoolmanUnavailableError:
+                logger.warning(
+                    "%s  - Spoolman is unavailable, tray %s not synced...", processing_empty_prefix, tray.slot
+                )
+                if binding is not None and binding["spool_id"] is not None and binding["tray_uuid"] == tray.tray_uuid:
+                    # The patch was journaled, so treat the tray as synced with the journaled weight
+                    remaining_weight = calculate_spool_remaining_weight(tray.weight, tray.remain)
+                    snapshot.set_slot(tray.slot, fingerprint, tray.tray_uuid, binding["spool_id"], remaining_weight)
+                continue
+
+            # A spool removed from Spoolman is matched again when the tray next changes
+            if spool is not None:
+                set_synced_slot(printer_id, snapshot, fingerprint, tray, spool)
+                synced += 1
+    finally:
+        snapshot.save()
+    return synced
+
+
+def fetch_spoolman_data():
+    spoolman_instance = app_state.get_spoolman()
+    # Don't wait on requests to a Spoolman instance that is known to be down
+    if spoolman_instance.is_sync_paused():
+        raise SpoolmanUnavailableError("Spoolman sync is paused")
+
+    spoolman_data = (
+        spoolman_instance.get_spools(),
+        spoolman_instance.get_internal_filament(),
+    )
+    # Failed requests return an error dict rather than a list
+    if not all(isinstance(data, list) for data in spoolman_data):
+        raise SpoolmanUnavailableError("Spoolman spool and filament data could not be fetched")
+    color_index = spoolman_instance.get_external_color_index()
+    if color_index is None:
+        raise SpoolmanUnavailableError("Spoolman external filament data could not be fetched")
+    return (*spoolman_data, color_index)
+
+
+def update_bound_spool(binding, tray, printer_id, current_time):
+    """Update the spool the tray was bound to when it was last processed, without fetching any spool lists.
+
+    If the snapshot has no binding for the tray the local index is checked for a spool claimed by it. If a fresh list
+    of the spools is cached, the bound spool has to be in it and still claimed by the tray, so a spool archived or
+    unclaimed by hand in Spoolman isn't updated. Returns None if the tray has no usable binding, in which case it has
+    to be matched against Spoolman.
+    """
+    spoolman_instance = app_state.get_spoolman()
+    spoolman_index = spoolman_instance.index
+    if binding is None or binding["spool_id"] is None or binding["tray_uuid"] != tray.tray_uuid:
+        binding = spoolman_index.get_binding(tray.tray_uuid)
+        if binding is None:
+            return None
+
+    cached_spools = spoolman_instance.get_cached_spools()
+    if cached_spools is not None:
+        cached_spool = next((spool for spool in cached_spools if spool["id"] == binding["spool_id"]), None)
+        tag = env.get_settings().spoolman_tag_api
+        if cached_spool is None or get_spool_tray_uuid(cached_spool, tag) != tray.tray_uuid:
+            logger.info(
+                "%s  - Bound spool %s is no longer claimed by the tray...", processing_empty_prefix, binding["spool_id"]
+            )
+            spoolman_index.remove_spool(binding["spool_id"])
+            return None
+
+    bound_spool = {
+        "id": binding["spool_id"],
+        "remaining_weight": binding["remaining_weight"],
+        # Spool was claimed when the binding was made, so first_used has already been set
+        "first_used": current_time.isoformat(),
+    }
+    try:
+        spool = update_existing_spool(bound_spool, tray, printer_id, current_time)
+    except ItemUpdateError:
+        # The bound spool may have been removed from Spoolman, fall back to matching the tray
+        logger.info("%s  - Bound spool %s could not be updated...", processing_empty_prefix, binding["spool_id"])
+        spoolman_index.remove_spool(binding["spool_id"])
+        return None
+
+    logger.info("%s  - Used bound spool %s...", processing_empty_prefix, binding["spool_id"])
+    return spool
+
+
+def process_tray(printer_id, tray, time, spoolman_spools, spoolman_internal_filaments, external_filament_match):
+    # The tray has to match a filament in the external DB to be created or matched in spoolman
+    if external_filament_match is None:
+        logger.warning(
+            "%s  - No Bambu Lab filament matches %s %s, tray not synced...",
+            processing_empty_prefix,
+            tray.sub_brands,
+            tray.color,
+        )
+        return None
+    # Claims and creates of a filament are serialised, so two trays can't claim the same spool or create duplicates
+    with filament_locks.hold(external_filament_match["id"]):
+        # Another printer may have claimed or created a spool of the filament since these were fetched
+        refresh_spoolman_data(spoolman_spools, spoolman_internal_filaments)
+
+        # Check if this spool already exists in spoolman
+        internal_filament_matches = check_spool_matches_internal(
+            spoolman_internal_filaments, external_filament_match, tray
+        )
 
+        # Look for a spool already claimed by this tray, or an unclaimed spool of the same filament to claim
+        claimed_spool_found_index, unclaimed_spool_found_index = None, None
+        if len(internal_filament_matches) > 0:
+            claimed_spool_found_index, unclaimed_spool_found_index = find_tray_spools(
+                spoolman_spools, internal_filament_matches[0]["external_id"], tray.tray_uuid
+            )
+        active_spool_found = claimed_spool_found_index is not None or unclaimed_spool_found_index is not None
+
+        # This is not currently in spoolman
+        if not active_spool_found:
+            if len(internal_filament_matches) == 0:
+                logger.info("%s  - Create internal filament and spool...", processing_empty_prefix)
+                new_spool = create_new_filament_and_spool(external_filament_match, tray, printer_id, time)
+            else:
+                logger.info("%s  - Create spool...", processing_empty_prefix)
+                new_spool = create_new_spool(internal_filament_matches[0], tray, printer_id, time)
+            # Append new spool to the list so later trays in the same AMS unit can see it
+            spoolman_spools.append(new_spool)
+            return new_spool
+
+        # Check and update the claimed spool first
+        if claimed_spool_found_index is not None:
+            logger.info("%s  - Update existing claimed spool...", processing_empty_prefix)
+            spoolman_spools[claimed_spool_found_index] = update_existing_spool(
+                spoolman_spools[claimed_spool_found_index], tray, printer_id, time
+            )
+            return spoolman_spools[claimed_spool_found_index]
+
+        # use an unclaimed spool
+        logger.info("%s  - Claim unclaimed spool...", processing_empty_prefix)
+        spoolman_spools[unclaimed_spool_found_index] = update_existing_spool(
+            spoolman_spools[unclaimed_spool_found_index], tray, printer_id, time, claim=True
+        )
+        return spoolman_spools[unclaimed_spool_found_index]
 
-def create_new_filament_and_spool(filament, tray, printer_id, current_time):
-    spoolman_instance = app_state.get_spoolman()
-    internal_filament_id = None
 
-    new_filament_data = {
+def refresh_spoolman_data(spoolman_spools, spoolman_internal_filaments):
+    """Refresh the spool and filament lists in place, served from the cache unless they have been written to."""
+    spoolman_instance = app_state.get_spoolman()
+    spools = spoolman_instance.get_spools()
+    internal_filaments = spoolman_instance.get_internal_filament()
+    if not isinstance(spools, list) or not isinstance(internal_filaments, list):
+        raise SpoolmanUnavailableError("Spoolman spool and filament data could not be fetched")
+    spoolman_spools[:] = spools
+    spoolman_internal_filaments[:] = internal_filaments
+
+
+def find_tray_spools(spoolman_spools, external_id, tray_uuid):
+    """Find the spools of a filament that are claimed by the tray or unclaimed.
+
+    Returns the index of the claimed spool and of the last unclaimed spool in the list, each None if not found.
+    """
+    spoolman_custom_tag_api = env.get_settings().spoolman_tag_api
+    claimed_spool_index = None
+    unclaimed_spool_index = None
+    for spool_index, spool in enumerate(spoolman_spools):
+        # Check if the matched filament matches the current spool
+        if spool["filament"]["external_id"] != external_id:
+            continue
+
+        # Check if the tag[TAG] extra data is either empty/unclaimed or it is set and it matches the tray
+        tag = spool["extra"].get(spoolman_custom_tag_api)
+        if tag is None or tag == '""':
+            logger.debug(
+                "%s  - Checking tags unclaimed: %s",
+                processing_empty_prefix,
+                spool["extra"],
+                extra={"sample_rate": REPORT_SAMPLE_RATE},
+            )
+            unclaimed_spool_index = spool_index
+        elif tag == f'"{tray_uuid}"':
+            logger.debug(
+                "%s  - Checking tags claimed: %s",
+                processing_empty_prefix,
+                spool["extra"],
+                extra={"sample_rate": REPORT_SAMPLE_RATE},
+            )
+            claimed_spool_index = spool_index
+        else:
+            logger.debug(
+                "%s  - Checking tags claimed by another tray: %s",
+                processing_empty_prefix,
+                spool["extra"],
+                extra={"sample_rate": REPORT_SAMPLE_RATE},
+            )
+    return claimed_spool_index, unclaimed_spool_index
+
+
+def build_filament_data(filament, tray):
+    """Build the Spoolman filament for an external Bambu Lab filament."""
+    return {
         "name": filament["name"],
-        "material": tray["tray_sub_brands"],
+        "material": tray.sub_brands,
         "density": filament["density"],
         "diameter": filament["diameter"],
         "spool_weight": 250,
@@ -192,71 +379,95 @@ def create_new_filament_and_spool(filament, tray, printer_id, current_time):
         "vendor_id": app_state.get_spoolman().get_vendor_id(),
     }
 
+
+def create_new_filament_and_spool(filament, tray, printer_id, current_time):
+    spoolman_instance = app_state.get_spoolman()
+
     # logger.info(f"New Filament data: {json.dumps(new_filament_data)}")
-    filament = spoolman_instance.create_internal_filament(new_filament_data)
+    filament = spoolman_instance.create_internal_filament(build_filament_data(filament, tray))
 
     if filament is not None:
-        logger.info(f"{processing_empty_prefix}  - New Filament created successfully: {filament['id']}")
+        logger.info("%s  - New Filament created successfully: %s", processing_empty_prefix, filament["id"])
         return create_new_spool(filament, tray, printer_id, current_time)
     else:
         raise ItemCreateError("Item failed to be created")
 
 
-def create_new_spool(filament, tray, printer_id, current_time):
-    spoolman_instance = app_state.get_spoolman()
-
-    new_spool_data = {
-        "filament_id": filament["id"],
-        "initial_weight": calculate_spool_remaining_weight(tray["tray_weight"], tray["remain"]),
+def build_spool_data(filament_id, tray, printer_id, current_time):
+    """Build a new Spoolman spool of a filament, claimed by the tray."""
+    spoolman_custom_tag_api = env.get_settings().spoolman_tag_api
+    return {
+        "filament_id": filament_id,
+        "initial_weight": calculate_spool_remaining_weight(tray.weight, tray.remain),
         "first_used": current_time.isoformat(),
         "location": printer_id,
-        "extra": {f"{spoolman_custom_tag_api}": f"\"{tray['tray_uuid']}\""},
+        "extra": {f"{spoolman_custom_tag_api}": f'"{tray.tray_uuid}"'},
     }
 
-    spool = spoolman_instance.create_spool(new_spool_data)
+
+def create_new_spool(filament, tray, printer_id, current_time):
+    spoolman_instance = app_state.get_spoolman()
+
+    spool = spoolman_instance.create_spool(build_spool_data(filament["id"], tray, printer_id, current_time))
 
     if spool is not None:
-        logger.info(f"{processing_empty_prefix}  - New Spool created successfully: {spool['id']}")
+        logger.info("%s  - New Spool created successfully: %s", processing_empty_prefix, spool["id"])
         return spool
     else:
         raise ItemCreateError("Item failed to be created")
 
 
-def update_existing_spool(spool, tray, printer_id, current_time):
+def build_spool_patch_data(spool, tray, printer_id, current_time):
+    """Build the patch which updates a spool from the tray, claiming it for the tray if it isn't already."""
+    spool_patch_data = {
+        "remaining_weight": calculate_spool_remaining_weight(tray.weight, tray.remain),
+        "last_used": current_time.isoformat(),
+        "location": printer_id,
+        "extra": {f"{env.get_settings().spoolman_tag_api}": f'"{tray.tray_uuid}"'},
+    }
+
+    # If claiming a spool and first_used isn't set update it
+    if "first_used" not in spool.keys() or spool["first_used"] is None or spool["first_used"] == "":
+        spool_patch_data["first_used"] = current_time.isoformat()
+    return spool_patch_data
+
+
+def update_existing_spool(spool, tray, printer_id, current_time, claim=False):
     spoolman_instance = app_state.get_spoolman()
-    remaining_weight = calculate_spool_remaining_weight(tray["tray_weight"], tray["remain"])
+    settings = env.get_settings()
+    remaining_weight = calculate_spool_remaining_weight(tray.weight, tray.remain)
 
-    # Sanity check if anything has actually changed otherwise no point patching
-    if spool["remaining_weight"] != remaining_weight:
+    # Sanity check if anything has actually changed otherwise no point patching, a claim always has to be written
+    # so other trays see the spool is taken
+    if claim or spool["remaining_weight"] != remaining_weight:
         logger.info(
-            f"{processing_empty_prefix}  - Patch spool {spool['id']} weight:{remaining_weight}, {spoolman_custom_tag}:{tray['tray_uuid']}, last:{current_time}"
+            "%s  - Patch spool %s weight:%s, %s:%s, last:%s",
+            processing_empty_prefix,
+            spool["id"],
+            remaining_weight,
+            settings.spoolman_tag,
+            tray.tray_uuid,
+            current_time,
         )
-        spool_patch_data = {
-            "remaining_weight": remaining_weight,
-            "last_used": current_time.isoformat(),
-            "location": printer_id,
-            "extra": {f"{spoolman_custom_tag_api}": f"\"{tray['tray_uuid']}\""},
-        }
-
-        # If claiming a spool and first_used isn't set update it
-        if "first_used" not in spool.keys() or spool["first_used"] is None or spool["first_used"] == "":
-            spool_patch_data["first_used"] = current_time.isoformat()
-
         # Patch the current spool with the updated values and update it in the internal array
         # Note extra field spoolman_custom_tag, for success request needs to be lower case
-        updated_spool = spoolman_instance.patch_spool(spool["id"], spool_patch_data)
+        updated_spool = spoolman_instance.patch_spool(
+            spool["id"], build_spool_patch_data(spool, tray, printer_id, current_time)
+        )
         if updated_spool is not None:
             return updated_spool
         else:
             raise ItemUpdateError("Item failed to be updated")
     else:
         # Ignore the update and just return the spool as is
-        logger.info("Weight has not changed skipping update")
+        logger.debug("Weight has not changed skipping update", extra={"sample_rate": REPORT_SAMPLE_RATE})
         return spool
 
 
 def check_spool_matches_internal(internal_filaments, external_filament_match, tray):
     bambu_internal_spools = []
+    if external_filament_match is None:
+        return bambu_internal_spools
 
     for filament in internal_filaments:
         # logger.info(f"Check internal filament: {filament}")
@@ -266,27 +477,10 @@ def check_spool_matches_internal(internal_filaments, external_filament_match, tr
             # TODO: Further checks to ensure it has the same tray_uuid or tray_uuid is not set
             bambu_internal_spools.append(filament)
 
-    logger.info(f"{processing_empty_prefix}  - Found {len(bambu_internal_spools)} matching internal spools...")
+    logger.info("%s  - Found %s matching internal spools...", processing_empty_prefix, len(bambu_internal_spools))
     # logger.info(f"Found {bambu_internal_spools}")
     return bambu_internal_spools
 
 
-def check_spool_matches_external(external_filaments, tray):
-    mutation_checks = [
-        f"bambulab_{tray['tray_sub_brands'].lower()}",
-        f"bambulab_{tray['tray_sub_brands'].lower().replace(' ', '_')}",
-        f"bambulab_{(tray['tray_sub_brands'].lower().split(' ')[0]).replace(' ', '_')}",
-    ]
-    for id_check in mutation_checks:
-        for filament in external_filaments:
-            if filament["id"].startswith(id_check):
-
-                # Check if using single colour or multi
-                if filament["color_hex"] is not None:
-                    if filament["color_hex"].lower() == tray["tray_color"][:6].lower():
-                        # logger.info(f"Found {filament}")
-                        return filament
-
-
 def calculate_spool_remaining_weight(tray_weight, remaining):
     return (remaining / 100) * float(tray_weight)
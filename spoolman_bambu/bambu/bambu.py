@@ -3,14 +3,22 @@ import random
 import datetime
 import json
 import ssl
+import threading
 import time
 
 from paho.mqtt import client as mqtt_client
 
-from spoolman_bambu import env
-from . import ams_processor
+from spoolman_bambu import env, events, state
+from spoolman_bambu.log import REPORT_SAMPLE_RATE
+from . import ams_processor, snapshot
+from .jobs import JobTracker
+from .print_sync import SYNC_MODE_PRINT, HeldTrays
+from .pushall import PushallScheduler
+from .models import Printer
+from .tray_state import TrayState
 
 logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
 
 
 class Bambu:
@@ -26,6 +34,27 @@ class Bambu:
         self.ams_unit_count = None
         self.ams_active_spools_count = None
         self.last_ams_data = {}
+        self.printer_state = None
+        # Restore the last processed trays so a restart doesn't re-sync every tray
+        self.ams_snapshot = snapshot.load_snapshot(self.printer_id)
+        # Versioned view of the loaded trays served by the API
+        self.tray_state = TrayState()
+        # The tray state is updated from the MQTT thread and by reconciliation
+        self.tray_state_lock = threading.Lock()
+        # Attributes the filament used to each print job
+        self.job_tracker = JobTracker(
+            self.printer_id,
+            app_state.get_job_ledger(),
+            spool_resolver=self.get_bound_spool_id,
+            on_job_end=self.on_job_end,
+        )
+        # Weight updates held during a print in the print sync mode
+        self.held_trays = HeldTrays()
+        # Asks the printer for its complete state after connecting and on a cadence
+        settings = env.get_settings()
+        self.pushall = PushallScheduler(
+            self.printer_id, self.publish_request, settings.pushall_interval, settings.pushall_jitter
+        )
 
         logger.info(
             "Bambu printer instance %s:%s configured: %s::%s",
@@ -55,9 +84,10 @@ class Bambu:
             # Start listening without blocking
             conn = self.client.loop_start()
             logger.info(
-                f"Bambu printer instance %s:%s loop start... {conn}",
+                "Bambu printer instance %s:%s loop start... %s",
                 self.printer_id,
                 self.printer_ip,
+                conn,
             )
 
             # TODO: Improve this
@@ -65,13 +95,13 @@ class Bambu:
             time.sleep(5)
             if not self.client.is_connected():
                 logger.info(
-                    f"Bambu printer instance %s:%s failed to connect.",
+                    "Bambu printer instance %s:%s failed to connect.",
                     self.printer_id,
                     self.printer_ip,
                 )
         except:
             logger.info(
-                f"Bambu printer instance %s:%s failed... ",
+                "Bambu printer instance %s:%s failed... ",
                 self.printer_id,
                 self.printer_ip,
             )
@@ -114,8 +144,10 @@ class Bambu:
                 self.printer_ip,
             )
             self.status = "connected"
+            events.publish(events.EVENT_PRINTER, {"printer_id": self.printer_id, "status": self.status})
             # Bambu requires you to subscribe promptly after connecting or it forces a discconnect
             self.client.subscribe(f"device/{self.printer_id}/report")
+            self.pushall.on_connect()
         else:
             logger.info(
                 "Bambu printer instance %s:%s connection to broker failed",
@@ -125,6 +157,7 @@ class Bambu:
 
     def on_connect_fail(self, userdata):
         self.status = "disconnected"
+        events.publish(events.EVENT_PRINTER, {"printer_id": self.printer_id, "status": self.status})
         logger.info(
             "Bambu printer instance %s:%s on_connect_fail broker failed",
             self.printer_id,
@@ -135,33 +168,139 @@ class Bambu:
         current_time = datetime.datetime.now()
         doc = json.loads(msg.payload)
         self.set_last_mqtt_message(current_time)
-        # logger.info(f"{self.printer_id}: {doc}")
+        logger.debug("Printer %s report: %s", self.printer_id, doc, extra={"sample_rate": REPORT_SAMPLE_RATE})
 
         # Validate we have the correct message
-        if "print" in doc and "ams" in doc["print"] and "ams" in doc["print"]["ams"]:
+        has_ams = "print" in doc and "ams" in doc["print"] and "ams" in doc["print"]["ams"]
+        if has_ams:
             self.set_last_mqtt_ams_message(current_time)
 
-            # Note is double nested for some reason
-            amsUpdate = doc["print"]["ams"]["ams"]
+            # Note is double nested for some reason, parse it once into the typed model
+            self.printer_state = Printer.from_report(self.printer_id, doc["print"]["ams"]["ams"])
 
             # Set the currently connected AMS units
-            self.ams_unit_count = len(amsUpdate)
+            self.ams_unit_count = len(self.printer_state.ams_units)
+            self.ams_active_spools_count = sum(1 for tray in self.printer_state.get_trays() if tray.is_valid())
 
-            # For each AMS unit process these individually
-            for ams_unit in amsUpdate:
-                ams_unit_id = env.convert_id_to_char(ams_unit["id"])
-                # Initialise the internal comparison
-                if ams_unit_id not in self.last_ams_data.keys():
-                    self.last_ams_data[ams_unit_id] = {}
+            # Record the tray and AMS values in the history
+            history = app_state.get_history()
+            if history is not None:
+                history.record_printer(self.printer_state, current_time.timestamp())
 
-                # Send for further processing per AMS unit
-                ams_processor.process_ams(self.printer_id, self.last_ams_data[ams_unit_id], ams_unit, current_time)
+            # In the print sync mode the weight updates of trays in use are held while a job is running
+            held = None
+            if env.get_settings().sync_mode == SYNC_MODE_PRINT and self.job_tracker.get_job() is not None:
+                held = self.held_trays
 
-                self.last_ams_data[ams_unit_id] = ams_unit
+            # For each AMS unit process these individually
+            alerts = app_state.get_alerts()
+            for ams_unit in self.printer_state.ams_units:
+                # Skip straight past units whose trays are identical to the last report
+                last_ams_unit = self.last_ams_data.get(ams_unit.id)
+                if alerts is not None and (last_ams_unit is None or last_ams_unit.humidity != ams_unit.humidity):
+                    alerts.evaluate_ams(self.printer_id, ams_unit)
+                if last_ams_unit is None or last_ams_unit.trays != ams_unit.trays:
+                    # Send for further processing per AMS unit
+                    ams_processor.process_ams(self.printer_id, self.ams_snapshot, ams_unit, current_time, held)
+
+                self.last_ams_data[ams_unit.id] = ams_unit
+
+            # After processing, so the trays are joined with the spools they were just bound to
+            self.update_tray_state()
+
+        # Job state, progress and the active tray arrive in the same reports, with or without the AMS units
+        if "print" in doc:
+            self.job_tracker.update(doc["print"], self.printer_state if has_ams else None, current_time.timestamp())
+
+        # Flushed once the job has ended, or the oldest held update has been held for too long
+        if self.held_trays.get_count() > 0 and (
+            self.job_tracker.get_job() is None or self.held_trays.is_due(env.get_settings().sync_flush_interval)
+        ):
+            self.flush_held_trays()
+
+    def update_tray_state(self):
+        """Update the API view of the trays from the latest report and snapshot, publishing what changed."""
+        with self.tray_state_lock:
+            version = self.tray_state.get_version()
+            if self.tray_state.update(self.printer_state, self.ams_snapshot) > 0:
+                changes = self.tray_state.get_changes(version)
+                self.apply_tray_changes(changes)
+                events.publish(events.EVENT_AMS, {"printer_id": self.printer_id, **changes})
+
+    def set_synced_tray(self, slot, fingerprint, spool):
+        """Record a spool synced outside of the printer's reports, such as by reconciliation.
+
+        Only recorded if the tray it was synced from is still loaded unchanged, otherwise the next report syncs it.
+        Returns whether it was recorded.
+        """
+        printer_state = self.printer_state
+        if printer_state is None:
+            return False
+        tray = next((tray for tray in printer_state.get_trays() if tray.slot == slot), None)
+        if tray is None or tray.fingerprint() != fingerprint:
+            return False
+
+        ams_processor.set_synced_slot(self.printer_id, self.ams_snapshot, fingerprint, tray, spool)
+        self.ams_snapshot.save()
+        self.update_tray_state()
+        return True
+
+    def apply_tray_changes(self, changes):
+        """Apply only the changed and removed trays to the fleet inventory and evaluate their alerts."""
+        inventory = app_state.get_inventory()
+        alerts = app_state.get_alerts()
+        changed = {tray["slot"] for tray in changes["trays"]}
+        materials = set()
+        for tray in self.printer_state.get_trays():
+            if tray.slot in changed:
+                if inventory is not None:
+                    inventory.update_tray(self.printer_id, tray)
+                if alerts is not None:
+                    materials.update(alerts.evaluate_tray(self.printer_id, tray))
+        for slot in changes["removed"]:
+            if inventory is not None:
+                inventory.remove_tray(self.printer_id, slot)
+            if alerts is not None:
+                materials.update(alerts.remove_tray(self.printer_id, slot))
+
+        # Slots are only removed along with their AMS unit, whose humidity is no longer reported
+        if alerts is not None:
+            ams_ids = {ams_unit.id for ams_unit in self.printer_state.ams_units}
+            for ams_id in {slot[:-1] for slot in changes["removed"]} - ams_ids:
+                alerts.remove_ams(self.printer_id, ams_id)
+
+        # Only the materials of the changed and removed trays can have changed their fleet total
+        if alerts is not None and inventory is not None:
+            for material in materials:
+                alerts.evaluate_material(material, inventory.get_material_remaining(material))
+
+    def flush_held_trays(self):
+        held_trays = self.held_trays.take_all()
+        if len(held_trays) > 0:
+            synced = ams_processor.flush_held_trays(self.printer_id, self.ams_snapshot, held_trays)
+            logger.info("Printer %s flushed %s held trays, %s synced", self.printer_id, len(held_trays), synced)
+
+    def publish_request(self, payload):
+        if not self.client.is_connected():
+            return False
+        result = self.client.publish(f"device/{self.printer_id}/request", json.dumps(payload))
+        return result.rc == mqtt_client.MQTT_ERR_SUCCESS
+
+    def get_bound_spool_id(self, tray_uuid):
+        spoolman_instance = app_state.get_spoolman()
+        binding = spoolman_instance.index.get_binding(tray_uuid) if spoolman_instance is not None else None
+        return binding["spool_id"] if binding is not None else None
+
+    def on_job_end(self, records):
+        events.publish(events.EVENT_JOB, {"printer_id": self.printer_id, "records": records})
+        # The weights held during the job are written as soon as it ends
+        self.flush_held_trays()
 
     def on_disconnect(self, client, userdata, rc):
-        logger.info(f"Bambu printer instance disconnected from MQTT Broker {self.printer_id} {rc}")
+        logger.info("Bambu printer instance disconnected from MQTT Broker %s %s", self.printer_id, rc)
         self.status = "disconnected"
+        self.pushall.on_disconnect()
+        events.publish(events.EVENT_PRINTER, {"printer_id": self.printer_id, "status": self.status})
 
     def get_printer_id(self):
         return self.printer_id
@@ -169,6 +308,9 @@ class Bambu:
     def get_printer_ip(self):
         return self.printer_ip
 
+    def get_printer_code(self):
+        return self.printer_code
+
     def get_status(self):
         return self.status
 
@@ -184,11 +326,36 @@ class Bambu:
     def set_last_mqtt_ams_message(self, current_time):
         self.last_mqtt_ams_message = current_time
 
+    def get_printer_state(self):
+        return self.printer_state
+
     def get_ams_unit_count(self):
         return self.ams_unit_count
 
     def get_ams_active_spools_count(self):
-        return self.get_ams_active_spools_count
+        return self.ams_active_spools_count
+
+    def get_tray_state(self):
+        return self.tray_state
+
+    def get_job_tracker(self):
+        return self.job_tracker
+
+    def get_held_trays(self):
+        return self.held_trays
+
+    def get_pushall(self):
+        return self.pushall
 
     def disconnect(self):
         self.client.disconnect()
+
+    def stop(self):
+        """Disconnect and stop the MQTT network thread, so the printer can be removed or replaced."""
+        logger.info("Bambu printer instance %s:%s stopping...", self.printer_id, self.printer_ip)
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.status = "disconnected"
+        # Held weight updates would otherwise only be synced when the trays next change
+        self.flush_held_trays()
+        self.ams_snapshot.save()
@@ -0,0 +1,190 @@
+"""Perceptual nearest-color matching of AMS trays against the Bambu Lab filaments in the external DB.
+
+Filament colors are converted to CIE Lab once, where the euclidean distance (CIE76 delta E) roughly follows how
+different two colors look, and single color filaments are held in a KD-tree per filament id prefix so the nearest
+color is found without comparing against every filament. Multi-color filaments are compared as color sets.
+"""
+
+import logging
+import math
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from spoolman_bambu.log import REPORT_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4096)
+def hex_to_lab(color_hex: str) -> tuple[float, float, float]:
+    """Convert an RRGGBB (optionally RRGGBBAA) sRGB hex color to CIE Lab under a D65 white point."""
+
+    def linearise(channel: int) -> float:
+        value = channel / 255
+        return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+    red, green, blue = (linearise(int(color_hex[index : index + 2], 16)) for index in (0, 2, 4))
+    x = (0.4124564 * red + 0.3575761 * green + 0.1804375 * blue) / 0.95047
+    y = 0.2126729 * red + 0.7151522 * green + 0.0721750 * blue
+    z = (0.0193339 * red + 0.1191920 * green + 0.9503041 * blue) / 1.08883
+
+    def f(t: float) -> float:
+        return t ** (1 / 3) if t > 216 / 24389 else (24389 / 27 * t + 16) / 116
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return (116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz))
+
+
+def delta_e(lab_a: tuple, lab_b: tuple) -> float:
+    return math.dist(lab_a, lab_b)
+
+
+def set_distance(labs_a: tuple, labs_b: tuple) -> float:
+    """Distance between two color sets, the average distance of each color to the nearest color of the other set."""
+    forward = sum(min(delta_e(lab, other) for other in labs_b) for lab in labs_a) / len(labs_a)
+    backward = sum(min(delta_e(lab, other) for other in labs_a) for lab in labs_b) / len(labs_b)
+    return (forward + backward) / 2
+
+
+class KDTree:
+    """Static 3-d tree of (point, item) pairs answering nearest neighbour queries."""
+
+    def __init__(self, points: list[tuple[tuple, object]]):
+        self.size = len(points)
+        self.root = self._build(list(points), 0)
+
+    def _build(self, points: list, axis: int):
+        if len(points) == 0:
+            return None
+        points.sort(key=lambda point: point[0][axis])
+        middle = len(points) // 2
+        next_axis = (axis + 1) % 3
+        return (
+            points[middle][0],
+            points[middle][1],
+            axis,
+            self._build(points[:middle], next_axis),
+            self._build(points[middle + 1 :], next_axis),
+        )
+
+    def nearest(self, target: tuple) -> tuple[float, Optional[object]]:
+        best = [math.inf, None]
+
+        def search(node):
+            if node is None:
+                return
+            point, item, axis, left, right = node
+            distance = delta_e(point, target)
+            if distance < best[0]:
+                best[0], best[1] = distance, item
+            offset = target[axis] - point[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            search(near)
+            # Only cross the splitting plane if it is closer than the best match so far
+            if abs(offset) < best[0]:
+                search(far)
+
+        search(self.root)
+        return best[0], best[1]
+
+
+def get_filament_colors(filament: dict) -> tuple[str, ...]:
+    """Get the colors of a filament, more than one for multi-color filaments."""
+    color_hexes = filament.get("color_hexes")
+    if isinstance(color_hexes, str):
+        color_hexes = color_hexes.split(",")
+    if color_hexes:
+        return tuple(color.strip()[:6] for color in color_hexes if color.strip())
+    if filament.get("color_hex"):
+        return (filament["color_hex"][:6],)
+    return ()
+
+
+def get_tray_colors(tray) -> tuple[str, ...]:
+    """Get the distinct colors of a tray, more than one for multi-color spools."""
+    colors = tuple(dict.fromkeys(color[:6].upper() for color in tray.colors if len(color) >= 6))
+    return colors if len(colors) > 0 else (tray.color[:6].upper(),)
+
+
+def get_id_prefixes(tray) -> list[str]:
+    """Get the external filament id prefixes a tray may match, most specific first."""
+    sub_brands = tray.sub_brands.lower()
+    prefixes = [
+        f"bambulab_{sub_brands}",
+        f"bambulab_{sub_brands.replace(' ', '_')}",
+        f"bambulab_{(sub_brands.split(' ')[0]).replace(' ', '_')}",
+    ]
+    return list(dict.fromkeys(prefixes))
+
+
+class FilamentColorIndex:
+    def __init__(self, filaments: list[dict], tolerance: float):
+        """
+        Index the external filaments by color.
+
+        :param filaments: The external Bambu Lab filaments.
+        :param tolerance: The largest delta E a tray color can be from a filament color and still match it.
+        """
+        # Sorted so ties always resolve to the same filament
+        self.filaments = sorted(filaments, key=lambda filament: filament["id"])
+        self.tolerance = tolerance
+        self.lock = threading.Lock()
+        self.prefixes: dict[str, tuple[KDTree, list]] = {}
+
+    def _get_prefix(self, prefix: str) -> tuple[KDTree, list]:
+        """Get the KD-tree of single color filaments and the list of multi-color filaments with an id prefix."""
+        with self.lock:
+            indexed = self.prefixes.get(prefix)
+            if indexed is None:
+                single, multi = [], []
+                for filament in self.filaments:
+                    if not filament["id"].startswith(prefix):
+                        continue
+                    colors = get_filament_colors(filament)
+                    try:
+                        labs = tuple(hex_to_lab(color) for color in colors)
+                    except ValueError:
+                        logger.debug("Filament %s has an invalid color %s", filament["id"], colors)
+                        continue
+                    if len(labs) == 1:
+                        single.append((labs[0], filament))
+                    elif len(labs) > 1:
+                        multi.append((labs, filament))
+                indexed = (KDTree(single), multi)
+                self.prefixes[prefix] = indexed
+            return indexed
+
+    def match(self, tray) -> Optional[dict]:
+        """Find the filament nearest in color to the tray, within the tolerance, trying each id prefix in turn."""
+        try:
+            labs = tuple(hex_to_lab(color) for color in get_tray_colors(tray))
+        except ValueError:
+            logger.warning("Tray %s has an invalid color %s", tray.slot, tray.color)
+            return None
+
+        for prefix in get_id_prefixes(tray):
+            tree, multi = self._get_prefix(prefix)
+            if len(labs) == 1:
+                distance, filament = tree.nearest(labs[0])
+            else:
+                distance, filament = math.inf, None
+                for filament_labs, candidate in multi:
+                    candidate_distance = set_distance(labs, filament_labs)
+                    if candidate_distance < distance:
+                        distance, filament = candidate_distance, candidate
+
+            if filament is not None and distance <= self.tolerance:
+                logger.debug(
+                    "Tray %s matched %s with delta E %.2f",
+                    tray.slot,
+                    filament["id"],
+                    distance,
+                    extra={"sample_rate": REPORT_SAMPLE_RATE},
+                )
+                return filament
+        return None
+
+    def match_trays(self, trays) -> dict[str, Optional[dict]]:
+        """Match a batch of trays, e.g. a whole AMS unit, returning the matched filament per tray slot."""
+        return {tray.slot: self.match(tray) for tray in trays}
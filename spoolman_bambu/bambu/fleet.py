@@ -0,0 +1,116 @@
+"""Printer configuration persisted in the data dir, so printers added or removed at runtime survive a restart.
+
+The env configured printers are still read on startup. The persisted file records the printers added or changed
+through the API, which override the env configuration, and the printers removed through the API, which are skipped.
+
+It also records the id the API addresses each printer by. Ids are assigned once per serial and never reused, so
+removing a printer doesn't change the id of any other printer, nor does a restart.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from spoolman_bambu import env
+from spoolman_bambu.api.v1.models import PrinterConfig
+
+logger = logging.getLogger(__name__)
+
+PRINTERS_VERSION = 1
+
+lock = threading.Lock()
+
+
+def get_printers_path() -> Path:
+    return env.get_settings().data_dir.joinpath("printers.json")
+
+
+def _read() -> dict:
+    path = get_printers_path()
+    doc = {}
+    if path.exists():
+        try:
+            with path.open(encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            logger.error("Printer configuration at %s is unreadable, ignoring it", path)
+        if not isinstance(doc, dict):
+            logger.error("Printer configuration at %s is not an object, ignoring it", path)
+            doc = {}
+
+    # The file may have been edited by hand, so fill in anything missing
+    doc.setdefault("version", PRINTERS_VERSION)
+    doc.setdefault("printers", [])
+    doc.setdefault("removed", [])
+    doc.setdefault("ids", {})
+    return doc
+
+
+def _write(doc: dict) -> None:
+    path = get_printers_path()
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_printer_configs() -> list[PrinterConfig]:
+    """Get the configured printers, the env configuration overlaid with the persisted runtime changes."""
+    with lock:
+        doc = _read()
+
+    configs = {}
+    for printer in env.get_all_printer_env_vars():
+        configs[printer.printer_id] = printer
+
+    for printer in doc.get("printers", []):
+        try:
+            config = PrinterConfig(**printer)
+        except (TypeError, ValidationError):
+            logger.error("Failed configuring persisted printer %s", printer.get("printer_id"))
+            continue
+        configs[config.printer_id] = config
+
+    for printer_id in doc.get("removed", []):
+        configs.pop(printer_id, None)
+
+    return list(configs.values())
+
+
+def save_printer_config(config: PrinterConfig) -> None:
+    """Persist an added or changed printer."""
+    with lock:
+        doc = _read()
+        doc["printers"] = [printer for printer in doc["printers"] if printer.get("printer_id") != config.printer_id]
+        doc["printers"].append(config.model_dump())
+        doc["removed"] = [printer_id for printer_id in doc["removed"] if printer_id != config.printer_id]
+        _write(doc)
+
+
+def remove_printer_config(printer_id: str) -> None:
+    """Persist the removal of a printer, including one configured by env."""
+    with lock:
+        doc = _read()
+        doc["printers"] = [printer for printer in doc["printers"] if printer.get("printer_id") != printer_id]
+        if printer_id not in doc["removed"]:
+            doc["removed"].append(printer_id)
+        _write(doc)
+
+
+def get_printer_number(printer_id: str) -> int:
+    """Get the id the API addresses a printer by, assigning and persisting the next free id on first use."""
+    with lock:
+        doc = _read()
+        number = doc["ids"].get(printer_id)
+        if number is None:
+            # Removed printers keep their id, so an id is never reused for a different printer
+            number = max(doc["ids"].values(), default=0) + 1
+            doc["ids"][printer_id] = number
+            _write(doc)
+        return number
@@ -0,0 +1,152 @@
+"""Fleet inventory aggregates, maintained incrementally as trays change.
+
+The grams loaded and remaining per material, color and printer, and the number of empty and invalid trays, are kept as
+running totals. Each tray change subtracts the tray's previous contribution and adds its new one, so updating is
+constant time and reading never scans the printers.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+KIND_LOADED = "loaded"
+KIND_EMPTY = "empty"
+KIND_INVALID = "invalid"
+
+
+def get_contribution(tray) -> tuple:
+    """Get what a tray adds to the aggregates as (kind, material, color, loaded grams, remaining grams)."""
+    if tray.is_empty():
+        return KIND_EMPTY, None, None, 0.0, 0.0
+    if not tray.is_valid():
+        return KIND_INVALID, None, None, 0.0, 0.0
+    return KIND_LOADED, tray.tray_type, tray.color, tray.weight, tray.remain / 100 * tray.weight
+
+
+def _new_group() -> dict:
+    return {"trays": 0, "empty_trays": 0, "invalid_trays": 0, "loaded_weight": 0.0, "remaining_weight": 0.0}
+
+
+def _add(groups: dict, key, contribution: tuple, sign: int) -> None:
+    kind, _, _, loaded, remaining = contribution
+    group = groups.get(key)
+    if group is None:
+        group = groups[key] = _new_group()
+    group["trays"] += sign
+    if kind == KIND_EMPTY:
+        group["empty_trays"] += sign
+    elif kind == KIND_INVALID:
+        group["invalid_trays"] += sign
+    group["loaded_weight"] += sign * loaded
+    group["remaining_weight"] += sign * remaining
+    # Dropped once empty, which also discards any floating point drift from the running sums
+    if group["trays"] == 0:
+        del groups[key]
+
+
+def _build_group(key, group: dict) -> dict:
+    return {
+        "key": key,
+        "trays": group["trays"],
+        "empty_trays": group["empty_trays"],
+        "invalid_trays": group["invalid_trays"],
+        "loaded_weight": round(group["loaded_weight"], 2),
+        "remaining_weight": round(group["remaining_weight"], 2),
+    }
+
+
+def _build_groups(groups: dict) -> list[dict]:
+    return [
+        _build_group(key, group)
+        for key, group in sorted(groups.items(), key=lambda item: (-item[1]["remaining_weight"], item[0]))
+    ]
+
+
+class Inventory:
+    def __init__(self):
+        # Trays are updated from every printer's MQTT thread and read from the API
+        self.lock = threading.Lock()
+        self.version = 0
+        # Versions restart with the service, so the ETag also includes when it started
+        self.started = int(time.time())
+        # printer id -> slot -> contribution
+        self.trays: dict[str, dict[str, tuple]] = {}
+        # The fleet total, the single group of every tray
+        self.total: dict = {}
+        self.materials: dict = {}
+        self.colors: dict = {}
+        self.printers: dict = {}
+        self.cached: Optional[dict] = None
+
+    def _apply(self, printer_id: str, contribution: tuple, sign: int) -> None:
+        kind, material, color, _, _ = contribution
+        _add(self.printers, printer_id, contribution, sign)
+        # Only loaded trays have a material and color
+        if kind == KIND_LOADED:
+            _add(self.materials, material, contribution, sign)
+            _add(self.colors, color, contribution, sign)
+        _add(self.total, None, contribution, sign)
+
+    def update_tray(self, printer_id: str, tray) -> bool:
+        """Update the aggregates for a changed tray, returning whether they changed."""
+        contribution = get_contribution(tray)
+        with self.lock:
+            slots = self.trays.setdefault(printer_id, {})
+            previous = slots.get(tray.slot)
+            if previous == contribution:
+                return False
+            if previous is not None:
+                self._apply(printer_id, previous, -1)
+            self._apply(printer_id, contribution, 1)
+            slots[tray.slot] = contribution
+            self.version += 1
+            return True
+
+    def remove_tray(self, printer_id: str, slot: str) -> bool:
+        """Remove the tray of a disconnected AMS unit, returning whether it was included."""
+        with self.lock:
+            previous = self.trays.get(printer_id, {}).pop(slot, None)
+            if previous is None:
+                return False
+            self._apply(printer_id, previous, -1)
+            self.version += 1
+            return True
+
+    def remove_printer(self, printer_id: str) -> None:
+        with self.lock:
+            slots = self.trays.pop(printer_id, {})
+            for contribution in slots.values():
+                self._apply(printer_id, contribution, -1)
+            if len(slots) > 0:
+                self.version += 1
+
+    def get_material_remaining(self, material: str) -> float:
+        """Get the grams remaining of a material across the fleet."""
+        with self.lock:
+            group = self.materials.get(material)
+            return group["remaining_weight"] if group is not None else 0.0
+
+    def get_version(self) -> int:
+        with self.lock:
+            return self.version
+
+    def get_etag(self, version: int) -> str:
+        return f'"{self.started}-{version}"'
+
+    def get_inventory(self) -> dict:
+        """Get the aggregates, rebuilt only after they have changed."""
+        with self.lock:
+            if self.cached is None or self.cached["version"] != self.version:
+                total = _build_group(None, self.total.get(None, _new_group()))
+                del total["key"]
+                self.cached = {
+                    "version": self.version,
+                    **total,
+                    "materials": _build_groups(self.materials),
+                    "colors": _build_groups(self.colors),
+                    "printers": _build_groups(self.printers),
+                }
+            return self.cached
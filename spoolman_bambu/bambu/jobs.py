@@ -0,0 +1,272 @@
+"""Per-printer print job tracking and an append-only ledger of the filament each job used.
+
+The printer reports the job state (gcode_state), progress and the AMS tray feeding the extruder (tray_now) in the same
+reports as the AMS trays, usually as partial updates. While a job is running, every drop in remaining % of a tray that
+has fed the extruder during the job is attributed to the job. When the job ends one line per tray used is appended to
+the ledger, (job, spool, grams), so usage can be costed per job.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+from spoolman_bambu import env
+
+logger = logging.getLogger(__name__)
+
+# The printer is working on a job in these states
+ACTIVE_STATES = ("PREPARE", "RUNNING", "PAUSE", "SLICING")
+# The job has ended in these states
+FINISHED_STATES = ("FINISH", "FAILED", "IDLE")
+
+# The ledger is read backwards from its end in blocks of this size
+READ_BLOCK_SIZE = 65536
+
+# tray_now values which aren't an AMS tray, the external spool holder and no tray loaded
+TRAY_EXTERNAL = 254
+TRAY_NONE = 255
+
+
+def get_tray_now_slot(tray_now) -> Optional[str]:
+    """Convert the tray_now index reported by the printer to an AMS tray slot, e.g. "5" to "B1"."""
+    try:
+        index = int(tray_now)
+    except (TypeError, ValueError):
+        return None
+    if index < 0 or index >= TRAY_EXTERNAL:
+        return None
+    ams_id = env.convert_id_to_char(str(index // 4))
+    return f"{ams_id}{index % 4}" if ams_id is not None else None
+
+
+def _iter_lines_reversed(f, end: int):
+    """Yield the non-empty lines of a binary file before end, last line first, reading backwards in blocks."""
+    position = end
+    remainder = b""
+    while position > 0:
+        size = min(READ_BLOCK_SIZE, position)
+        position -= size
+        f.seek(position)
+        lines = (f.read(size) + remainder).split(b"\n")
+        # The first line may start in the block before
+        remainder = lines.pop(0)
+        for line in reversed(lines):
+            if len(line) > 0:
+                yield line
+    if len(remainder) > 0:
+        yield remainder
+
+
+def _to_datetime(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class JobLedger:
+    """Append-only NDJSON file of the filament used by each finished job, one line per job and tray."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, records: list[dict]) -> None:
+        if len(records) == 0:
+            return
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with self.lock:
+            try:
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    # Written once per job, so make sure it survives a crash
+                    os.fsync(f.fileno())
+            except OSError:
+                logger.exception("Failed to append %s records to the job ledger %s", len(records), self.path)
+
+    def read(self, printer_id: Optional[str] = None, limit: int = 100) -> list[dict]:
+        """Read the most recent records, newest first, reading backwards from the end of the ledger."""
+        with self.lock:
+            if not self.path.exists():
+                return []
+            # Appends are written whole under the lock, so everything before the current end is complete lines
+            end = self.path.stat().st_size
+
+        records = []
+        with self.path.open("rb") as f:
+            for line in _iter_lines_reversed(f, end):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    continue
+                if printer_id is None or record.get("printer_id") == printer_id:
+                    records.append(record)
+                    if len(records) >= limit:
+                        break
+        return records
+
+
+def get_job_ledger_path() -> Path:
+    return env.get_settings().data_dir.joinpath("job_ledger.ndjson")
+
+
+class JobTracker:
+    def __init__(
+        self,
+        printer_id: str,
+        ledger: Optional[JobLedger],
+        spool_resolver: Optional[Callable[[str], Optional[int]]] = None,
+        on_job_end: Optional[Callable[[list[dict]], None]] = None,
+    ):
+        """
+        Track the jobs of a printer.
+
+        :param printer_id: The printer.
+        :param ledger: The ledger finished jobs are appended to.
+        :param spool_resolver: Gets the id of the spool bound to a tray uuid.
+        :param on_job_end: Called with the ledger records of each job once it ends.
+        """
+        self.printer_id = printer_id
+        self.ledger = ledger
+        self.spool_resolver = spool_resolver
+        self.on_job_end = on_job_end
+        self.lock = threading.Lock()
+        # Last reported values, reports only include the fields that changed
+        self.gcode_state = None
+        self.progress = None
+        self.name = None
+        self.task_id = None
+        # The printer keeps reporting the task id of a job after it ends, so it isn't mistaken for the next job's
+        self.ended_task_id = None
+        self.active_slot = None
+        self.job = None
+        self.last_remain: dict[str, int] = {}
+
+    def update(self, report: dict, printer_state, timestamp: float) -> Optional[list[dict]]:
+        """Update from a print report, returning the ledger records of a job that ended.
+
+        Args:
+            report: The "print" object of the report.
+            printer_state: The parsed AMS trays if the report included them, otherwise None.
+            timestamp: When the report was received.
+
+        """
+        ended = None
+        with self.lock:
+            if "gcode_state" in report:
+                self.gcode_state = report["gcode_state"]
+            if "mc_percent" in report:
+                self.progress = report["mc_percent"]
+            if "subtask_name" in report:
+                self.name = report["subtask_name"]
+            task_id = report.get("task_id", report.get("job_id"))
+            if task_id not in (None, "", "0"):
+                self.task_id = str(task_id)
+            ams = report.get("ams")
+            if isinstance(ams, dict) and "tray_now" in ams:
+                self.active_slot = get_tray_now_slot(ams["tray_now"])
+
+            if self.job is not None and self.active_slot is not None:
+                self.job["slots"].add(self.active_slot)
+            # The task id of a job may only be reported after it has started
+            if self.job is not None and self.job["task_id"] is None and self.task_id not in (None, self.ended_task_id):
+                self.job["job_id"] = self.job["task_id"] = self.task_id
+
+            # Attributed before checking for the end of the job, a report may include both the last drop and the end
+            if printer_state is not None:
+                self._attribute(printer_state)
+
+            # A new task id while a job is running means the previous one ended without us seeing it
+            if self.job is not None and (
+                self.gcode_state in FINISHED_STATES
+                or (self.job["task_id"] is not None and self.task_id != self.job["task_id"])
+            ):
+                ended = self._end_job(timestamp)
+
+            if self.job is None and self.gcode_state in ACTIVE_STATES:
+                self._start_job(timestamp)
+                if self.active_slot is not None:
+                    self.job["slots"].add(self.active_slot)
+
+        if ended is not None:
+            if self.ledger is not None:
+                self.ledger.append(ended)
+            if self.on_job_end is not None:
+                self.on_job_end(ended)
+        return ended
+
+    def _start_job(self, timestamp: float) -> None:
+        task_id = self.task_id if self.task_id != self.ended_task_id else None
+        self.job = {
+            "job_id": task_id or f"{self.printer_id}-{int(timestamp)}",
+            "task_id": task_id,
+            "name": self.name,
+            "start": timestamp,
+            "slots": set(),
+            # tray_uuid -> [slot, grams]
+            "usage": {},
+        }
+        logger.info("Printer %s started job %s (%s)", self.printer_id, self.job["job_id"], self.name)
+
+    def _attribute(self, printer_state) -> None:
+        """Attribute the drop in remaining % of each tray which fed the running job since the last report."""
+        for tray in printer_state.get_trays():
+            if not tray.is_valid():
+                continue
+            previous = self.last_remain.get(tray.tray_uuid)
+            self.last_remain[tray.tray_uuid] = tray.remain
+            if self.job is None or tray.slot not in self.job["slots"]:
+                continue
+            usage = self.job["usage"].setdefault(tray.tray_uuid, [tray.slot, 0.0])
+            if previous is not None and tray.remain < previous:
+                usage[1] += (previous - tray.remain) / 100 * tray.weight
+
+    def _end_job(self, timestamp: float) -> list[dict]:
+        job = self.job
+        self.job = None
+        if job["task_id"] is not None:
+            self.ended_task_id = job["task_id"]
+        state = self.gcode_state if self.gcode_state in FINISHED_STATES else "UNKNOWN"
+        records = []
+        for tray_uuid, (slot, grams) in job["usage"].items():
+            records.append(
+                {
+                    "printer_id": self.printer_id,
+                    "job_id": job["job_id"],
+                    "name": job["name"],
+                    "state": state,
+                    "start": _to_datetime(job["start"]),
+                    "end": _to_datetime(timestamp),
+                    "slot": slot,
+                    "tray_uuid": tray_uuid,
+                    "spool_id": self.spool_resolver(tray_uuid) if self.spool_resolver is not None else None,
+                    "grams": round(grams, 2),
+                }
+            )
+        logger.info(
+            "Printer %s job %s ended %s, used %.1fg",
+            self.printer_id,
+            job["job_id"],
+            state,
+            sum(record["grams"] for record in records),
+        )
+        return records
+
+    def get_job(self) -> Optional[dict]:
+        """Get the job in progress, if any."""
+        with self.lock:
+            if self.job is None:
+                return None
+            return {
+                "printer_id": self.printer_id,
+                "job_id": self.job["job_id"],
+                "name": self.job["name"],
+                "gcode_state": self.gcode_state,
+                "progress": self.progress,
+                "start": _to_datetime(self.job["start"]),
+                "active_slot": self.active_slot,
+                "grams": round(sum(grams for _, grams in self.job["usage"].values()), 2),
+            }
@@ -0,0 +1,122 @@
+"""Compact typed models of the printer, AMS unit and tray data reported over MQTT.
+
+The models are built once per report, with the string fields interned and the numeric fields parsed, so the rest of
+the pipeline compares and reads attributes instead of repeatedly indexing and parsing the raw MQTT dicts.
+"""
+
+import sys
+from dataclasses import dataclass
+
+from spoolman_bambu import env
+
+EMPTY_TRAY_UUID = "00000000000000000000000000000000"
+EMPTY_TRAY_COLOR = "00000000"
+
+
+def _intern(value) -> str:
+    return sys.intern(str(value)) if value is not None else ""
+
+
+def _parse_float(value, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_int(value, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass(frozen=True)
+class Tray:
+    __slots__ = ("slot", "id", "tray_uuid", "tray_type", "sub_brands", "color", "colors", "remain", "weight")
+
+    slot: str
+    id: str
+    tray_uuid: str
+    tray_type: str
+    sub_brands: str
+    color: str
+    colors: tuple
+    remain: int
+    weight: float
+
+    @classmethod
+    def from_report(cls, ams_id: str, tray: dict) -> "Tray":
+        tray_id = _intern(tray["id"])
+        sub_brands = _intern(tray.get("tray_sub_brands"))
+        color = _intern(tray.get("tray_color"))
+
+        # Adjust PETG Translucent color stats, so its accessable in Spoolman
+        if sub_brands == "PETG Translucent" and color == EMPTY_TRAY_COLOR:
+            color = sys.intern("FFFFFF00")
+
+        return cls(
+            slot=sys.intern(f"{ams_id}{tray_id}"),
+            id=tray_id,
+            tray_uuid=_intern(tray.get("tray_uuid")),
+            tray_type=_intern(tray.get("tray_type")),
+            sub_brands=sub_brands,
+            color=color,
+            colors=tuple(_intern(col) for col in tray.get("cols", ())),
+            remain=_parse_int(tray.get("remain"), -1),
+            weight=_parse_float(tray.get("tray_weight")),
+        )
+
+    def is_empty(self) -> bool:
+        """Check if the tray slot has nothing loaded, the printer only reports the id for empty slots."""
+        return self.tray_uuid == ""
+
+    def is_valid(self) -> bool:
+        """Check the tray has a readable spool in it with filament remaining."""
+        return (
+            not self.is_empty()
+            and self.remain > 0
+            and self.tray_uuid != EMPTY_TRAY_UUID
+            and self.color != EMPTY_TRAY_COLOR
+        )
+
+    def fingerprint(self) -> str:
+        """Build a compact fingerprint of the tray fields that affect what is synced to Spoolman."""
+        if self.is_empty():
+            return "||||"
+        return f"{self.tray_uuid}|{self.sub_brands}|{self.color}|{self.remain}|{self.weight:g}"
+
+
+@dataclass(frozen=True)
+class AmsUnit:
+    __slots__ = ("id", "humidity", "temp", "trays")
+
+    id: str
+    humidity: int
+    temp: float
+    trays: tuple
+
+    @classmethod
+    def from_report(cls, ams_unit: dict) -> "AmsUnit":
+        ams_id = sys.intern(env.convert_id_to_char(ams_unit["id"]))
+        return cls(
+            id=ams_id,
+            humidity=_parse_int(ams_unit.get("humidity")),
+            temp=_parse_float(ams_unit.get("temp")),
+            trays=tuple(Tray.from_report(ams_id, tray) for tray in ams_unit.get("tray", ())),
+        )
+
+
+@dataclass(frozen=True)
+class Printer:
+    __slots__ = ("printer_id", "ams_units")
+
+    printer_id: str
+    ams_units: tuple
+
+    @classmethod
+    def from_report(cls, printer_id: str, ams_units: list) -> "Printer":
+        return cls(printer_id=sys.intern(printer_id), ams_units=tuple(AmsUnit.from_report(unit) for unit in ams_units))
+
+    def get_trays(self) -> list:
+        return [tray for ams_unit in self.ams_units for tray in ams_unit.trays]
@@ -0,0 +1,68 @@
+"""Holding the weight updates of trays in use during a print, for the print-boundary sync mode.
+
+In the default report sync mode every report that changes a tray's remaining % patches its spool in Spoolman, which
+for a long print is a write per percent per tray. In the print sync mode the weight updates of trays already bound to
+a spool are held while a job is running, and flushed to Spoolman in one batch when the job ends, when a held tray is
+swapped out of its slot, or once the oldest held update reaches the safety flush interval.
+
+Held trays are not recorded in the snapshot until they are flushed, so after a restart they are synced again.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SYNC_MODE_REPORT = "report"
+SYNC_MODE_PRINT = "print"
+SYNC_MODES = (SYNC_MODE_REPORT, SYNC_MODE_PRINT)
+
+
+class HeldTrays:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # slot -> (fingerprint, tray, time of the report), only the latest report of each slot is kept
+        self.trays: dict = {}
+        # Monotonic time the oldest held update was held at
+        self.held_since: Optional[float] = None
+
+    def hold(self, fingerprint: str, tray, current_time) -> None:
+        with self.lock:
+            if self.held_since is None:
+                self.held_since = time.monotonic()
+            self.trays[tray.slot] = (fingerprint, tray, current_time)
+
+    def take_swapped(self, tray) -> Optional[tuple]:
+        """Take the update held for the slot of a tray, if a different tray (or none) was held in it."""
+        with self.lock:
+            held = self.trays.get(tray.slot)
+            if held is None or held[1].tray_uuid == tray.tray_uuid:
+                return None
+            del self.trays[tray.slot]
+            if len(self.trays) == 0:
+                self.held_since = None
+            return held
+
+    def take_all(self) -> list[tuple]:
+        with self.lock:
+            held = list(self.trays.values())
+            self.trays = {}
+            self.held_since = None
+            return held
+
+    def is_held(self, slot: str, tray_uuid: str) -> bool:
+        """Check if the weight update of a tray is being held."""
+        with self.lock:
+            held = self.trays.get(slot)
+            return held is not None and held[1].tray_uuid == tray_uuid
+
+    def is_due(self, interval: float) -> bool:
+        """Check if the oldest held update has been held for the flush interval."""
+        with self.lock:
+            return self.held_since is not None and time.monotonic() - self.held_since >= interval
+
+    def get_count(self) -> int:
+        with self.lock:
+            return len(self.trays)
@@ -0,0 +1,131 @@
+"""Scheduled pushall requests, asking a printer to report its complete state.
+
+Printers only send partial reports of the fields that changed, and some take minutes to report their AMS units after
+a connect. A pushall request makes the printer send a complete report straight away, so one is requested shortly
+after every connect and then on a cadence. Requests are jittered so a fleet reconnecting together isn't asked all at
+once, and throttled per printer model, P1 series printers become unresponsive if asked too often.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# The first three characters of the serial number identify the model
+MODEL_PREFIXES = {
+    "00M": "X1C",
+    "00W": "X1",
+    "03W": "X1E",
+    "01S": "P1P",
+    "01P": "P1S",
+    "030": "A1 mini",
+    "039": "A1",
+}
+
+# Shortest time between two pushall requests to a printer of the model, in seconds
+MODEL_MIN_INTERVALS = {
+    "X1C": 60,
+    "X1": 60,
+    "X1E": 60,
+    "P1P": 300,
+    "P1S": 300,
+    "A1 mini": 300,
+    "A1": 300,
+}
+# Models which aren't known are treated as the weakest printers
+DEFAULT_MIN_INTERVAL = 300
+
+
+def get_printer_model(printer_id: str) -> Optional[str]:
+    """Get the model of a printer from its serial number, None if it isn't known."""
+    return MODEL_PREFIXES.get(printer_id[:3].upper())
+
+
+def get_min_interval(model: Optional[str]) -> float:
+    return MODEL_MIN_INTERVALS.get(model, DEFAULT_MIN_INTERVAL)
+
+
+def build_pushall_request(sequence_id: int) -> dict:
+    return {"pushing": {"sequence_id": str(sequence_id), "command": "pushall", "version": 1, "push_target": 1}}
+
+
+class PushallScheduler:
+    def __init__(
+        self,
+        printer_id: str,
+        publish: Callable[[dict], bool],
+        interval: float,
+        jitter: float,
+        rng: Optional[random.Random] = None,
+    ):
+        """
+        Schedule the pushall requests of a printer.
+
+        :param printer_id: The printer.
+        :param publish: Publishes a request to the printer, returning whether it was sent.
+        :param interval: Seconds between requests while connected, 0 only requests on connect.
+        :param jitter: Up to this many seconds are randomly added to the time of each request.
+        :param rng: Source of the jitter.
+        """
+        self.printer_id = printer_id
+        self.publish = publish
+        self.model = get_printer_model(printer_id)
+        self.min_interval = get_min_interval(self.model)
+        self.interval = max(interval, self.min_interval) if interval > 0 else 0
+        self.jitter = jitter
+        self.rng = rng if rng is not None else random.Random()
+        # Connects arrive on the MQTT thread, ticks on the event loop
+        self.lock = threading.Lock()
+        self.sequence_id = 0
+        self.last_sent: Optional[float] = None
+        # Nothing is requested until the printer connects
+        self.next_due: Optional[float] = None
+
+    def set_interval(self, interval: float, jitter: float) -> None:
+        """Change the interval and jitter, taking effect from the next request."""
+        with self.lock:
+            self.interval = max(interval, self.min_interval) if interval > 0 else 0
+            self.jitter = jitter
+
+    def _schedule(self, delay: float, now: float) -> None:
+        due = now + delay + self.rng.uniform(0, self.jitter)
+        # A printer reconnecting repeatedly still isn't asked more often than its model allows
+        if self.last_sent is not None:
+            due = max(due, self.last_sent + self.min_interval)
+        self.next_due = due
+
+    def on_connect(self, now: Optional[float] = None) -> None:
+        with self.lock:
+            self._schedule(0, now if now is not None else time.monotonic())
+
+    def on_disconnect(self) -> None:
+        with self.lock:
+            self.next_due = None
+
+    def get_next_due(self) -> Optional[float]:
+        return self.next_due
+
+    def tick(self, now: Optional[float] = None) -> bool:
+        """Send a pushall request if one is due, returning whether it was sent."""
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            if self.next_due is None or now < self.next_due:
+                return False
+
+            self.sequence_id += 1
+            sent = self.publish(build_pushall_request(self.sequence_id))
+            if sent:
+                self.last_sent = now
+                logger.debug("Requested pushall from printer %s (%s)", self.printer_id, self.model)
+            else:
+                logger.warning("Failed to request pushall from printer %s", self.printer_id)
+
+            if sent and self.interval <= 0:
+                self.next_due = None
+            else:
+                # A failed request is retried once the model allows another
+                self._schedule(self.interval if sent else self.min_interval, now)
+            return sent
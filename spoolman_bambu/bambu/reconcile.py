@@ -0,0 +1,322 @@
+"""Bulk reconciliation of every printer's trays against Spoolman, as a plan which can be inspected or applied.
+
+Trays are synced as MQTT reports arrive, so anything missed while a printer or Spoolman was unreachable, or changed
+in Spoolman by hand, is never repaired. Reconciliation diffs the trays loaded in every printer against the spools
+claimed in Spoolman in one pass and plans the writes that bring Spoolman back in line:
+
+- create: a tray with no spool of its filament to claim gets a new spool, and the filament if needed
+- claim: a tray with no spool claims an unclaimed spool of its filament
+- patch: the spool claimed by a tray has a stale remaining weight or location
+- release: a spool claimed by a tray which is no longer loaded in the printer it is located at has its location
+  cleared, it keeps its tag so the spool is recognised by its RFID when the tray is loaded again
+
+Applied creates, claims and patches are recorded in the printer's snapshot and tray state, as an MQTT report syncing
+the tray would have. Patches of trays whose weight updates are held during a print are skipped, as are patches of
+trays that have changed and releases of trays that have been loaded since the plan was made.
+"""
+
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from spoolman_bambu import env, state
+from spoolman_bambu.exceptions import ItemCreateError, ItemUpdateError, SpoolmanUnavailableError
+from spoolman_bambu.spoolman.index import get_spool_tray_uuid
+from spoolman_bambu.spoolman.locks import filament_locks, tray_locks
+from . import ams_processor
+
+logger = logging.getLogger(__name__)
+app_state = state.get_current_state()
+
+ACTION_CREATE = "create"
+ACTION_CLAIM = "claim"
+ACTION_PATCH = "patch"
+ACTION_RELEASE = "release"
+
+# Independent writes are sent to Spoolman this many at a time
+MAX_APPLY_WORKERS = 4
+
+# Differences in remaining weight smaller than this are rounding rather than consumption
+WEIGHT_TOLERANCE = 0.01
+
+
+def get_loaded_trays(printers) -> dict:
+    """Get the valid trays loaded in every printer that has reported its AMS units, keyed by tray uuid."""
+    trays = {}
+    for printer in printers:
+        printer_state = printer.get_printer_state()
+        if printer_state is None:
+            continue
+        for tray in printer_state.get_trays():
+            if tray.is_valid():
+                trays[tray.tray_uuid] = (printer.get_printer_id(), tray)
+    return trays
+
+
+def build_plan(printers, spools: list, internal_filaments: list, color_index, current_time) -> dict:
+    """Diff the trays loaded in the printers against the Spoolman spools and plan the writes to reconcile them.
+
+    Args:
+        printers: The printers, only those which have reported their AMS units are reconciled.
+        spools: The active Spoolman spools.
+        internal_filaments: The Spoolman Bambu Lab filaments.
+        color_index: The FilamentColorIndex of the external Bambu Lab filaments.
+        current_time: The time to record as the spools' last use.
+
+    """
+    tag = env.get_settings().spoolman_tag_api
+    trays = get_loaded_trays(printers)
+    reporting = {printer.get_printer_id() for printer in printers if printer.get_printer_state() is not None}
+
+    claimed = {}
+    unclaimed = {}
+    for spool in spools:
+        tray_uuid = get_spool_tray_uuid(spool, tag)
+        if tray_uuid is not None:
+            claimed[tray_uuid] = spool
+        else:
+            unclaimed.setdefault(spool["filament"]["external_id"], []).append(spool)
+    filaments = {filament["external_id"]: filament for filament in internal_filaments}
+
+    actions = []
+    unmatched = []
+    in_sync = 0
+    for tray_uuid, (printer_id, tray) in sorted(trays.items(), key=lambda item: (item[1][0], item[1][1].slot)):
+        action = {"printer_id": printer_id, "slot": tray.slot, "tray_uuid": tray_uuid}
+        # Recorded with the actions, so an applied action is only recorded against the tray it was planned from
+        fingerprint = tray.fingerprint()
+
+        spool = claimed.get(tray_uuid)
+        if spool is not None:
+            remaining_weight = ams_processor.calculate_spool_remaining_weight(tray.weight, tray.remain)
+            weight_changed = abs((spool.get("remaining_weight") or 0) - remaining_weight) > WEIGHT_TOLERANCE
+            if not weight_changed and spool.get("location") == printer_id:
+                in_sync += 1
+                continue
+            patch = {"remaining_weight": remaining_weight, "location": printer_id}
+            if weight_changed:
+                patch["last_used"] = current_time.isoformat()
+            actions.append(
+                {**action, "action": ACTION_PATCH, "spool_id": spool["id"], "patch": patch, "fingerprint": fingerprint}
+            )
+            continue
+
+        external_filament = color_index.match(tray)
+        if external_filament is None:
+            unmatched.append(action)
+            continue
+
+        external_id = external_filament["id"]
+        if len(unclaimed.get(external_id, [])) > 0:
+            # Claimed in the order process_tray would, the last unclaimed spool first
+            spool = unclaimed[external_id].pop()
+            patch = ams_processor.build_spool_patch_data(spool, tray, printer_id, current_time)
+            actions.append(
+                {
+                    **action,
+                    "action": ACTION_CLAIM,
+                    "spool_id": spool["id"],
+                    "external_id": external_id,
+                    "patch": patch,
+                    "fingerprint": fingerprint,
+                }
+            )
+            continue
+
+        filament = filaments.get(external_id)
+        actions.append(
+            {
+                **action,
+                "action": ACTION_CREATE,
+                "fingerprint": fingerprint,
+                "external_id": external_id,
+                "filament_id": filament["id"] if filament is not None else None,
+                "filament": ams_processor.build_filament_data(external_filament, tray) if filament is None else None,
+                "spool": ams_processor.build_spool_data(
+                    filament["id"] if filament is not None else None, tray, printer_id, current_time
+                ),
+            }
+        )
+
+    # Only release spools located at a printer whose trays are known, a printer that hasn't reported may still
+    # have them loaded
+    for tray_uuid, spool in sorted(claimed.items(), key=lambda item: item[1]["id"]):
+        if tray_uuid not in trays and spool.get("location") in reporting:
+            actions.append(
+                {
+                    "action": ACTION_RELEASE,
+                    "printer_id": spool["location"],
+                    "slot": None,
+                    "tray_uuid": tray_uuid,
+                    "spool_id": spool["id"],
+                    "patch": {"location": ""},
+                }
+            )
+
+    return {"time": current_time, "actions": actions, "unmatched": unmatched, "in_sync": in_sync}
+
+
+def plan() -> dict:
+    """Fetch the Spoolman spools and filaments and plan the reconciliation of every printer, without writing anything.
+
+    The local index may hold bindings changed by hand in Spoolman since startup, such as an archived or unclaimed
+    spool. It isn't refreshed here, the bindings it holds for the trays of the creates and claims are recorded with
+    them instead, so applying the plan can tell those apart from bindings recorded by an MQTT report since.
+    """
+    spools, internal_filaments, color_index = ams_processor.fetch_spoolman_data()
+    reconcile_plan = build_plan(
+        app_state.get_printers(), spools, internal_filaments, color_index, datetime.datetime.now()
+    )
+
+    index = app_state.get_spoolman().index
+    for action in reconcile_plan["actions"]:
+        if action["action"] in (ACTION_CREATE, ACTION_CLAIM):
+            binding = index.get_binding(action["tray_uuid"])
+            action["indexed_spool_id"] = binding["spool_id"] if binding is not None else None
+        if action["action"] == ACTION_CLAIM:
+            action["indexed_tray_uuid"] = index.get_spool_tray_uuid(action["spool_id"])
+    return reconcile_plan
+
+
+def _is_stale(action: dict) -> bool:
+    """Check if an MQTT report has already synced the tray or spool of a create or claim since it was planned.
+
+    A binding in the index that differs from the one it held when the plan was made was recorded by a write since.
+    The binding it still holds was contradicted by Spoolman, so it is dropped before the action is applied.
+    """
+    index = app_state.get_spoolman().index
+    binding = index.get_binding(action["tray_uuid"])
+    indexed_spool_id = binding["spool_id"] if binding is not None else None
+    if indexed_spool_id != action.get("indexed_spool_id"):
+        return True
+    if action["action"] == ACTION_CLAIM and index.get_spool_tray_uuid(action["spool_id"]) != action.get(
+        "indexed_tray_uuid"
+    ):
+        return True
+
+    if indexed_spool_id is not None:
+        logger.info("Reconcile dropped the binding of tray %s to spool %s", action["tray_uuid"], indexed_spool_id)
+        index.remove_spool(indexed_spool_id)
+    return False
+
+
+def _is_changed(action: dict) -> bool:
+    """Check if the tray of a patch has changed since the plan was made, or the tray of a release has been loaded."""
+    if action["action"] == ACTION_RELEASE:
+        return action["tray_uuid"] in get_loaded_trays(app_state.get_printers())
+
+    printer = app_state.get_printer(action["printer_id"])
+    printer_state = printer.get_printer_state() if printer is not None else None
+    if printer_state is None:
+        return True
+    tray = next((tray for tray in printer_state.get_trays() if tray.slot == action["slot"]), None)
+    return tray is None or tray.fingerprint() != action["fingerprint"]
+
+
+def _is_held(action: dict) -> bool:
+    """Check if the weight updates of the tray of a patch are being held during a print."""
+    printer = app_state.get_printer(action["printer_id"])
+    return printer is not None and printer.get_held_trays().is_held(action["slot"], action["tray_uuid"])
+
+
+def _record_synced(action: dict, spool: dict) -> None:
+    """Record the spool of an applied action against its tray in the printer's snapshot and tray state."""
+    printer = app_state.get_printer(action["printer_id"])
+    if printer is not None and not printer.set_synced_tray(action["slot"], action["fingerprint"], spool):
+        logger.debug("Reconcile %s of tray %s not recorded, the tray has changed", action["action"], action["slot"])
+
+
+def _apply_action(action: dict) -> bool:
+    """Apply an action, returning False if it was skipped as stale, changed or held."""
+    spoolman_instance = app_state.get_spoolman()
+    if action["action"] == ACTION_RELEASE:
+        with tray_locks.hold(action["tray_uuid"]):
+            if _is_changed(action):
+                return False
+            if spoolman_instance.patch_spool(action["spool_id"], action["patch"]) is None:
+                raise ItemUpdateError("Item failed to be updated")
+        return True
+
+    if action["action"] == ACTION_PATCH:
+        with tray_locks.hold(action["tray_uuid"]):
+            # The held weight is written when the print ends, and a changed tray is synced by the report of the change
+            if _is_changed(action) or _is_held(action):
+                return False
+            spool = spoolman_instance.patch_spool(action["spool_id"], action["patch"])
+            if spool is None:
+                raise ItemUpdateError("Item failed to be updated")
+            _record_synced(action, spool)
+        return True
+
+    # Taken in the same order as process_ams, the tray and then the filament
+    with tray_locks.hold(action["tray_uuid"]), filament_locks.hold(action["external_id"]):
+        if _is_stale(action):
+            return False
+
+        if action["action"] == ACTION_CLAIM:
+            spool = spoolman_instance.patch_spool(action["spool_id"], action["patch"])
+            if spool is None:
+                raise ItemUpdateError("Item failed to be updated")
+            _record_synced(action, spool)
+            return True
+
+        spool_data = dict(action["spool"])
+        if spool_data["filament_id"] is None:
+            # An earlier create of the filament may already have created it
+            filament_id = spoolman_instance.index.get_filament_id(action["external_id"])
+            if filament_id is None:
+                filament = spoolman_instance.create_internal_filament(action["filament"])
+                if filament is None:
+                    raise ItemCreateError("Item failed to be created")
+                filament_id = filament["id"]
+            spool_data["filament_id"] = filament_id
+        spool = spoolman_instance.create_spool(spool_data)
+        if spool is None:
+            raise ItemCreateError("Item failed to be created")
+        _record_synced(action, spool)
+        return True
+
+
+def _apply_group(actions: list) -> tuple[int, list]:
+    """Apply a group of dependent actions in order, returning the number skipped and the failed actions."""
+    skipped = 0
+    errors = []
+    for action in actions:
+        try:
+            if not _apply_action(action):
+                logger.info("Reconcile %s of tray %s skipped", action["action"], action["tray_uuid"])
+                skipped += 1
+        except (ItemCreateError, ItemUpdateError, SpoolmanUnavailableError) as e:
+            logger.warning("Reconcile %s of tray %s failed: %s", action["action"], action["tray_uuid"], e)
+            errors.append({**action, "error": str(e)})
+    return skipped, errors
+
+
+def apply_plan(reconcile_plan: dict, max_workers: int = MAX_APPLY_WORKERS) -> dict:
+    """Apply a reconciliation plan, sending independent writes to Spoolman concurrently.
+
+    Creates of the same filament are applied in order, so the filament is only created once. Creates and claims
+    whose tray or spool was synced by an MQTT report since the plan was made are skipped, as are patches of trays
+    that have changed since or whose weight updates are being held, and releases of trays loaded since.
+    """
+    groups = {}
+    for action in reconcile_plan["actions"]:
+        key = action["external_id"] if action["action"] == ACTION_CREATE else action["spool_id"]
+        groups.setdefault((action["action"] == ACTION_CREATE, key), []).append(action)
+
+    skipped = 0
+    failed = []
+    if len(groups) > 0:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+            for group_skipped, errors in executor.map(_apply_group, groups.values()):
+                skipped += group_skipped
+                failed.extend(errors)
+
+    applied = len(reconcile_plan["actions"]) - skipped - len(failed)
+    logger.info("Reconcile applied %s actions, %s skipped, %s failed", applied, skipped, len(failed))
+    return {"plan": reconcile_plan, "applied": applied, "skipped": skipped, "failed": failed}
+
+
+def reconcile() -> dict:
+    """Plan and apply the reconciliation of every printer."""
+    return apply_plan(plan())
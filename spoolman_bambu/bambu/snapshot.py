@@ -0,0 +1,107 @@
+"""Persisted per-printer AMS tray snapshots, used to warm restart without re-syncing every tray."""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from spoolman_bambu import env
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+class AmsSnapshot:
+    """The last processed state of each AMS tray slot for a single printer.
+
+    Each slot (e.g. "A0") holds the fingerprint of the tray data that was last processed and, if the tray was
+    synced to Spoolman, the spool it was bound to.
+    """
+
+    def __init__(self, printer_id: str, path: Optional[Path] = None, slots: Optional[dict] = None):
+        self.printer_id = printer_id
+        self.path = path
+        self.slots = slots if slots is not None else {}
+        self.dirty = False
+        # Saved from the printer's MQTT thread and by reconciliation
+        self.save_lock = threading.Lock()
+
+    def get_slot(self, slot: str) -> Optional[dict]:
+        return self.slots.get(slot)
+
+    def is_unchanged(self, slot: str, fingerprint: str) -> bool:
+        """Check if the tray in the slot matches the fingerprint that was last processed."""
+        current = self.slots.get(slot)
+        return current is not None and current["fingerprint"] == fingerprint
+
+    def set_slot(
+        self,
+        slot: str,
+        fingerprint: str,
+        tray_uuid: Optional[str] = None,
+        spool_id: Optional[int] = None,
+        remaining_weight: Optional[float] = None,
+    ) -> None:
+        value = {
+            "fingerprint": fingerprint,
+            "tray_uuid": tray_uuid,
+            "spool_id": spool_id,
+            "remaining_weight": remaining_weight,
+        }
+        if self.slots.get(slot) != value:
+            self.slots[slot] = value
+            self.dirty = True
+
+    def clear_slot(self, slot: str) -> None:
+        if slot in self.slots:
+            del self.slots[slot]
+            self.dirty = True
+
+    def save(self) -> None:
+        """Write the snapshot to disk if it has changed since it was last saved.
+
+        The snapshot is written to a temporary file which then atomically replaces the previous one, so a crash
+        mid-write never leaves a truncated snapshot behind. The file is a cache, so it is not fsynced.
+        """
+        with self.save_lock:
+            if not self.dirty or self.path is None:
+                return
+
+            tmp_path = self.path.with_suffix(".tmp")
+            try:
+                with tmp_path.open("w", encoding="utf-8") as f:
+                    json.dump(
+                        {"version": SNAPSHOT_VERSION, "printer_id": self.printer_id, "slots": dict(self.slots)}, f
+                    )
+                os.replace(tmp_path, self.path)
+                self.dirty = False
+            except OSError:
+                logger.exception("Failed to save AMS snapshot for %s to %s", self.printer_id, self.path)
+
+
+def get_snapshot_path(printer_id: str) -> Path:
+    return env.get_settings().snapshots_dir.joinpath(f"{printer_id}.json")
+
+
+def load_snapshot(printer_id: str) -> AmsSnapshot:
+    """Load the persisted snapshot for a printer, falling back to an empty one if missing or unreadable."""
+    path = get_snapshot_path(printer_id)
+    if not path.exists():
+        return AmsSnapshot(printer_id, path)
+
+    try:
+        with path.open(encoding="utf-8") as f:
+            doc = json.load(f)
+    except (OSError, ValueError):
+        logger.warning("AMS snapshot for %s at %s is unreadable, starting fresh", printer_id, path)
+        return AmsSnapshot(printer_id, path)
+
+    if doc.get("version") != SNAPSHOT_VERSION or not isinstance(doc.get("slots"), dict):
+        logger.warning("AMS snapshot for %s has an unknown format, starting fresh", printer_id)
+        return AmsSnapshot(printer_id, path)
+
+    logger.info("Loaded AMS snapshot for %s with %s tray slots", printer_id, len(doc["slots"]))
+    return AmsSnapshot(printer_id, path, doc["slots"])
@@ -0,0 +1,113 @@
+"""In-memory, versioned view of the trays loaded in a printer's AMS units, served by the API.
+
+Every change to a tray, including which Spoolman spool it is bound to, bumps the printer's version and stamps the tray
+with it, so a client that remembers the last version it saw can ask for only the trays that changed since. Versions
+are qualified with the epoch the tray state was created in, as `<epoch>-<counter>`, because the counter restarts with
+the service and whenever a printer is reconnected.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from spoolman_bambu.log import REPORT_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+def build_tray(ams_unit, tray, binding: Optional[dict]) -> dict:
+    """Build the API view of a tray, joined with the spool it is bound to."""
+    bound = binding is not None and binding.get("spool_id") is not None and binding.get("tray_uuid") == tray.tray_uuid
+    return {
+        "slot": tray.slot,
+        "ams_id": ams_unit.id,
+        "tray_id": tray.id,
+        "tray_uuid": tray.tray_uuid or None,
+        "tray_type": tray.tray_type or None,
+        "sub_brands": tray.sub_brands or None,
+        "color": tray.color or None,
+        "colors": list(tray.colors),
+        "remain": tray.remain if tray.remain >= 0 else None,
+        "weight": tray.weight,
+        "spool_id": binding["spool_id"] if bound else None,
+        "remaining_weight": binding["remaining_weight"] if bound else None,
+    }
+
+
+class TrayState:
+    def __init__(self):
+        # Written from the MQTT thread and read from the API, so every access holds the lock
+        self.lock = threading.Lock()
+        # When the tray state was created, in nanoseconds, so a restarted or reconnected printer never reuses it
+        self.epoch = time.time_ns()
+        self.version = 0
+        self.trays: dict[str, tuple[int, dict]] = {}
+        self.removed: dict[str, int] = {}
+
+    def get_version(self) -> str:
+        with self.lock:
+            return self.format_version(self.version)
+
+    def format_version(self, version: int) -> str:
+        return f"{self.epoch}-{version}"
+
+    def parse_version(self, version: str) -> Optional[int]:
+        """Get the counter of a version handed out by this tray state, None if it is from another epoch."""
+        epoch, _, counter = version.rpartition("-")
+        if epoch != str(self.epoch) or not counter.isdigit():
+            return None
+        return int(counter)
+
+    def update(self, printer_state, snapshot) -> int:
+        """Update the trays from the latest printer report and the spool bindings in its AMS snapshot.
+
+        Returns the number of trays that changed.
+        """
+        trays = {}
+        for ams_unit in printer_state.ams_units:
+            for tray in ams_unit.trays:
+                trays[tray.slot] = build_tray(ams_unit, tray, snapshot.get_slot(tray.slot))
+
+        changed = 0
+        with self.lock:
+            for slot, tray in trays.items():
+                current = self.trays.get(slot)
+                if current is None or current[1] != tray:
+                    changed += 1
+                    self.version += 1
+                    self.trays[slot] = (self.version, tray)
+                    self.removed.pop(slot, None)
+
+            # Slots of AMS units that have been disconnected
+            for slot in [slot for slot in self.trays if slot not in trays]:
+                changed += 1
+                self.version += 1
+                del self.trays[slot]
+                self.removed[slot] = self.version
+
+        if changed > 0:
+            logger.debug("Tray state of %s trays changed", changed, extra={"sample_rate": REPORT_SAMPLE_RATE})
+        return changed
+
+    def get_changes(self, since: Optional[str] = None) -> dict:
+        """Get the trays which changed after a version, or every tray if no version is given.
+
+        A version from another epoch was handed out before a restart or reconnect, so every tray is returned.
+        """
+        since = self.parse_version(since) if since is not None else None
+        with self.lock:
+            full = since is None or since > self.version
+            if full:
+                trays = [tray for _, tray in self.trays.values()]
+                removed = []
+            else:
+                trays = [tray for version, tray in self.trays.values() if version > since]
+                removed = [slot for slot, version in self.removed.items() if version > since]
+
+            return {
+                "version": self.format_version(self.version),
+                "full": full,
+                "trays": sorted(trays, key=lambda tray: tray["slot"]),
+                "removed": sorted(removed),
+            }
@@ -5,11 +5,13 @@ import os
 import subprocess
 import sys
 import json
+import threading
 
+from dataclasses import dataclass, replace
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 from urllib import parse
 
 from platformdirs import user_data_dir
@@ -43,6 +45,33 @@ def get_logging_level() -> int:
     raise ValueError(f"Failed to parse SPOOLMAN_BAMBU_LOGGING_LEVEL variable: Unknown logging level '{log_level_str}'.")
 
 
+def get_log_format() -> str:
+    """Get the format log records are written in from environment variables.
+
+    Returns "text" if no environment variable was set for the log format.
+
+    Returns:
+        str: The log format, either "text" or "json".
+
+    """
+    log_format = os.getenv("SPOOLMAN_BAMBU_LOG_FORMAT", "TEXT").upper()
+    if log_format == "TEXT":
+        return "text"
+    if log_format == "JSON":
+        return "json"
+    raise ValueError(f"Failed to parse SPOOLMAN_BAMBU_LOG_FORMAT variable: Unknown log format '{log_format}'.")
+
+
+def get_log_rate_limit() -> int:
+    """Get how many times the same debug/info message can be logged per minute before it is suppressed.
+
+    Returns:
+        int: The rate limit, 0 disables rate limiting.
+
+    """
+    return int(os.getenv("SPOOLMAN_BAMBU_LOG_RATE_LIMIT", "60"))
+
+
 def is_debug_mode() -> bool:
     """Get whether debug mode is enabled from environment variables.
 
@@ -156,6 +185,66 @@ def get_spoolman_tag() -> str:
         return "Tag"
 
 
+def get_journal_fsync_batch() -> int:
+    """Get how many Spoolman journal writes can be buffered before they are fsynced to disk.
+
+    Returns:
+        int: The number of writes per fsync.
+
+    """
+    return int(os.getenv("SPOOLMAN_BAMBU_JOURNAL_FSYNC_BATCH", "16"))
+
+
+def get_journal_fsync_interval() -> float:
+    """Get the maximum number of seconds a Spoolman journal write can stay buffered before it is fsynced.
+
+    Returns:
+        float: The fsync interval in seconds.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_JOURNAL_FSYNC_INTERVAL", "5"))
+
+
+def get_spoolman_coalesce_window() -> float:
+    """Get the number of seconds the result of a Spoolman GET is shared with identical requests after it completes.
+
+    Returns:
+        float: The reuse window in seconds, 0 only shares requests which are in flight at the same time.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_SPOOLMAN_COALESCE_WINDOW", "1"))
+
+
+def get_spoolman_healthcheck_interval() -> int:
+    """Get how often Spoolman is probed while it is healthy.
+
+    Returns:
+        int: The interval in seconds, 0 disables the health monitor.
+
+    """
+    return int(os.getenv("SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_INTERVAL", "600"))
+
+
+def get_spoolman_degraded_healthcheck_interval() -> float:
+    """Get how often Spoolman is probed while it is degraded or unreachable.
+
+    Returns:
+        float: The interval in seconds.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_DEGRADED_INTERVAL", "5"))
+
+
+def get_spoolman_max_degraded_healthcheck_interval() -> float:
+    """Get the longest Spoolman probes back off to while it stays unreachable.
+
+    Returns:
+        float: The interval in seconds.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_MAX_DEGRADED_INTERVAL", "60"))
+
+
 def get_backups_dir() -> Path:
     """Get the backups directory.
 
@@ -177,6 +266,169 @@ def get_cache_dir() -> Path:
     return get_data_dir() / "cache"
 
 
+def get_snapshots_dir() -> Path:
+    """Get the directory where per printer AMS snapshots are stored.
+
+    Returns:
+        Path: The snapshots directory.
+
+    """
+    snapshots_dir = get_data_dir().joinpath("snapshots")
+    snapshots_dir.mkdir(parents=True, exist_ok=True)
+    return snapshots_dir
+
+
+def get_history_dir() -> Path:
+    """Get the directory where the tray and AMS time-series history segments are stored.
+
+    Returns:
+        Path: The history directory.
+
+    """
+    history_dir = get_data_dir().joinpath("history")
+    history_dir.mkdir(parents=True, exist_ok=True)
+    return history_dir
+
+
+def get_history_sample_interval() -> float:
+    """Get the minimum number of seconds between two recorded history samples of the same series.
+
+    Returns:
+        float: The sample interval in seconds.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_HISTORY_SAMPLE_INTERVAL", "30"))
+
+
+def get_color_match_tolerance() -> float:
+    """Get the largest CIE76 delta E a tray color can be from a Bambu Lab filament color and still match it.
+
+    Returns:
+        float: The tolerance, 0 only accepts exact color matches.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_COLOR_MATCH_TOLERANCE", "10"))
+
+
+def get_reconcile_interval() -> int:
+    """Get the number of seconds between reconciliations of every printer's trays against Spoolman.
+
+    Returns:
+        int: The interval in seconds, 0 disables the scheduled reconciliation.
+
+    """
+    return int(os.getenv("SPOOLMAN_BAMBU_RECONCILE_INTERVAL", "3600"))
+
+
+def get_sync_mode() -> str:
+    """Get when spool weights are written to Spoolman from environment variables.
+
+    Returns "report" if no environment variable was set for the sync mode, every tray report is written as it
+    arrives. In the "print" mode the weight updates of trays in use are held during a print and written when it ends.
+
+    Returns:
+        str: The sync mode.
+
+    """
+    sync_mode = os.getenv("SPOOLMAN_BAMBU_SYNC_MODE", "report").lower()
+    if sync_mode not in {"report", "print"}:
+        raise ValueError(f"Failed to parse SPOOLMAN_BAMBU_SYNC_MODE variable: Unknown sync mode '{sync_mode}'.")
+    return sync_mode
+
+
+def get_sync_flush_interval() -> float:
+    """Get the longest number of seconds a weight update is held during a print in the print sync mode.
+
+    Returns:
+        float: The flush interval in seconds.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_SYNC_FLUSH_INTERVAL", "3600"))
+
+
+def get_pushall_interval() -> float:
+    """Get the number of seconds between requests for every printer to report its complete state.
+
+    Printers are never asked more often than their model allows.
+
+    Returns:
+        float: The interval in seconds, 0 only requests the complete state when a printer connects.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_PUSHALL_INTERVAL", "600"))
+
+
+def get_pushall_jitter() -> float:
+    """Get the largest random number of seconds added to each request for a printer's complete state.
+
+    Returns:
+        float: The jitter in seconds.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_PUSHALL_JITTER", "10"))
+
+
+def get_alert_webhooks() -> list[str]:
+    """Get the webhook URLs alerts are posted to from environment variables.
+
+    Returns:
+        list[str]: The URLs, empty if alerts are only served by the API and as events.
+
+    """
+    webhooks = os.getenv("SPOOLMAN_BAMBU_ALERT_WEBHOOKS", "")
+    return [url.strip() for url in webhooks.split(",") if url.strip() != ""]
+
+
+def get_alert_low_stock_grams() -> float:
+    """Get the remaining grams at or below which a tray raises a low stock alert.
+
+    Returns:
+        float: The threshold in grams, 0 disables it.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_ALERT_LOW_STOCK_GRAMS", "100"))
+
+
+def get_alert_low_stock_percent() -> float:
+    """Get the remaining % at or below which a tray raises a low stock alert.
+
+    Returns:
+        float: The threshold in %, 0 disables it.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_ALERT_LOW_STOCK_PERCENT", "10"))
+
+
+def get_alert_material_low_stock_grams() -> float:
+    """Get the grams of a material remaining across the fleet at or below which a low stock alert is raised.
+
+    Returns:
+        float: The threshold in grams, 0 disables it.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_ALERT_MATERIAL_LOW_STOCK_GRAMS", "0"))
+
+
+def get_alert_humidity() -> float:
+    """Get the AMS humidity, as reported by the printer, above which a humidity alert is raised.
+
+    Returns:
+        float: The limit, 0 disables it.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_ALERT_HUMIDITY", "0"))
+
+
+def get_alert_offline_minutes() -> float:
+    """Get the number of minutes a disconnected printer can go without reporting before an offline alert is raised.
+
+    Returns:
+        float: The limit in minutes, 0 disables it.
+
+    """
+    return float(os.getenv("SPOOLMAN_BAMBU_ALERT_OFFLINE_MINUTES", "10"))
+
+
 def get_version() -> str:
     """Get the version of the package.
 
@@ -350,8 +602,175 @@ def get_all_printer_env_vars() -> list[PrinterConfig]:
             )
             processed_list.append(printer_config)
         except KeyError as e:
-            logger.error(f"Failed configuring printer [{index}]:{e} is missing")
+            logger.error("Failed configuring printer [%s]:%s is missing", index, e)
         except ValidationError as e:
-            logger.error(f"Failed configuring printer [{index}]:{json.dumps(e.errors()[0])}")
+            logger.error("Failed configuring printer [%s]:%s", index, json.dumps(e.errors()[0]))
 
     return processed_list
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Configuration resolved from the environment, shared by every module.
+
+    The getters above re-read the environment, and some touch the filesystem, on every call. Use get_settings() for
+    anything read at runtime. The settings are resolved on first use and only change when reload_settings() is
+    called, which notifies the listeners so they can rebuild whatever they built from the old settings. The
+    settings in RESTART_SETTINGS are kept as they were resolved at startup, changes to them take effect on restart.
+    """
+
+    logging_level: int
+    log_format: str
+    log_rate_limit: int
+    debug_mode: bool
+    automatic_backup: bool
+    data_dir: Path
+    logs_dir: Path
+    backups_dir: Path
+    base_path: str
+    spoolman_ip: str
+    spoolman_port: str
+    spoolman_tag: str
+    spoolman_coalesce_window: float
+    spoolman_healthcheck_interval: int
+    spoolman_degraded_healthcheck_interval: float
+    spoolman_max_degraded_healthcheck_interval: float
+    journal_fsync_batch: int
+    journal_fsync_interval: float
+    snapshots_dir: Path
+    history_dir: Path
+    history_sample_interval: float
+    color_match_tolerance: float
+    reconcile_interval: int
+    sync_mode: str
+    sync_flush_interval: float
+    pushall_interval: float
+    pushall_jitter: float
+    alert_webhooks: tuple[str, ...]
+    alert_low_stock_grams: float
+    alert_low_stock_percent: float
+    alert_material_low_stock_grams: float
+    alert_humidity: float
+    alert_offline_minutes: float
+    version: str
+    commit_hash: Optional[str]
+    build_date: Optional[datetime]
+
+    @property
+    def spoolman_tag_api(self) -> str:
+        """The tag extra field key, Spoolman requires it lower case in requests."""
+        return self.spoolman_tag.lower()
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            logging_level=get_logging_level(),
+            log_format=get_log_format(),
+            log_rate_limit=get_log_rate_limit(),
+            debug_mode=is_debug_mode(),
+            automatic_backup=is_automatic_backup_enabled(),
+            data_dir=get_data_dir().resolve(),
+            logs_dir=get_logs_dir().resolve(),
+            backups_dir=get_backups_dir().resolve(),
+            base_path=get_base_path(),
+            spoolman_ip=get_spoolman_ip(),
+            spoolman_port=get_spoolman_port(),
+            spoolman_tag=get_spoolman_tag(),
+            spoolman_coalesce_window=get_spoolman_coalesce_window(),
+            spoolman_healthcheck_interval=get_spoolman_healthcheck_interval(),
+            spoolman_degraded_healthcheck_interval=get_spoolman_degraded_healthcheck_interval(),
+            spoolman_max_degraded_healthcheck_interval=get_spoolman_max_degraded_healthcheck_interval(),
+            journal_fsync_batch=get_journal_fsync_batch(),
+            journal_fsync_interval=get_journal_fsync_interval(),
+            snapshots_dir=get_snapshots_dir().resolve(),
+            history_dir=get_history_dir().resolve(),
+            history_sample_interval=get_history_sample_interval(),
+            color_match_tolerance=get_color_match_tolerance(),
+            reconcile_interval=get_reconcile_interval(),
+            sync_mode=get_sync_mode(),
+            sync_flush_interval=get_sync_flush_interval(),
+            pushall_interval=get_pushall_interval(),
+            pushall_jitter=get_pushall_jitter(),
+            alert_webhooks=tuple(get_alert_webhooks()),
+            alert_low_stock_grams=get_alert_low_stock_grams(),
+            alert_low_stock_percent=get_alert_low_stock_percent(),
+            alert_material_low_stock_grams=get_alert_material_low_stock_grams(),
+            alert_humidity=get_alert_humidity(),
+            alert_offline_minutes=get_alert_offline_minutes(),
+            version=get_version(),
+            commit_hash=get_commit_hash(),
+            build_date=get_build_date(),
+        )
+
+
+# Settings that what was built from them can't follow at runtime: the directories files are open in, the routes and
+# log formatters set up at startup, the tag every bound spool is stored under and the tasks that were scheduled
+RESTART_SETTINGS = (
+    "log_format",
+    "debug_mode",
+    "automatic_backup",
+    "data_dir",
+    "logs_dir",
+    "backups_dir",
+    "base_path",
+    "spoolman_tag",
+    "spoolman_healthcheck_interval",
+    "snapshots_dir",
+    "history_dir",
+    "history_sample_interval",
+    "reconcile_interval",
+)
+
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+_settings_listeners: list[Callable[[Settings], None]] = []
+
+
+def get_settings() -> Settings:
+    """Get the shared settings, resolving them from the environment on first use.
+
+    Returns:
+        Settings: The resolved settings.
+
+    """
+    global _settings
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = Settings.from_env()
+                logger.debug("Settings resolved: %s", _settings)
+            settings = _settings
+    return settings
+
+
+def add_settings_listener(listener: Callable[[Settings], None]) -> None:
+    """Call a listener with the new settings every time they are reloaded."""
+    _settings_listeners.append(listener)
+
+
+def reload_settings() -> Settings:
+    """Re-resolve the settings from the environment and notify the listeners.
+
+    Returns:
+        Settings: The reloaded settings.
+
+    """
+    global _settings
+    with _settings_lock:
+        current = _settings
+        settings = Settings.from_env()
+        if current is not None:
+            changed = [name for name in RESTART_SETTINGS if getattr(settings, name) != getattr(current, name)]
+            if len(changed) > 0:
+                logger.warning("Settings %s changed, they take effect on restart", ", ".join(changed))
+            settings = replace(settings, **{name: getattr(current, name) for name in RESTART_SETTINGS})
+        _settings = settings
+    logger.info("Settings reloaded: %s", settings)
+
+    for listener in list(_settings_listeners):
+        try:
+            listener(settings)
+        except Exception:
+            logger.exception("Settings listener failed")
+    return settings
@@ -0,0 +1,104 @@
+"""Bounded, sequence-numbered ring of recent printer, AMS and sync events, served as Server-Sent Events.
+
+Events are published from the MQTT and health check threads and read by the SSE streams on the event loop. Every event
+gets the next sequence number, which is sent as the SSE id, so a client that reconnects with Last-Event-ID is sent only
+the events it missed. Once those have been dropped from the ring the client has to be sent a fresh snapshot instead.
+The sequence restarts with the service, so ids are qualified with the boot epoch, as `<epoch>-<sequence>`, and an id
+from another epoch is treated as too far behind to replay.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 1024
+
+EVENT_PRINTER = "printer"
+EVENT_AMS = "ams"
+EVENT_SYNC = "sync"
+EVENT_SPOOLMAN = "spoolman"
+EVENT_JOB = "job"
+EVENT_ALERT = "alert"
+
+
+class EventRing:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.lock = threading.Lock()
+        self.events: deque = deque(maxlen=capacity)
+        # When the ring was created, in nanoseconds, so ids from before a restart are never mistaken for current ones
+        self.epoch = time.time_ns()
+        self.sequence = 0
+        # (loop, asyncio.Event) of every stream waiting for the next event
+        self.waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def publish(self, event_type: str, data: dict) -> int:
+        """Add an event to the ring and wake the waiting streams, safe to call from any thread."""
+        with self.lock:
+            self.sequence += 1
+            self.events.append((self.sequence, event_type, time.time(), data))
+            sequence = self.sequence
+            waiters = list(self.waiters)
+
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # The loop of a stream that has gone away has been closed
+                pass
+        return sequence
+
+    def get_sequence(self) -> int:
+        with self.lock:
+            return self.sequence
+
+    def format_id(self, sequence: int) -> str:
+        """Get the SSE id of a sequence number."""
+        return f"{self.epoch}-{sequence}"
+
+    def parse_id(self, event_id: str) -> Optional[int]:
+        """Get the sequence number of an SSE id, None if it is from another epoch or isn't an id at all."""
+        epoch, _, sequence = event_id.rpartition("-")
+        if epoch != str(self.epoch) or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def get_since(self, last_id: int) -> Optional[list[tuple]]:
+        """Get the events after a sequence number.
+
+        Returns None if some of the events after it have already been dropped from the ring, or the sequence number
+        is newer than any handed out (i.e. from before a restart), as the events can't be replayed.
+        """
+        with self.lock:
+            if last_id > self.sequence:
+                return None
+            oldest = self.events[0][0] if len(self.events) > 0 else self.sequence + 1
+            if last_id < oldest - 1:
+                return None
+            return [event for event in self.events if event[0] > last_id]
+
+    async def wait(self, last_id: int, timeout: float) -> None:
+        """Wait until there are events after a sequence number, or the timeout passes."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            if self.sequence > last_id:
+                return
+            self.waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+
+
+event_ring = EventRing()
+
+
+def publish(event_type: str, data: dict) -> int:
+    return event_ring.publish(event_type, data)
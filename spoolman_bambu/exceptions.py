@@ -19,3 +19,7 @@ class ItemUpdateError(Exception):
 
 class SpoolMeasureError(Exception):
     pass
+
+
+class SpoolmanUnavailableError(Exception):
+    pass
@@ -0,0 +1,165 @@
+"""Streaming CSV and NDJSON export of the printer, tray and spool state.
+
+The state of each dataset is captured up front, so an export is a consistent snapshot even while printers keep
+reporting, but rows are only built and encoded as the response is streamed. Rows are written in chunks, so memory use
+doesn't grow with the size of the export.
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from spoolman_bambu.spoolman.index import get_spool_tray_uuid
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+
+MEDIA_TYPES = {
+    FORMAT_CSV: "text/csv",
+    FORMAT_NDJSON: "application/x-ndjson",
+}
+
+# Rows are encoded this many at a time into each chunk of the response
+CHUNK_ROWS = 500
+
+PRINTER_COLUMNS = (
+    "printer_id",
+    "printer_ip",
+    "status",
+    "ams_unit_count",
+    "ams_active_spools_count",
+    "last_mqtt_message",
+    "last_mqtt_ams_message",
+)
+TRAY_COLUMNS = (
+    "printer_id",
+    "slot",
+    "ams_id",
+    "tray_id",
+    "tray_uuid",
+    "tray_type",
+    "sub_brands",
+    "color",
+    "colors",
+    "remain",
+    "weight",
+    "spool_id",
+    "remaining_weight",
+)
+SPOOL_COLUMNS = (
+    "id",
+    "filament_id",
+    "filament_name",
+    "material",
+    "color_hex",
+    "external_id",
+    "remaining_weight",
+    "initial_weight",
+    "used_weight",
+    "location",
+    "tray_uuid",
+    "first_used",
+    "last_used",
+    "archived",
+)
+
+
+def snapshot_printers(printers) -> list[dict]:
+    """Capture the state of every printer."""
+    return [
+        {
+            "printer_id": printer.get_printer_id(),
+            "printer_ip": printer.get_printer_ip(),
+            "status": printer.get_status(),
+            "ams_unit_count": printer.get_ams_unit_count(),
+            "ams_active_spools_count": printer.get_ams_active_spools_count(),
+            "last_mqtt_message": printer.get_last_mqtt_message(),
+            "last_mqtt_ams_message": printer.get_last_mqtt_ams_message(),
+        }
+        for printer in printers
+    ]
+
+
+def snapshot_trays(printers) -> list[tuple[str, list]]:
+    """Capture the trays of every printer, each taken at a single version of its tray state."""
+    return [(printer.get_printer_id(), printer.get_tray_state().get_changes()["trays"]) for printer in printers]
+
+
+def iter_tray_rows(tray_snapshot: list[tuple[str, list]]) -> Iterator[dict]:
+    for printer_id, trays in tray_snapshot:
+        for tray in trays:
+            yield {"printer_id": printer_id, **tray}
+
+
+def iter_spool_rows(spools: list[dict], tag: str) -> Iterator[dict]:
+    for spool in spools:
+        filament = spool.get("filament") or {}
+        yield {
+            "id": spool.get("id"),
+            "filament_id": filament.get("id"),
+            "filament_name": filament.get("name"),
+            "material": filament.get("material"),
+            "color_hex": filament.get("color_hex"),
+            "external_id": filament.get("external_id"),
+            "remaining_weight": spool.get("remaining_weight"),
+            "initial_weight": spool.get("initial_weight"),
+            "used_weight": spool.get("used_weight"),
+            "location": spool.get("location"),
+            "tray_uuid": get_spool_tray_uuid(spool, tag),
+            "first_used": spool.get("first_used"),
+            "last_used": spool.get("last_used"),
+            "archived": spool.get("archived"),
+        }
+
+
+def _format_csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ";".join(str(item) for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def stream_csv(columns: tuple, rows: Iterable[dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([_format_csv_value(row.get(column)) for column in columns])
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(columns: tuple, rows: Iterable[dict]) -> Iterator[str]:
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps({column: row.get(column) for column in columns}, default=_json_default))
+        if len(chunk) >= CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if len(chunk) > 0:
+        yield "\n".join(chunk) + "\n"
+
+
+def stream_rows(export_format: str, columns: tuple, rows: Iterable[dict]) -> Iterator[str]:
+    if export_format == FORMAT_NDJSON:
+        return stream_ndjson(columns, rows)
+    return stream_csv(columns, rows)
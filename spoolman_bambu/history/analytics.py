@@ -0,0 +1,141 @@
+"""Fleet-wide filament consumption analytics and run-out forecasting from the spool remaining history.
+
+Consumption is computed from the per spool `<tray_uuid>.spool` series, so swapping spools between slots isn't counted
+as consumption, and every spool with samples in the window is reported, including those unloaded or used up during it.
+The material, color and weight of a spool come from the metadata of its series, rather than the trays loaded now. The remaining % samples of every spool are flattened into column arrays, and each series' drops are
+summed with the builtin iterators over a slice of the columns rather than a per sample Python loop. Results are cached
+per window until the history records a new spool sample.
+"""
+
+import logging
+import operator
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_WINDOWS = 16
+
+
+def _group(spools: list[dict], field: str, window_hours: float, end: float) -> list[dict]:
+    groups = {}
+    for spool in spools:
+        group = groups.setdefault(
+            spool[field], {"key": spool[field], "spool_count": 0, "grams_consumed": 0.0, "remaining_weight": 0.0}
+        )
+        group["spool_count"] += 1
+        group["grams_consumed"] += spool["grams_consumed"]
+        group["remaining_weight"] += spool["remaining_weight"]
+
+    for group in groups.values():
+        group["usage_rate"] = group["grams_consumed"] / window_hours if window_hours > 0 else 0.0
+        group["run_out"] = _run_out(group["remaining_weight"], group["usage_rate"], end)
+    return sorted(groups.values(), key=lambda group: group["grams_consumed"], reverse=True)
+
+
+def _run_out(remaining_weight: float, usage_rate: float, end: float) -> Optional[datetime]:
+    if usage_rate <= 0:
+        return None
+    return datetime.fromtimestamp(end + remaining_weight / usage_rate * 3600, timezone.utc)
+
+
+def _consumed(values) -> float:
+    """Sum the drops in remaining % of a series, rises are refills."""
+    return sum(filter((0.0).__lt__, map(operator.sub, values, values[1:])))
+
+
+def compute(columns: tuple, metadata: dict, trays: dict, start: float, end: float) -> dict:
+    """Compute consumption, usage rate and run-out per spool and per material, color and printer.
+
+    Args:
+        columns: The (keys, indexes, times, values) spool columns from TimeSeriesStore.get_columns.
+        metadata: The material, color and weight of each spool series, keyed like the columns.
+        trays: The trays currently loaded, keyed by (printer_id, slot), only used for the slot of a spool.
+        start: Start of the window as a timestamp.
+        end: End of the window as a timestamp.
+
+    """
+    loaded = {(printer_id, tray.tray_uuid): (slot, tray) for (printer_id, slot), tray in trays.items()}
+    keys, indexes, _, values = columns
+    window_hours = (end - start) / 3600
+    spools = []
+    # A spool moved between printers has a series on each of them, its consumption is counted against each printer
+    for key, (printer_id, name) in enumerate(keys):
+        tray_uuid = name.rsplit(".", 1)[0]
+        slot, tray = loaded.get((printer_id, tray_uuid), (None, None))
+        spool_metadata = metadata.get((printer_id, name))
+        if spool_metadata is None and tray is not None:
+            spool_metadata = {"material": tray.tray_type, "color": tray.color, "weight": tray.weight}
+        if spool_metadata is None or spool_metadata["weight"] is None:
+            logger.debug("Analytics skipped spool %s, its weight is unknown", tray_uuid)
+            continue
+
+        # The samples of each series are contiguous in the columns, in time order
+        series = values[bisect_left(indexes, key) : bisect_left(indexes, key + 1)]
+        weight = spool_metadata["weight"]
+        remain = series[-1]
+        grams_consumed = _consumed(series) / 100 * weight
+        remaining_weight = remain / 100 * weight
+        usage_rate = grams_consumed / window_hours if window_hours > 0 else 0.0
+        spools.append(
+            {
+                "printer_id": printer_id,
+                "slot": slot,
+                "tray_uuid": tray_uuid,
+                "material": spool_metadata["material"],
+                "color": spool_metadata["color"],
+                "remain": remain,
+                "remaining_weight": remaining_weight,
+                "grams_consumed": grams_consumed,
+                "usage_rate": usage_rate,
+                "run_out": _run_out(remaining_weight, usage_rate, end),
+            }
+        )
+
+    return {
+        "start": datetime.fromtimestamp(start, timezone.utc),
+        "end": datetime.fromtimestamp(end, timezone.utc),
+        "spools": spools,
+        "materials": _group(spools, "material", window_hours, end),
+        "colors": _group(spools, "color", window_hours, end),
+        "printers": _group(spools, "printer_id", window_hours, end),
+    }
+
+
+class FleetAnalytics:
+    """Caches analytics per window, until a spool sample is recorded or the loaded trays change."""
+
+    def __init__(self, history):
+        self.history = history
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+
+    def get_analytics(self, window: float, trays: dict, now: float) -> dict:
+        # Humidity, temperature and slot samples don't change the analytics, so they keep the cache
+        version = self.history.get_version("spool")
+        loaded = tuple(sorted((key, tray.tray_uuid) for key, tray in trays.items()))
+
+        with self.lock:
+            cached = self.cache.get(window)
+            if cached is not None and cached[0] == version and cached[1] == loaded:
+                self.cache.move_to_end(window)
+                return cached[2]
+
+        result = compute(
+            self.history.get_columns("spool", now - window, now),
+            self.history.get_metadata("spool"),
+            trays,
+            now - window,
+            now,
+        )
+        logger.debug("Analytics computed for %s spools over %ss", len(result["spools"]), window)
+
+        with self.lock:
+            self.cache[window] = (version, loaded, result)
+            self.cache.move_to_end(window)
+            while len(self.cache) > MAX_CACHED_WINDOWS:
+                self.cache.popitem(last=False)
+        return result
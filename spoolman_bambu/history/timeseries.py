@@ -0,0 +1,508 @@
+"""Bounded time-series history of tray remaining filament and AMS humidity/temperature.
+
+Samples are kept in memory in bounded, array backed ring buffers at three resolutions: raw samples, 1 minute
+averages and 1 hour averages, so memory stays bounded no matter how long the service runs. The buffers grow as samples
+arrive up to their capacity, so a series only takes the memory of the samples it holds. Raw samples are also appended
+to fixed size binary segment files on disk, which are memory mapped to restore the history after a restart.
+
+A series which hasn't had a sample for SERIES_TTL, such as that of a spool which has been unloaded, is dropped along
+with its segment files, and only the MAX_OPEN_WRITERS most recently written segment files are kept open, so memory,
+disk usage and open files stay bounded however many spools the fleet loads over time.
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from spoolman_bambu.bambu.models import EMPTY_TRAY_UUID
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_RAW = "raw"
+RESOLUTION_MINUTE = "minute"
+RESOLUTION_HOUR = "hour"
+RESOLUTION_AUTO = "auto"
+
+# Raw samples, roughly a day at the default sample interval
+RAW_CAPACITY = 2880
+# A week of 1 minute averages
+MINUTE_CAPACITY = 7 * 24 * 60
+# A year of 1 hour averages
+HOUR_CAPACITY = 365 * 24
+
+# Each on-disk record is a little endian (timestamp, value) pair of doubles
+RECORD = struct.Struct("<dd")
+SEGMENT_RECORDS = 65536
+MAX_SEGMENTS = 4
+
+# Series without a sample for this long are dropped, a loaded tray is always recorded every heartbeat interval
+SERIES_TTL = 30 * 24 * 3600
+# How often idle series are looked for, in seconds of sample time
+EXPIRE_INTERVAL = 3600
+# Segment files kept open for appending, the least recently written are closed beyond this
+MAX_OPEN_WRITERS = 64
+
+SERIES_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+# Per printer file of the metadata of its series, such as the material of a spool
+METADATA_FILE = "series.json"
+
+
+class RingBuffer:
+    """Bounded ring of (timestamp, value) samples, oldest samples are overwritten once full.
+
+    The arrays grow as samples are appended until they reach the capacity, the start only moves once they are full.
+    """
+
+    __slots__ = ("capacity", "times", "values", "start", "size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array("d")
+        self.values = array("d")
+        self.start = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, timestamp: float, value: float) -> None:
+        if self.size < self.capacity:
+            self.times.append(timestamp)
+            self.values.append(value)
+            self.size += 1
+            return
+        self.times[self.start] = timestamp
+        self.values[self.start] = value
+        self.start = (self.start + 1) % self.capacity
+
+    def _time_at(self, logical_index: int) -> float:
+        return self.times[(self.start + logical_index) % self.capacity]
+
+    def covers(self, start: float) -> bool:
+        """Check no samples at or after start have been overwritten yet."""
+        return self.size < self.capacity or self._time_at(0) <= start
+
+    def latest(self) -> Optional[tuple[float, float]]:
+        if self.size == 0:
+            return None
+        index = (self.start + self.size - 1) % self.capacity
+        return (self.times[index], self.values[index])
+
+    def range(self, start: float, end: float) -> list[tuple[float, float]]:
+        """Get the samples with start <= timestamp <= end, in time order."""
+        # Binary search for the first sample at or after start, samples are appended in time order
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._time_at(middle) < start:
+                low = middle + 1
+            else:
+                high = middle
+
+        samples = []
+        for logical_index in range(low, self.size):
+            index = (self.start + logical_index) % self.capacity
+            if self.times[index] > end:
+                break
+            samples.append((self.times[index], self.values[index]))
+        return samples
+
+
+class Downsampler:
+    """Averages samples into fixed width time buckets, appending each completed bucket to a ring buffer."""
+
+    __slots__ = ("bucket_seconds", "ring", "bucket_start", "total", "count")
+
+    def __init__(self, bucket_seconds: int, capacity: int):
+        self.bucket_seconds = bucket_seconds
+        self.ring = RingBuffer(capacity)
+        self.bucket_start = None
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, timestamp: float, value: float) -> None:
+        bucket_start = timestamp - (timestamp % self.bucket_seconds)
+        if self.bucket_start is not None and bucket_start != self.bucket_start:
+            self.ring.append(self.bucket_start, self.total / self.count)
+            self.total, self.count = 0.0, 0
+        self.bucket_start = bucket_start
+        self.total += value
+        self.count += 1
+
+    def range(self, start: float, end: float) -> list[tuple[float, float]]:
+        samples = self.ring.range(start, end)
+        # Include the bucket still being filled so the latest data is always visible
+        if self.count > 0 and start <= self.bucket_start <= end:
+            samples.append((self.bucket_start, self.total / self.count))
+        return samples
+
+
+class Series:
+    """A single time-series, held at raw, 1 minute and 1 hour resolution."""
+
+    __slots__ = ("name", "raw", "minute", "hour")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.raw = RingBuffer(RAW_CAPACITY)
+        self.minute = Downsampler(60, MINUTE_CAPACITY)
+        self.hour = Downsampler(3600, HOUR_CAPACITY)
+
+    def append(self, timestamp: float, value: float) -> None:
+        self.raw.append(timestamp, value)
+        self.minute.add(timestamp, value)
+        self.hour.add(timestamp, value)
+
+    def latest(self) -> Optional[tuple[float, float]]:
+        return self.raw.latest()
+
+    def query(self, start: float, end: float, resolution: str = RESOLUTION_AUTO) -> tuple[str, list]:
+        """Get the samples between start and end, picking the finest resolution that covers the range for auto."""
+        if resolution == RESOLUTION_AUTO:
+            resolution = RESOLUTION_HOUR
+            if self.raw.covers(start):
+                resolution = RESOLUTION_RAW
+            elif self.minute.ring.covers(start):
+                resolution = RESOLUTION_MINUTE
+
+        if resolution == RESOLUTION_RAW:
+            return resolution, self.raw.range(start, end)
+        if resolution == RESOLUTION_MINUTE:
+            return resolution, self.minute.range(start, end)
+        return RESOLUTION_HOUR, self.hour.range(start, end)
+
+
+class SegmentWriter:
+    """Appends raw samples of a series to fixed size segment files, keeping at most MAX_SEGMENTS of them.
+
+    The current segment is kept open and its size tracked, so an append is a single write.
+    """
+
+    def __init__(self, directory: Path, name: str):
+        self.directory = directory
+        self.name = name
+        segments = self.list_segments()
+        self.segment = int(segments[-1].name.split(".")[-2]) if len(segments) > 0 else 0
+        self.file = None
+        self.size = 0
+
+    def list_segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"{self.name}.*.seg"))
+
+    def segment_path(self, segment: int) -> Path:
+        return self.directory.joinpath(f"{self.name}.{segment:06d}.seg")
+
+    def append(self, timestamp: float, value: float) -> None:
+        if self.file is None:
+            self.file = self.segment_path(self.segment).open("ab")
+            self.size = self.file.tell()
+
+        if self.size >= SEGMENT_RECORDS * RECORD.size:
+            self.file.close()
+            self.segment += 1
+            # Drop the oldest segments so disk usage stays bounded
+            for old_segment in self.list_segments()[: -(MAX_SEGMENTS - 1)]:
+                old_segment.unlink()
+            self.file = self.segment_path(self.segment).open("ab")
+            self.size = 0
+
+        self.file.write(RECORD.pack(timestamp, value))
+        # Written through on every sample, so a crash loses at most the sample being written
+        self.file.flush()
+        self.size += RECORD.size
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def read(self):
+        """Yield every stored sample in time order, unpacking each memory mapped segment in place."""
+        for path in self.list_segments():
+            size = path.stat().st_size
+            # Ignore a torn record at the end of a segment
+            usable = size - (size % RECORD.size)
+            if usable == 0:
+                continue
+            with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)[:usable]
+                records = RECORD.iter_unpack(view)
+                try:
+                    yield from records
+                finally:
+                    # The mapping can only be closed once nothing references its buffer
+                    del records
+                    view.release()
+
+
+class TimeSeriesStore:
+    """Per printer time-series of tray remaining % and AMS humidity/temperature.
+
+    The remaining % is recorded per slot, as `<slot>.remain`, and per spool, as `<tray_uuid>.spool`, so a spool keeps
+    one continuous series however often it is swapped between slots. The material, color and weight of each spool are
+    kept as the metadata of its series, so its consumption can be reported after it has been unloaded or used up.
+
+    A sample is only recorded for a series once `sample_interval` seconds have passed since its last sample, unless
+    the value changed, and even an unchanged value is recorded every `heartbeat_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path],
+        sample_interval: float = 30,
+        heartbeat_interval: float = 600,
+        series_ttl: float = SERIES_TTL,
+    ):
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.series_ttl = series_ttl
+        self.lock = threading.Lock()
+        self.series: dict[str, dict[str, Series]] = {}
+        self.metadata: dict[str, dict[str, dict]] = {}
+        # Least recently written first, so the writers closed to stay within MAX_OPEN_WRITERS are the idle ones
+        self.writers: OrderedDict[tuple[str, str], SegmentWriter] = OrderedDict()
+        self.last_expire = None
+        self.version = 0
+        # Versions of each measurement, so readers of one measurement ignore samples recorded for the others
+        self.versions: dict[str, int] = {}
+
+    def get_printer_directory(self, printer_id: str) -> Optional[Path]:
+        if self.directory is None:
+            return None
+        printer_directory = self.directory.joinpath(printer_id)
+        printer_directory.mkdir(parents=True, exist_ok=True)
+        return printer_directory
+
+    def get_writer(self, printer_id: str, name: str) -> Optional[SegmentWriter]:
+        writer = self.writers.get((printer_id, name))
+        if writer is not None:
+            self.writers.move_to_end((printer_id, name))
+            return writer
+
+        printer_directory = self.get_printer_directory(printer_id)
+        if printer_directory is None:
+            return None
+        writer = SegmentWriter(printer_directory, name)
+        self.writers[(printer_id, name)] = writer
+        while len(self.writers) > MAX_OPEN_WRITERS:
+            _, idle_writer = self.writers.popitem(last=False)
+            idle_writer.close()
+        return writer
+
+    def load(self) -> None:
+        """Restore the in-memory history from the segments on disk."""
+        if self.directory is None or not self.directory.exists():
+            return
+
+        with self.lock:
+            for printer_directory in self.directory.iterdir():
+                if not printer_directory.is_dir():
+                    continue
+                names = {path.name.rsplit(".", 2)[0] for path in printer_directory.glob("*.seg")}
+                metadata = self._read_metadata(printer_directory)
+                self.metadata[printer_directory.name] = {name: metadata[name] for name in names if name in metadata}
+                for name in names:
+                    series = self._get_series(printer_directory.name, name)
+                    for timestamp, value in self.get_writer(printer_directory.name, name).read():
+                        series.append(timestamp, value)
+                    measurement = name.rsplit(".", 1)[-1]
+                    self.versions[measurement] = self.versions.get(measurement, 0) + 1
+                logger.info("History restored %s series for printer %s", len(names), printer_directory.name)
+            self.version += 1
+
+    def _get_series(self, printer_id: str, name: str) -> Series:
+        printer_series = self.series.setdefault(printer_id, {})
+        series = printer_series.get(name)
+        if series is None:
+            series = Series(name)
+            printer_series[name] = series
+        return series
+
+    def record(self, printer_id: str, name: str, timestamp: float, value: float) -> bool:
+        """Record a sample, returns whether it was kept."""
+        if not SERIES_NAME.match(name):
+            raise ValueError(f"Invalid series name '{name}'")
+
+        with self.lock:
+            series = self._get_series(printer_id, name)
+            latest = series.latest()
+            if latest is not None:
+                elapsed = timestamp - latest[0]
+                if elapsed < 0:
+                    return False
+                if latest[1] == value and elapsed < self.heartbeat_interval:
+                    return False
+                if latest[1] != value and elapsed < self.sample_interval:
+                    return False
+
+            series.append(timestamp, value)
+            self.version += 1
+            measurement = name.rsplit(".", 1)[-1]
+            self.versions[measurement] = self.versions.get(measurement, 0) + 1
+
+            # Written under the lock, another printer's sample may close an idle writer
+            writer = self.get_writer(printer_id, name)
+            if writer is not None:
+                try:
+                    writer.append(timestamp, value)
+                except OSError:
+                    logger.exception("History failed to persist sample for %s %s", printer_id, name)
+        return True
+
+    def _read_metadata(self, printer_directory: Path) -> dict:
+        path = printer_directory.joinpath(METADATA_FILE)
+        if not path.exists():
+            return {}
+        try:
+            with path.open() as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logger.exception("History failed to read series metadata of printer %s", printer_directory.name)
+            return {}
+
+    def _write_metadata(self, printer_id: str) -> None:
+        printer_directory = self.get_printer_directory(printer_id)
+        if printer_directory is None:
+            return
+        path = printer_directory.joinpath(METADATA_FILE)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with tmp_path.open("w") as f:
+                json.dump(self.metadata.get(printer_id, {}), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("History failed to persist series metadata of printer %s", printer_id)
+
+    def set_metadata(self, printer_id: str, name: str, metadata: dict) -> None:
+        """Set the metadata of a series, persisted only when it changes."""
+        with self.lock:
+            printer_metadata = self.metadata.setdefault(printer_id, {})
+            if printer_metadata.get(name) == metadata:
+                return
+            printer_metadata[name] = metadata
+            measurement = name.rsplit(".", 1)[-1]
+            self.versions[measurement] = self.versions.get(measurement, 0) + 1
+            self._write_metadata(printer_id)
+
+    def get_metadata(self, measurement: str) -> dict[tuple[str, str], dict]:
+        """Get the metadata of every series of a measurement, keyed by (printer_id, series name)."""
+        suffix = f".{measurement}"
+        with self.lock:
+            return {
+                (printer_id, name): metadata
+                for printer_id, printer_metadata in self.metadata.items()
+                for name, metadata in printer_metadata.items()
+                if name.endswith(suffix)
+            }
+
+    def expire(self, now: float) -> int:
+        """Drop the series without a sample for series_ttl, with their segment files, returns the number dropped."""
+        expired = []
+        with self.lock:
+            for printer_id, printer_series in self.series.items():
+                for name, series in printer_series.items():
+                    latest = series.latest()
+                    if latest is None or latest[0] < now - self.series_ttl:
+                        expired.append((printer_id, name))
+
+            for printer_id, name in expired:
+                del self.series[printer_id][name]
+                measurement = name.rsplit(".", 1)[-1]
+                self.versions[measurement] = self.versions.get(measurement, 0) + 1
+                writer = self.writers.pop((printer_id, name), None)
+                if writer is not None:
+                    writer.close()
+                if self.directory is not None:
+                    for path in SegmentWriter(self.directory.joinpath(printer_id), name).list_segments():
+                        path.unlink(missing_ok=True)
+                if self.metadata.get(printer_id, {}).pop(name, None) is not None:
+                    self._write_metadata(printer_id)
+            for printer_id in [printer_id for printer_id, printer_series in self.series.items() if not printer_series]:
+                del self.series[printer_id]
+            if len(expired) > 0:
+                self.version += 1
+
+        if len(expired) > 0:
+            logger.info("History dropped %s idle series", len(expired))
+        return len(expired)
+
+    def record_printer(self, printer, timestamp: float) -> None:
+        """Record the AMS and tray values of a parsed printer report."""
+        for ams_unit in printer.ams_units:
+            self.record(printer.printer_id, f"{ams_unit.id}.humidity", timestamp, ams_unit.humidity)
+            self.record(printer.printer_id, f"{ams_unit.id}.temp", timestamp, ams_unit.temp)
+            for tray in ams_unit.trays:
+                if tray.is_valid():
+                    self.record(printer.printer_id, f"{tray.slot}.remain", timestamp, tray.remain)
+                # A used up spool is still recorded, so its last drop is counted as consumption
+                if tray.is_valid() or (tray.remain == 0 and not tray.is_empty() and tray.tray_uuid != EMPTY_TRAY_UUID):
+                    name = f"{tray.tray_uuid}.spool"
+                    self.record(printer.printer_id, name, timestamp, tray.remain)
+                    self.set_metadata(
+                        printer.printer_id,
+                        name,
+                        {"material": tray.tray_type, "color": tray.color, "weight": tray.weight},
+                    )
+
+        if self.last_expire is None or timestamp - self.last_expire >= EXPIRE_INTERVAL:
+            self.last_expire = timestamp
+            self.expire(timestamp)
+
+    def get_series_names(self, printer_id: str) -> list[str]:
+        with self.lock:
+            return sorted(self.series.get(printer_id, {}).keys())
+
+    def query(
+        self, printer_id: str, name: str, start: float, end: float, resolution: str = RESOLUTION_AUTO
+    ) -> Optional[tuple[str, list]]:
+        with self.lock:
+            series = self.series.get(printer_id, {}).get(name)
+            if series is None:
+                return None
+            return series.query(start, end, resolution)
+
+    def get_columns(self, measurement: str, start: float, end: float) -> tuple[list, array, array, array]:
+        """Get every series of a measurement between start and end, flattened into column arrays.
+
+        Returns the (printer_id, series name) keys, and for every sample its key index, timestamp and value.
+        """
+        keys = []
+        indexes = array("l")
+        times = array("d")
+        values = array("d")
+        suffix = f".{measurement}"
+        with self.lock:
+            for printer_id, printer_series in self.series.items():
+                for name, series in printer_series.items():
+                    if not name.endswith(suffix):
+                        continue
+                    _, samples = series.query(start, end)
+                    if len(samples) == 0:
+                        continue
+                    indexes.extend([len(keys)] * len(samples))
+                    keys.append((printer_id, name))
+                    for timestamp, value in samples:
+                        times.append(timestamp)
+                        values.append(value)
+        return keys, indexes, times, values
+
+    def get_version(self, measurement: Optional[str] = None) -> int:
+        """Get a counter which changes whenever a sample is recorded, only for the measurement if one is given."""
+        if measurement is not None:
+            return self.versions.get(measurement, 0)
+        return self.version
+
+    def close(self) -> None:
+        """Close the open segment files, called on shutdown."""
+        with self.lock:
+            for writer in self.writers.values():
+                writer.close()
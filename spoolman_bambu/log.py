@@ -0,0 +1,151 @@
+"""Asynchronous logging pipeline.
+
+Log records are put on an in-memory queue by the thread that logs them and are formatted and written by a single
+background listener thread, so console and file I/O never happens on the MQTT or request threads.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Debug records logged for every MQTT report are sampled at this rate, via extra={"sample_rate": REPORT_SAMPLE_RATE}
+REPORT_SAMPLE_RATE = 10
+
+# Only the records of the loggers handling the printers' reports are rate limited, the rest pass unfiltered
+RATE_LIMITED_LOGGER = "spoolman_bambu.bambu"
+
+# Attributes every LogRecord has, anything else was passed via extra={} and is included in JSON records. The sample
+# rate is an instruction to the rate limit filter rather than a field of the record.
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample_rate"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single line JSON objects, including any structured fields passed via extra={}."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS:
+                doc[key] = value
+        if record.exc_info:
+            doc["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """Queue handler that leaves formatting to the listener thread.
+
+    The standard QueueHandler formats the message before queueing it, which is what we want to move off the
+    logging thread. Records are only passed between threads in this process, so they don't need to be pickleable.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Rate limit and sample repetitive records.
+
+    Records are grouped by message type, which is the logger name plus the unformatted message template. Each type
+    may emit `rate_limit` records per `period` seconds, after which it is suppressed until the next period and the
+    first record of the next period notes how many were dropped. Records logged with extra={"sample_rate": N} are
+    additionally sampled, keeping one in every N. Warnings and errors are never filtered, nor are records of loggers
+    outside of `name`, such as uvicorn's access log.
+    """
+
+    def __init__(self, rate_limit: int, period: float = 60, name: str = RATE_LIMITED_LOGGER):
+        super().__init__(name)
+        self.rate_limit = rate_limit
+        self.period = period
+        self.lock = threading.Lock()
+        # Message type -> [period start, emitted in period, suppressed in period, seen]
+        self.counters: dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # The base filter matches records of the named logger and its children
+        if record.levelno >= logging.WARNING or not super().filter(record):
+            return True
+
+        template = record.msg if isinstance(record.msg, str) else repr(type(record.msg))
+        key = (record.name, template)
+        now = time.monotonic()
+        with self.lock:
+            counter = self.counters.get(key)
+            if counter is None:
+                counter = [now, 0, 0, 0]
+                self.counters[key] = counter
+            elif now - counter[0] >= self.period:
+                if counter[2] > 0:
+                    record.suppressed = counter[2]
+                counter[0], counter[1], counter[2] = now, 0, 0
+
+            counter[3] += 1
+            sample_rate = getattr(record, "sample_rate", 1)
+            if sample_rate > 1 and (counter[3] - 1) % sample_rate != 0:
+                return False
+
+            if self.rate_limit > 0 and counter[1] >= self.rate_limit:
+                counter[2] += 1
+                return False
+
+            counter[1] += 1
+            return True
+
+
+class SuppressedFormatter(logging.Formatter):
+    """Text formatter that notes how many similar records were suppressed by the rate limit."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        formatted = super().format(record)
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            formatted += f" ({suppressed} similar messages suppressed)"
+        return formatted
+
+
+class LoggingPipeline:
+    """Owns the log queue and the listener thread that writes records to the real handlers."""
+
+    def __init__(self, log_format: str, rate_limit: int):
+        self.log_format = log_format
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.queue_handler = LazyQueueHandler(self.queue)
+        self.rate_limit_filter = RateLimitFilter(rate_limit)
+        self.queue_handler.addFilter(self.rate_limit_filter)
+        self.listener: Optional[QueueListener] = None
+        self.handlers: list[logging.Handler] = []
+
+    def set_rate_limit(self, rate_limit: int) -> None:
+        self.rate_limit_filter.rate_limit = rate_limit
+
+    def create_formatter(self, fmt: str, datefmt: Optional[str] = None) -> logging.Formatter:
+        if self.log_format == "json":
+            return JsonFormatter()
+        return SuppressedFormatter(fmt, datefmt)
+
+    def add_handler(self, handler: logging.Handler) -> None:
+        """Add a handler which is written to from the listener thread."""
+        self.handlers.append(handler)
+        if self.listener is not None:
+            # The listener iterates over its handlers tuple, so swapping it in is safe while running
+            self.listener.handlers = tuple(self.handlers)
+
+    def start(self) -> None:
+        if self.listener is None:
+            self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+
+    def stop(self) -> None:
+        """Stop the listener thread, writing out any records still on the queue."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
@@ -1,6 +1,8 @@
 """Main entrypoint to the server."""
 
+import asyncio
 import logging
+import signal
 import subprocess
 from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
@@ -13,32 +15,51 @@ from fastapi.responses import PlainTextResponse, RedirectResponse, Response
 from scheduler.asyncio.scheduler import Scheduler
 
 from spoolman_bambu import env, state, task_scheduler
+from spoolman_bambu.alerts.delivery import WebhookDelivery
+from spoolman_bambu.alerts.rules import AlertEngine, AlertRules
+from spoolman_bambu.history.analytics import FleetAnalytics
+from spoolman_bambu.history.timeseries import TimeSeriesStore
+from spoolman_bambu.log import LoggingPipeline
 from spoolman_bambu.spoolman.spoolman import Spoolman
+from spoolman_bambu.bambu import fleet
 from spoolman_bambu.bambu.bambu import Bambu
+from spoolman_bambu.bambu.inventory import Inventory
+from spoolman_bambu.bambu.jobs import JobLedger, get_job_ledger_path
 from spoolman_bambu.api.v1.router import app as v1_app
 from spoolman_bambu.client.client import SinglePageApplication
 
+# Resolve the configuration once, every module shares the resolved settings
+settings = env.get_settings()
+
+# Setup the logging pipeline, records are queued by the logging thread and written out by a background listener
+logging_pipeline = LoggingPipeline(settings.log_format, settings.log_rate_limit)
+
 # Define a console logger
 console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter("%(name)-26s %(levelname)-8s %(message)s"))
+console_handler.setFormatter(logging_pipeline.create_formatter("%(name)-26s %(levelname)-8s %(message)s"))
+logging_pipeline.add_handler(console_handler)
+logging_pipeline.start()
 
-# Setup the spoolman_bambu logger, which all spoolman_bambu modules will use
-log_level = env.get_logging_level()
-root_logger = logging.getLogger()
-root_logger.setLevel(log_level)
-root_logger.addHandler(console_handler)
+UVICORN_LOGGER_NAMES = ("uvicorn", "uvicorn.error", "uvicorn.access")
 
-# Fix uvicorn logging
-logging.getLogger("uvicorn").setLevel(log_level)
-logging.getLogger("uvicorn").removeHandler(logging.getLogger("uvicorn").handlers[0])
-logging.getLogger("uvicorn").addHandler(console_handler)
 
-logging.getLogger("uvicorn.error").setLevel(log_level)
-logging.getLogger("uvicorn.error").addHandler(console_handler)
+def set_logging_level(log_level: int) -> None:
+    """Set the level of the root logger, and the uvicorn loggers that propagate to it."""
+    logging.getLogger().setLevel(log_level)
+    for uvicorn_logger_name in UVICORN_LOGGER_NAMES:
+        logging.getLogger(uvicorn_logger_name).setLevel(log_level)
+
+
+# Setup the spoolman_bambu logger, which all spoolman_bambu modules will use
+root_logger = logging.getLogger()
+root_logger.addHandler(logging_pipeline.queue_handler)
+set_logging_level(settings.logging_level)
 
-logging.getLogger("uvicorn.access").setLevel(log_level)
-logging.getLogger("uvicorn.access").removeHandler(logging.getLogger("uvicorn.access").handlers[0])
-logging.getLogger("uvicorn.access").addHandler(console_handler)
+# Fix uvicorn logging, route it through the same pipeline via the root logger
+for uvicorn_logger_name in UVICORN_LOGGER_NAMES:
+    uvicorn_logger = logging.getLogger(uvicorn_logger_name)
+    uvicorn_logger.handlers.clear()
+    uvicorn_logger.propagate = True
 
 # Get logger instance for this module
 logger = logging.getLogger(__name__)
@@ -104,8 +125,10 @@ def add_file_logging() -> None:
     # Define a file logger with log rotation
     log_file = env.get_logs_dir().joinpath("spoolman_bambu.log")
     file_handler = TimedRotatingFileHandler(log_file, when="midnight", backupCount=5)
-    file_handler.setFormatter(logging.Formatter("%(asctime)s:%(levelname)s:%(message)s", "%Y-%m-%d %H:%M:%S"))
-    root_logger.addHandler(file_handler)
+    file_handler.setFormatter(
+        logging_pipeline.create_formatter("%(asctime)s:%(levelname)s:%(message)s", "%Y-%m-%d %H:%M:%S")
+    )
+    logging_pipeline.add_handler(file_handler)
 
 
 def initialise_spoolman() -> None:
@@ -116,26 +139,94 @@ def initialise_spoolman() -> None:
     spoolman.check_health()
     spoolman.initialise()
     # Get the initial state of the spools
-    app_state.set_spoolman_spools(spoolman.get_spools())
+    spools = spoolman.get_spools()
+    app_state.set_spoolman_spools(spools)
+    # Bring the local tray index in line with any changes made in Spoolman while we were not running
+    spoolman.reconcile_index(spools)
+
+
+def initialise_history() -> None:
+    """Initialise the tray and AMS history, restoring it from disk."""
+    settings = env.get_settings()
+    history = TimeSeriesStore(settings.history_dir, sample_interval=settings.history_sample_interval)
+    history.load()
+    app_state.set_history(history)
+    app_state.set_analytics(FleetAnalytics(history))
+
+
+def initialise_jobs() -> None:
+    """Initialise the ledger of the filament used by each print job, and the fleet inventory."""
+    app_state.set_job_ledger(JobLedger(get_job_ledger_path()))
+    app_state.set_inventory(Inventory())
+
+
+def initialise_alerts() -> None:
+    """Initialise the alert rules and start delivering alerts to the webhooks."""
+    settings = env.get_settings()
+    delivery = WebhookDelivery(list(settings.alert_webhooks))
+    delivery.start()
+    app_state.set_alert_delivery(delivery)
+    app_state.set_alerts(AlertEngine(create_alert_rules(settings), emit=delivery.enqueue))
+
+
+def create_alert_rules(settings: env.Settings) -> AlertRules:
+    return AlertRules(
+        low_stock_grams=settings.alert_low_stock_grams,
+        low_stock_percent=settings.alert_low_stock_percent,
+        material_low_stock_grams=settings.alert_material_low_stock_grams,
+        humidity=settings.alert_humidity,
+        offline_minutes=settings.alert_offline_minutes,
+    )
 
 
 def initialise_printers() -> None:
     """Initialise printers connection and instance."""
-    printers = env.get_all_printer_env_vars()
-    logger.info(f"Found {len(printers)} printers in env configuration, initilising them now...")
+    printers = fleet.load_printer_configs()
+    logger.info("Found %s printers in configuration, initilising them now...", len(printers))
 
     if len(printers) == 0:
-        logger.warning("No printers configured via env variables, please see project readme...")
+        logger.warning("No printers configured via env variables or the API, please see project readme...")
 
     for printer in printers:
-        app_state.add_printer(Bambu(printer.printer_id, printer.printer_ip, printer.printer_code))
-    logger.info(f"{len(printers)} printers initilised")
+        app_state.add_printer(
+            Bambu(printer.printer_id, printer.printer_ip, printer.printer_code),
+            fleet.get_printer_number(printer.printer_id),
+        )
+    logger.info("%s printers initilised", len(printers))
+
+
+def apply_settings(settings: env.Settings) -> None:
+    """Bring everything built from the settings in line with reloaded settings."""
+    set_logging_level(settings.logging_level)
+    logging_pipeline.set_rate_limit(settings.log_rate_limit)
+
+    app_state.get_spoolman().apply_settings(settings)
+    health_monitor = app_state.get_health_monitor()
+    if health_monitor is not None:
+        health_monitor.set_intervals(
+            settings.spoolman_healthcheck_interval,
+            settings.spoolman_degraded_healthcheck_interval,
+            settings.spoolman_max_degraded_healthcheck_interval,
+        )
+
+    for printer in app_state.get_printers():
+        printer.get_pushall().set_interval(settings.pushall_interval, settings.pushall_jitter)
+
+    alerts = app_state.get_alerts()
+    if alerts is not None:
+        alerts.set_rules(create_alert_rules(settings))
+    alert_delivery = app_state.get_alert_delivery()
+    if alert_delivery is not None:
+        alert_delivery.set_urls(list(settings.alert_webhooks))
 
 
 @app.on_event("startup")
 async def startup() -> None:
     """Run the service's startup sequence."""
 
+    # Resolved once when the module was imported, every module shares the resolved settings
+    settings = env.get_settings()
+
     # Don't add file logging until we have verified that the data directory is writable
     add_file_logging()
 
@@ -145,22 +236,34 @@ async def startup() -> None:
     )
 
     logger.info("Configuration:")
-    logger.info("Using data directory: %s", env.get_data_dir().resolve())
-    logger.info("Using logs directory: %s", env.get_logs_dir().resolve())
-    logger.info("Using backups directory: %s", env.get_backups_dir().resolve())
+    logger.info("Using data directory: %s", settings.data_dir)
+    logger.info("Using logs directory: %s", settings.logs_dir)
+    logger.info("Using backups directory: %s", settings.backups_dir)
     logger.info("")
 
     # Initialise state
     # Initialise spoolman
     initialise_spoolman()
+    # Initialise history, before the printers start reporting
+    initialise_history()
+    # Initialise the job ledger and inventory, before the printers start reporting
+    initialise_jobs()
+    # Initialise alerts, before the printers start reporting
+    initialise_alerts()
     # Initialise printers
     initialise_printers()
 
     # Setup scheduler
     schedule = Scheduler()
     task_scheduler.spoolman_schedule_tasks(schedule)
+    task_scheduler.printer_schedule_tasks(schedule)
     # externaldb.schedule_tasks(schedule)
 
+    # Reload the configuration from the environment on SIGHUP, the listener only swaps in values so it runs on the loop
+    env.add_settings_listener(apply_settings)
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, env.reload_settings)
+
     logger.info("Startup complete.")
 
 
@@ -175,11 +278,28 @@ async def shutdown() -> None:
 
     active_printers = app_state.get_printers()
     for printer in active_printers:
-        logger.info(f"Shutting down printer: {printer.get_printer_id()}...")
+        logger.info("Shutting down printer: %s...", printer.get_printer_id())
         if printer.get_status() == "connected":
             printer.disconnect()
 
+    health_monitor = app_state.get_health_monitor()
+    if health_monitor is not None:
+        health_monitor.stop()
+
+    alert_delivery = app_state.get_alert_delivery()
+    if alert_delivery is not None:
+        alert_delivery.stop()
+
+    # Make sure any journaled Spoolman writes are on disk
+    app_state.get_spoolman().journal.flush()
+    app_state.get_spoolman().index.close()
+
+    history = app_state.get_history()
+    if history is not None:
+        history.close()
+
     logger.info("Shutdown complete.")
+    logging_pipeline.stop()
 
 
 if __name__ == "__main__":
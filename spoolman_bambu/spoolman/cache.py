@@ -0,0 +1,205 @@
+"""Response cache for Spoolman GET requests, with per-resource TTLs and write-through invalidation.
+
+Once an entry expires it is revalidated with If-None-Match/If-Modified-Since when Spoolman sent an ETag or
+Last-Modified header for it, so an unchanged resource costs a 304 rather than a full download. Every write to a
+resource invalidates its entries, and a response that was in flight while a write happened is never stored, so reads
+after our own writes always go to Spoolman.
+
+Concurrent misses for the same request are coalesced, one caller fetches it while the rest wait for and share its
+result, which is also reused by anyone asking within a short window after it completes.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_VENDOR = "vendor"
+RESOURCE_FIELD = "field"
+RESOURCE_FILAMENT = "filament"
+RESOURCE_SPOOL = "spool"
+
+# Seconds each resource is served from the cache before it is revalidated
+DEFAULT_TTLS = {
+    RESOURCE_VENDOR: 3600,
+    RESOURCE_FIELD: 3600,
+    RESOURCE_FILAMENT: 300,
+    RESOURCE_SPOOL: 30,
+}
+
+
+STATS = ("hits", "misses", "revalidated", "coalesced", "invalidations")
+
+
+def copy_value(value):
+    """Copy a cached list or dict so callers can modify what they are given without changing the cache."""
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class CacheEntry:
+    __slots__ = ("resource", "value", "etag", "last_modified", "expires")
+
+    def __init__(self, resource: str, value, etag: Optional[str], last_modified: Optional[str], expires: float):
+        self.resource = resource
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def get_validators(self) -> dict:
+        """Get the conditional request headers which revalidate this entry."""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class Flight:
+    __slots__ = ("generation", "done", "completed", "value", "error")
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.done = threading.Event()
+        self.completed = None
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    def __init__(self, ttls: Optional[dict] = None, coalesce_window: float = 0):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.coalesce_window = coalesce_window
+        # In flight and recently completed fetches, shared by concurrent callers making the same request
+        self.flights: dict[tuple, Flight] = {}
+        self.lock = threading.Lock()
+        self.entries: dict[tuple, CacheEntry] = {}
+        # Bumped on every write to a resource, responses fetched under an older generation are not stored
+        self.generations: dict[str, int] = {}
+        self.stats: dict[str, dict[str, int]] = {}
+
+    def _count(self, resource: str, stat: str) -> None:
+        resource_stats = self.stats.setdefault(resource, dict.fromkeys(STATS, 0))
+        resource_stats[stat] += 1
+
+    def lookup(self, resource: str, key: tuple) -> tuple[Optional[object], Optional[CacheEntry], int]:
+        """Look up a response.
+
+        Returns the cached value if it is still fresh, otherwise the expired entry to revalidate (if any), along with
+        the generation to pass back to store.
+        """
+        with self.lock:
+            generation = self.generations.get(resource, 0)
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                self._count(resource, "hits")
+                return copy_value(entry.value), None, generation
+            return None, entry, generation
+
+    def peek(self, resource: str, key: tuple):
+        """Get a response if it is cached and still fresh, None otherwise. Never leads to a request.
+
+        The value is shared with the cache rather than copied, so it must not be modified.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.resource == resource and entry.expires > time.monotonic():
+                return entry.value
+        return None
+
+    def store(
+        self,
+        resource: str,
+        key: tuple,
+        value,
+        generation: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        """Store a fetched response, unless the resource was written to since the lookup."""
+        with self.lock:
+            self._count(resource, "misses")
+            if self.generations.get(resource, 0) == generation:
+                expires = time.monotonic() + self.ttls.get(resource, 0)
+                self.entries[key] = CacheEntry(resource, value, etag, last_modified, expires)
+        return copy_value(value)
+
+    def refresh(self, resource: str, key: tuple, entry: CacheEntry, generation: int):
+        """Extend an expired entry Spoolman confirmed is unchanged.
+
+        Returns None if the resource was written to since the lookup, as the confirmation may predate the write.
+        """
+        with self.lock:
+            if self.generations.get(resource, 0) != generation:
+                return None
+            self._count(resource, "revalidated")
+            entry.expires = time.monotonic() + self.ttls.get(resource, 0)
+            self.entries[key] = entry
+        return copy_value(entry.value)
+
+    def coalesce(self, resource: str, key: tuple, generation: int, fetch):
+        """Fetch a response, sharing the fetch with every concurrent caller making the same request.
+
+        A completed fetch is reused for coalesce_window seconds, unless the resource has been written to since. Every
+        caller gets its own copy of the result, a failed fetch raises the same error in every waiting caller.
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = (
+                flight is None
+                or flight.generation != generation
+                or (
+                    flight.completed is not None
+                    and (flight.error is not None or time.monotonic() - flight.completed > self.coalesce_window)
+                )
+            )
+            if leader:
+                flight = Flight(generation)
+                self.flights[key] = flight
+            else:
+                self._count(resource, "coalesced")
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy_value(flight.value)
+
+        try:
+            flight.value = fetch()
+            return copy_value(flight.value)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                flight.completed = time.monotonic()
+                if flight.error is not None or self.coalesce_window <= 0:
+                    if self.flights.get(key) is flight:
+                        del self.flights[key]
+            flight.done.set()
+
+    def invalidate(self, *resources: str) -> None:
+        with self.lock:
+            for resource in resources:
+                self.generations[resource] = self.generations.get(resource, 0) + 1
+                self._count(resource, "invalidations")
+            self.entries = {key: entry for key, entry in self.entries.items() if entry.resource not in resources}
+        logger.debug("Spoolman cache invalidated %s", resources)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = {}
+            for resource in sorted(set(self.ttls) | set(self.stats)):
+                resource_stats = dict(self.stats.get(resource, dict.fromkeys(STATS, 0)))
+                resource_stats["ttl"] = self.ttls.get(resource, 0)
+                resource_stats["entries"] = sum(1 for entry in self.entries.values() if entry.resource == resource)
+                stats[resource] = resource_stats
+            return stats
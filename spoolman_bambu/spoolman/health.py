@@ -0,0 +1,143 @@
+"""Non-blocking Spoolman health monitor with adaptive probing."""
+
+import asyncio
+import datetime
+import logging
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+STATUS_CONNECTED = "connected"
+STATUS_DEGRADED = "degraded"
+STATUS_DISCONNECTED = "disconnected"
+# Not probed yet, so the first probe always notifies the listeners
+STATUS_UNKNOWN = "unknown"
+
+# Responses slower than this are treated as degraded, so Spoolman is probed more often until it recovers
+SLOW_RESPONSE_THRESHOLD = 1.0
+LATENCY_SAMPLES = 20
+
+
+class HealthMonitor:
+    """Probes the Spoolman health endpoint from the event loop.
+
+    While Spoolman is healthy it is probed every `healthy_interval` seconds. Once it is degraded or unreachable it
+    is probed every `degraded_interval` seconds, backing off exponentially up to `max_degraded_interval` while it
+    stays down. Listeners are called with the old and new status whenever the status changes.
+    """
+
+    def __init__(
+        self,
+        spoolman,
+        healthy_interval: float,
+        degraded_interval: float,
+        max_degraded_interval: float,
+        timeout: float = 5,
+    ):
+        self.spoolman = spoolman
+        self.healthy_interval = healthy_interval
+        self.degraded_interval = degraded_interval
+        self.max_degraded_interval = max_degraded_interval
+        self.timeout = timeout
+        self.status = STATUS_UNKNOWN
+        self.consecutive_failures = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.listeners: list[Callable[[str, str], None]] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Callable[[str, str], None]) -> None:
+        self.listeners.append(listener)
+
+    def set_intervals(self, healthy_interval: float, degraded_interval: float, max_degraded_interval: float) -> None:
+        """Change the probe intervals, taking effect from the next probe."""
+        self.healthy_interval = healthy_interval
+        self.degraded_interval = degraded_interval
+        self.max_degraded_interval = max_degraded_interval
+
+    def get_status(self) -> str:
+        return self.status
+
+    def get_latency_stats(self) -> dict:
+        """Get the latency of recent successful probes, in seconds."""
+        if len(self.latencies) == 0:
+            return {"last": None, "average": None, "max": None}
+        return {
+            "last": self.latencies[-1],
+            "average": sum(self.latencies) / len(self.latencies),
+            "max": max(self.latencies),
+        }
+
+    def get_interval(self) -> float:
+        """Get how long to wait before the next probe, based on the current status."""
+        if self.status == STATUS_CONNECTED:
+            return self.healthy_interval
+        backoff = self.degraded_interval * (2 ** max(self.consecutive_failures - 1, 0))
+        return min(backoff, self.max_degraded_interval)
+
+    async def probe(self, client: httpx.AsyncClient) -> str:
+        """Probe the health endpoint once and return the resulting status."""
+        url = f"{self.spoolman.base_url}/api/v1/health"
+        start = time.monotonic()
+        try:
+            response = await client.get(url, timeout=self.timeout)
+        except httpx.HTTPError as e:
+            logger.warning("Spoolman instance health: %s unreachable: %s", url, e)
+            return STATUS_DISCONNECTED
+
+        latency = time.monotonic() - start
+        if response.status_code != 200:
+            logger.error("Spoolman instance health: %s status code %s", url, response.status_code)
+            return STATUS_DISCONNECTED
+
+        self.latencies.append(latency)
+        if latency > SLOW_RESPONSE_THRESHOLD:
+            logger.warning("Spoolman instance health: %s slow response %.2fs", url, latency)
+            return STATUS_DEGRADED
+        logger.debug("Spoolman instance health: %s %.3fs", url, latency)
+        return STATUS_CONNECTED
+
+    def set_status(self, status: str) -> None:
+        if status == STATUS_CONNECTED:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+
+        old_status = self.status
+        self.status = status
+        self.spoolman.set_status(status)
+        self.spoolman.set_last_status_check(datetime.datetime.now())
+
+        if old_status != status:
+            logger.info("Spoolman instance health changed: %s -> %s", old_status, status)
+            for listener in self.listeners:
+                try:
+                    listener(old_status, status)
+                except Exception:
+                    logger.exception("Spoolman health listener failed")
+
+    async def run(self) -> None:
+        """Probe Spoolman until cancelled."""
+        async with httpx.AsyncClient() as client:
+            while True:
+                try:
+                    self.set_status(await self.probe(client))
+                    if self.status != STATUS_DISCONNECTED and self.spoolman.journal.get_pending_count() > 0:
+                        # Replaying uses the blocking client, so keep it off the event loop
+                        await asyncio.to_thread(self.spoolman.journal.replay, self.spoolman)
+                except Exception:
+                    # An unexpected error would otherwise end the task, and Spoolman would never be probed again
+                    logger.exception("Spoolman health check failed")
+                await asyncio.sleep(self.get_interval())
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
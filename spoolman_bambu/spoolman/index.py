@@ -0,0 +1,175 @@
+"""Local SQLite index of which Spoolman spool and filament belong to which AMS tray.
+
+Spoolman only records a tray binding as the JSON encoded tag extra field on the spool, so finding the spool for a tray
+means downloading and scanning every spool. The index keeps tray_uuid -> spool, external_id -> filament and
+printer/slot -> tray_uuid in indexed tables, written alongside every Spoolman create/patch and reconciled with Spoolman
+on startup, so resolving a tray is a point query that survives restarts.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from spoolman_bambu import env
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool_binding (
+    tray_uuid TEXT PRIMARY KEY,
+    spool_id INTEGER NOT NULL,
+    filament_id INTEGER,
+    remaining_weight REAL
+);
+CREATE INDEX IF NOT EXISTS spool_binding_spool_id ON spool_binding (spool_id);
+CREATE TABLE IF NOT EXISTS filament (
+    external_id TEXT PRIMARY KEY,
+    filament_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tray_slot (
+    printer_id TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    tray_uuid TEXT NOT NULL,
+    PRIMARY KEY (printer_id, slot)
+);
+CREATE INDEX IF NOT EXISTS tray_slot_tray_uuid ON tray_slot (tray_uuid);
+"""
+
+
+def get_spool_tray_uuid(spool: dict, tag: str) -> Optional[str]:
+    """Get the tray uuid a spool is claimed by from its tag extra field, None if it is unclaimed."""
+    value = spool.get("extra", {}).get(tag)
+    if value is None:
+        return None
+    try:
+        tray_uuid = json.loads(value)
+    except (TypeError, ValueError):
+        return None
+    return tray_uuid if isinstance(tray_uuid, str) and tray_uuid != "" else None
+
+
+class SpoolIndex:
+    def __init__(self, path: Optional[Path]):
+        """
+        Opens, creating if needed, the index database.
+
+        :param path: Path of the SQLite database, None keeps the index in memory.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(":memory:" if path is None else str(path), check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            if path is not None:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def _bind_spool(self, spool: dict, tag: str) -> None:
+        tray_uuid = get_spool_tray_uuid(spool, tag)
+        # A spool can only be bound to one tray, so drop any binding it had to a different tray
+        self.connection.execute(
+            "DELETE FROM spool_binding WHERE spool_id = ? AND tray_uuid != ?", (spool["id"], tray_uuid or "")
+        )
+        if tray_uuid is None or spool.get("archived", False):
+            self.connection.execute("DELETE FROM spool_binding WHERE spool_id = ?", (spool["id"],))
+            return
+
+        filament = spool.get("filament") or {}
+        self.connection.execute(
+            """
+            INSERT INTO spool_binding (tray_uuid, spool_id, filament_id, remaining_weight) VALUES (?, ?, ?, ?)
+            ON CONFLICT (tray_uuid) DO UPDATE SET
+                spool_id = excluded.spool_id,
+                filament_id = excluded.filament_id,
+                remaining_weight = excluded.remaining_weight
+            """,
+            (tray_uuid, spool["id"], filament.get("id"), spool.get("remaining_weight")),
+        )
+        if filament.get("external_id"):
+            self._set_filament(filament["external_id"], filament["id"])
+
+    def _set_filament(self, external_id: str, filament_id: int) -> None:
+        self.connection.execute(
+            "INSERT INTO filament (external_id, filament_id) VALUES (?, ?) "
+            "ON CONFLICT (external_id) DO UPDATE SET filament_id = excluded.filament_id",
+            (external_id, filament_id),
+        )
+
+    def record_spool(self, spool: dict, tag: str) -> None:
+        """Record the binding of a spool returned by a Spoolman create/patch."""
+        with self.lock, self.connection:
+            self._bind_spool(spool, tag)
+
+    def remove_spool(self, spool_id: int) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM spool_binding WHERE spool_id = ?", (spool_id,))
+
+    def set_filament(self, external_id: str, filament_id: int) -> None:
+        with self.lock, self.connection:
+            self._set_filament(external_id, filament_id)
+
+    def set_tray_slot(self, printer_id: str, slot: str, tray_uuid: Optional[str]) -> None:
+        with self.lock, self.connection:
+            if tray_uuid is None or tray_uuid == "":
+                self.connection.execute("DELETE FROM tray_slot WHERE printer_id = ? AND slot = ?", (printer_id, slot))
+            else:
+                self.connection.execute(
+                    "INSERT INTO tray_slot (printer_id, slot, tray_uuid) VALUES (?, ?, ?) "
+                    "ON CONFLICT (printer_id, slot) DO UPDATE SET tray_uuid = excluded.tray_uuid "
+                    "WHERE tray_uuid != excluded.tray_uuid",
+                    (printer_id, slot, tray_uuid),
+                )
+
+    def reconcile(self, spools: list[dict], filaments: list[dict], tag: str) -> None:
+        """Replace the spool and filament tables with the current state of Spoolman in a single transaction."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM spool_binding")
+            self.connection.execute("DELETE FROM filament")
+            for filament in filaments:
+                if filament.get("external_id"):
+                    self._set_filament(filament["external_id"], filament["id"])
+            for spool in spools:
+                self._bind_spool(spool, tag)
+            count = self.connection.execute("SELECT COUNT(*) FROM spool_binding").fetchone()[0]
+        logger.info("Spoolman index reconciled, %s bound spools and %s filaments", count, len(filaments))
+
+    def get_binding(self, tray_uuid: str) -> Optional[dict]:
+        """Get the spool bound to a tray as a dict with tray_uuid, spool_id and remaining_weight."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT tray_uuid, spool_id, remaining_weight FROM spool_binding WHERE tray_uuid = ?", (tray_uuid,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_spool_tray_uuid(self, spool_id: int) -> Optional[str]:
+        """Get the tray a spool is bound to, None if it is unbound."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT tray_uuid FROM spool_binding WHERE spool_id = ?", (spool_id,)
+            ).fetchone()
+        return row["tray_uuid"] if row is not None else None
+
+    def get_filament_id(self, external_id: str) -> Optional[int]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT filament_id FROM filament WHERE external_id = ?", (external_id,)
+            ).fetchone()
+        return row["filament_id"] if row is not None else None
+
+    def get_tray_uuid(self, printer_id: str, slot: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT tray_uuid FROM tray_slot WHERE printer_id = ? AND slot = ?", (printer_id, slot)
+            ).fetchone()
+        return row["tray_uuid"] if row is not None else None
+
+
+def get_index_path() -> Path:
+    return env.get_settings().data_dir.joinpath("spoolman_index.sqlite")
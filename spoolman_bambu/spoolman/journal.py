@@ -0,0 +1,202 @@
+"""Durable journal of Spoolman writes that could not be sent, replayed once Spoolman is reachable again."""
+
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+from spoolman_bambu import env
+
+logger = logging.getLogger(__name__)
+
+OP_CREATE = "create"
+OP_PATCH = "patch"
+
+
+def merge_spool_data(current: dict, update: dict) -> dict:
+    """Merge a newer spool write into an older one, the newer values win except for first_used."""
+    merged = {**current, **update}
+    if "extra" in current and "extra" in update:
+        merged["extra"] = {**current["extra"], **update["extra"]}
+    if current.get("first_used"):
+        merged["first_used"] = current["first_used"]
+    return merged
+
+
+def compaction_key(entry: dict) -> Optional[tuple]:
+    """Get the key that pending writes for the same spool are compacted together on."""
+    if entry["op"] == OP_PATCH:
+        return (OP_PATCH, entry["spool_id"])
+    if entry["op"] == OP_CREATE:
+        # Spools which haven't been created yet are identified by the tray they were created for
+        extra = entry["data"].get("extra", {})
+        if len(extra) > 0:
+            return (OP_CREATE, json.dumps(extra, sort_keys=True))
+    return None
+
+
+def compact_entries(entries: list[dict]) -> list[dict]:
+    """Compact pending writes for the same spool into a single write, keeping the order of the first write."""
+    compacted = []
+    positions = {}
+    for entry in entries:
+        key = compaction_key(entry)
+        if key is not None and key in positions:
+            existing = compacted[positions[key]]
+            compacted[positions[key]] = {**existing, "data": merge_spool_data(existing["data"], entry["data"])}
+        else:
+            if key is not None:
+                positions[key] = len(compacted)
+            compacted.append(entry)
+    return compacted
+
+
+class WriteJournal:
+    """Append-only journal of pending Spoolman spool creates and patches.
+
+    Each write is appended to the journal file as a JSON line. The file is fsynced in batches, either once
+    `fsync_batch` writes are unsynced or `fsync_interval` seconds have passed since the last fsync, so a burst of
+    writes during an outage doesn't fsync on every line.
+
+    Replaying sends the writes without holding the lock, so writes keep being journaled meanwhile. They are not
+    compacted into the writes being replayed, which are then trimmed from the journal once they have been sent.
+    """
+
+    def __init__(self, path: Path, fsync_batch: int = 16, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        # Only one replay runs at a time
+        self.replay_lock = threading.Lock()
+        self.entries = []
+        # Number of entries at the start of the journal that are being replayed
+        self.replaying = 0
+        self.unsynced = 0
+        self.last_fsync = time.monotonic()
+        self.file = None
+
+        self.load()
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+
+        entries = []
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A torn write at the end of the file, everything before it is still valid
+                    logger.warning("Spoolman journal %s has a corrupt entry, ignoring it", self.path)
+        self.entries = compact_entries(entries)
+        if len(self.entries) > 0:
+            logger.info("Spoolman journal has %s pending writes to replay", len(self.entries))
+
+    def get_pending_count(self) -> int:
+        return len(self.entries)
+
+    def record_create(self, spool_data: dict) -> None:
+        self.append({"op": OP_CREATE, "spool_id": None, "data": spool_data})
+
+    def record_patch(self, spool_id: int, spool_data: dict) -> None:
+        self.append({"op": OP_PATCH, "spool_id": spool_id, "data": spool_data})
+
+    def append(self, entry: dict) -> None:
+        entry["time"] = datetime.datetime.now().isoformat()
+        with self.lock:
+            if self.file is None:
+                self.file = self.path.open("a", encoding="utf-8")
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= self.fsync_batch or time.monotonic() - self.last_fsync >= self.fsync_interval:
+                self._fsync()
+            # Entries being replayed are left as they are, so they can be trimmed once sent
+            self.entries = self.entries[: self.replaying] + compact_entries([*self.entries[self.replaying :], entry])
+
+    def flush(self) -> None:
+        """Fsync any unsynced writes, called on shutdown."""
+        with self.lock:
+            if self.file is not None and self.unsynced > 0:
+                self._fsync()
+
+    def _fsync(self) -> None:
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_fsync = time.monotonic()
+
+    def replay(self, spoolman) -> int:
+        """Send the pending writes to Spoolman in order, stopping at the first one Spoolman can't be reached for.
+
+        Returns:
+            int: The number of writes that were drained from the journal.
+
+        """
+        if not self.replay_lock.acquire(blocking=False):
+            logger.debug("Spoolman journal is already being replayed")
+            return 0
+        try:
+            # The writes are sent without holding the lock, so journaling other writes doesn't wait on Spoolman
+            with self.lock:
+                entries = list(self.entries)
+                self.replaying = len(entries)
+            if len(entries) == 0:
+                return 0
+
+            logger.info("Spoolman journal replaying %s pending writes...", len(entries))
+            drained = 0
+            try:
+                for entry in entries:
+                    try:
+                        if entry["op"] == OP_CREATE:
+                            result = spoolman.send_create_spool(entry["data"])
+                        else:
+                            result = spoolman.send_patch_spool(entry["spool_id"], entry["data"])
+                    except requests.exceptions.RequestException as e:
+                        logger.warning("Spoolman journal replay stopped, Spoolman is unavailable: %s", e)
+                        break
+
+                    if result is None:
+                        # Spoolman rejected the write, retrying it will never succeed
+                        logger.error("Spoolman journal dropping write that was rejected: %s", json.dumps(entry))
+                    drained += 1
+            finally:
+                with self.lock:
+                    # Writes journaled during the replay can now be compacted with those that weren't sent
+                    self.entries = compact_entries(self.entries[drained:])
+                    self.replaying = 0
+                    self._rewrite()
+                    pending = len(self.entries)
+        finally:
+            self.replay_lock.release()
+
+        logger.info("Spoolman journal replayed %s writes, %s still pending", drained, pending)
+        return drained
+
+    def _rewrite(self) -> None:
+        """Atomically replace the journal file with the remaining pending writes."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.unsynced = 0
+        self.last_fsync = time.monotonic()
+
+
+def get_journal_path() -> Path:
+    return env.get_settings().data_dir.joinpath("spoolman_journal.jsonl")
@@ -0,0 +1,53 @@
+"""Keyed single-writer locks for Spoolman mutations.
+
+Every printer processes its AMS reports on its own MQTT thread, so two printers seeing the same filament at the same
+moment could both claim the same unclaimed spool, or both create a new one. Writes for a tray are serialised on its
+tray uuid, and claims and creates of a filament on its external id, so unrelated trays still sync in parallel.
+
+To avoid deadlocks the tray lock is always taken before the filament lock, never the other way around.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedLock:
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        # key -> [lock, number of threads holding or waiting for it], dropped once nobody needs it
+        self.locks: dict = {}
+
+    @contextmanager
+    def hold(self, key):
+        """Hold the lock of a key, re-entrant so a thread already holding it can take it again."""
+        with self.lock:
+            entry = self.locks.get(key)
+            if entry is None:
+                entry = self.locks[key] = [threading.RLock(), 0]
+            entry[1] += 1
+
+        try:
+            if not entry[0].acquire(blocking=False):
+                logger.debug("Waiting for %s lock %s", self.name, key)
+                entry[0].acquire()
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.locks[key]
+
+    def get_held_count(self) -> int:
+        with self.lock:
+            return len(self.locks)
+
+
+tray_locks = KeyedLock("tray")
+filament_locks = KeyedLock("filament")
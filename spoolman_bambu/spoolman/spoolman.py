@@ -2,11 +2,33 @@ import requests
 import logging
 import datetime
 import json
-
-from spoolman_bambu import env, state
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from spoolman_bambu import env, events, state
+from spoolman_bambu.bambu.color_match import FilamentColorIndex
+from spoolman_bambu.exceptions import SpoolmanUnavailableError
+from spoolman_bambu.spoolman.cache import (
+    RESOURCE_FIELD,
+    RESOURCE_FILAMENT,
+    RESOURCE_SPOOL,
+    RESOURCE_VENDOR,
+    ResponseCache,
+)
+from spoolman_bambu.spoolman.index import SpoolIndex, get_index_path
+from spoolman_bambu.spoolman.journal import WriteJournal, get_journal_path
 
 logger = logging.getLogger(__name__)
 
+# Spool and filament lists are fetched in pages of this size, with the pages after the first fetched concurrently
+PAGE_SIZE = 100
+MAX_PAGE_WORKERS = 4
+
+# The external filament DB is read and parsed in chunks of this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class Spoolman:
     def __init__(self, timeout=5):
@@ -15,15 +37,40 @@ class Spoolman:
 
         :param timeout: Timeout in seconds for the request.
         """
-        self.base_url = f"http://{env.get_spoolman_ip()}:{env.get_spoolman_port()}"
+        settings = env.get_settings()
+        self.base_url = f"http://{settings.spoolman_ip}:{settings.spoolman_port}"
         self.timeout = timeout
         self.status = "disconnected"
         self.last_status_check = None
         self.external_bambu_spools = None
+        self.external_color_index = None
         self.vendor_id = None
+        # Writes that fail while Spoolman is unreachable are journaled and replayed once it is back
+        self.journal = WriteJournal(get_journal_path(), settings.journal_fsync_batch, settings.journal_fsync_interval)
+        # Local index of which spool is bound to which tray, kept in step with every write
+        self.index = SpoolIndex(get_index_path())
+        # Reads are served from here until they expire or we write to the resource
+        self.cache = ResponseCache(coalesce_window=settings.spoolman_coalesce_window)
+        # Cleared by the health monitor while Spoolman is unreachable, so writes go straight to the journal
+        self.sync_enabled = threading.Event()
+        self.sync_enabled.set()
 
         logger.info("Spoolman instance configured: %s %s", self.base_url, self.status)
 
+    def apply_settings(self, settings):
+        """Follow reloaded settings, the tag is only changed on restart so the bound spools stay bound."""
+        base_url = f"http://{settings.spoolman_ip}:{settings.spoolman_port}"
+        if base_url != self.base_url:
+            logger.info("Spoolman instance moved: %s -> %s", self.base_url, base_url)
+            self.base_url = base_url
+            # The same Spoolman reached at a new address keeps its ids, only the cached reads are fetched again
+            self.cache.invalidate(*self.cache.ttls)
+        self.cache.coalesce_window = settings.spoolman_coalesce_window
+        self.journal.fsync_batch = settings.journal_fsync_batch
+        self.journal.fsync_interval = settings.journal_fsync_interval
+        # Rebuilt with the new tolerance the next time it is needed
+        self.external_color_index = None
+
     def initialise(self):
         logger.info("Spoolman pre-flight checks starting...")
         # TODO: This is buggy when you have a new instance of Spoolman and it hasn't fetched the external DB
@@ -35,6 +82,29 @@ class Spoolman:
     def get_status(self):
         return self.status
 
+    def set_status(self, status):
+        self.status = status
+
+    def is_sync_paused(self):
+        return not self.sync_enabled.is_set()
+
+    def pause_sync(self):
+        logger.info("Spoolman sync paused, writes will be journaled until Spoolman is reachable")
+        self.sync_enabled.clear()
+
+    def resume_sync(self):
+        logger.info("Spoolman sync resumed")
+        self.sync_enabled.set()
+
+    def on_health_change(self, old_status, new_status):
+        """Pause the sync pipeline while Spoolman is unreachable and resume it once it is back."""
+        events.publish(events.EVENT_SPOOLMAN, {"old_status": old_status, "new_status": new_status})
+        if new_status == "disconnected":
+            self.pause_sync()
+        elif old_status in ("disconnected", "unknown"):
+            # The first probe resumes the sync too, whatever it was left as before the monitor started
+            self.resume_sync()
+
     def check_health(self):
         timestamp = datetime.datetime.now()
         """
@@ -52,9 +122,12 @@ class Spoolman:
 
                 status_message = "Healthy"
                 self.status = "connected"
-                logger.info("Spoolman instance health: %s %s", url, self.status)
+                logger.debug("Spoolman instance health: %s %s", url, self.status)
+                # Now Spoolman is reachable, send anything that was missed while it wasn't
+                self.journal.replay(self)
             else:
                 status_message = f"Unhealthy (Status Code: {response.status_code})"
+                self.status = "disconnected"
                 logger.error(
                     "Spoolman instance health: %s %s",
                     url,
@@ -62,125 +135,272 @@ class Spoolman:
                 )
 
         except requests.exceptions.RequestException as e:
+            self.set_last_status_check(timestamp)
+            self.status = "disconnected"
             return {"status_code": None, "response_time": None, "status_message": f"Error: {str(e)}"}
 
+    def get_cached(self, resource, url, params=None, paginated=False):
+        """GET a JSON resource through the response cache.
+
+        Expired entries are revalidated with a conditional request when Spoolman supplied an ETag or Last-Modified
+        header, paginated lists are simply refetched. Raises RequestException, returns None if Spoolman rejects it.
+        """
+        params = params or {}
+        key = (url, tuple(sorted(params.items())))
+        value, entry, generation = self.cache.lookup(resource, key)
+        if value is not None:
+            return value
+
+        # Concurrent misses, e.g. several AMS units reporting together, share a single request
+        return self.cache.coalesce(
+            resource,
+            key,
+            generation,
+            lambda: self.fetch_cached(resource, url, params, paginated, key, entry, generation),
+        )
+
+    def fetch_cached(self, resource, url, params, paginated, key, entry, generation):
+        """Fetch a resource missing from the cache, or revalidate its expired entry, and store it."""
+        if paginated:
+            items = self.get_pages(url, params)
+            return self.cache.store(resource, key, items, generation) if items is not None else None
+
+        headers = entry.get_validators() if entry is not None else {}
+        response = requests.get(url, params=params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and entry is not None:
+            value = self.cache.refresh(resource, key, entry, generation)
+            if value is not None:
+                return value
+            # Written to while revalidating, the invalidated entry is gone so this fetches it again in full
+            return self.get_cached(resource, url, params)
+        if response.status_code != 200:
+            logger.error("Spoolman %s: %s %s", resource, url, response.status_code)
+            return None
+        return self.cache.store(
+            resource,
+            key,
+            response.json(),
+            generation,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
     def get_vendors(self):
         url = f"{self.base_url}/api/v1/vendor"
         try:
-            response = requests.get(url, timeout=self.timeout)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error("Spoolman vendors: %s %s", url, response.status_code)
-
+            return self.get_cached(RESOURCE_VENDOR, url)
         except requests.exceptions.RequestException as e:
             return {"status_code": None, "status_message": f"Error: {str(e)}"}
 
     def get_fields(self, entity_type):
         url = f"{self.base_url}/api/v1/field/{entity_type}"
         try:
-            response = requests.get(url, timeout=self.timeout)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error("Spoolman field %s: %s %s", entity_type, url, response.status_code)
-
+            return self.get_cached(RESOURCE_FIELD, url)
         except requests.exceptions.RequestException as e:
             return {"status_code": None, "status_message": f"Error: {str(e)}"}
 
+    def get_pages(self, url, params):
+        """Get every item of a paginated Spoolman list, fetching the pages after the first concurrently.
+
+        The first page reports the total count in the x-total-count header, which gives the remaining page offsets.
+        The pages are sorted by id, so their boundaries are stable, and an item shifted onto the next page by a
+        concurrent create is only kept once. Raises RequestException if any page fails, returns None if Spoolman
+        rejects a request.
+        """
+        params = {**params, "sort": "id:asc"}
+        response = requests.get(url, params={**params, "limit": PAGE_SIZE, "offset": 0}, timeout=self.timeout)
+        if response.status_code != 200:
+            logger.error("Spoolman list: %s %s", url, response.status_code)
+            return None
+
+        items = response.json()
+        total = int(response.headers.get("x-total-count", len(items)))
+        offsets = range(PAGE_SIZE, total, PAGE_SIZE)
+        if len(offsets) == 0:
+            return items
+
+        def get_page(offset):
+            page = requests.get(url, params={**params, "limit": PAGE_SIZE, "offset": offset}, timeout=self.timeout)
+            page.raise_for_status()
+            return page.json()
+
+        # map keeps the pages in offset order, so the merged list is in the same order as a single request
+        seen = {item["id"] for item in items}
+        with ThreadPoolExecutor(max_workers=min(MAX_PAGE_WORKERS, len(offsets))) as executor:
+            for page in executor.map(get_page, offsets):
+                for item in page:
+                    if item["id"] not in seen:
+                        seen.add(item["id"])
+                        items.append(item)
+
+        logger.debug("Spoolman list: %s fetched %s items in %s pages", url, len(items), len(offsets) + 1)
+        return items
+
+    def get_spools_params(self):
+        # Only the active spools of Bambu Lab filaments are ever matched to trays
+        params = {"allow_archived": "false"}
+        if self.vendor_id is not None:
+            params["filament.vendor.id"] = self.vendor_id
+        return params
+
     def get_spools(self):
         url = f"{self.base_url}/api/v1/spool"
         try:
-            response = requests.get(url, timeout=self.timeout)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error("Spoolman spools: %s %s", url, response.status_code)
-
+            return self.get_cached(RESOURCE_SPOOL, url, self.get_spools_params(), paginated=True)
         except requests.exceptions.RequestException as e:
             return {"status_code": None, "status_message": f"Error: {str(e)}"}
 
+    def get_cached_spools(self):
+        """Get the active spools if a fresh list of them is cached, without making a request. None otherwise.
+
+        The list is shared with the cache, so it must not be modified.
+        """
+        key = (f"{self.base_url}/api/v1/spool", tuple(sorted(self.get_spools_params().items())))
+        return self.cache.peek(RESOURCE_SPOOL, key)
+
     def patch_spool(self, spool_id, spool_data):
+        # Queue behind any writes still waiting to be replayed so they land in order
+        if self.is_sync_paused() or self.journal.get_pending_count() > 0:
+            self.journal.record_patch(spool_id, spool_data)
+            raise SpoolmanUnavailableError("Spoolman sync is paused, patch journaled for replay")
+
+        try:
+            return self.send_patch_spool(spool_id, spool_data)
+        except requests.exceptions.RequestException as e:
+            logger.warning("Spoolman patch spool %s failed, journaled for replay: %s", spool_id, e)
+            self.journal.record_patch(spool_id, spool_data)
+            raise SpoolmanUnavailableError(f"Spoolman is unavailable: {str(e)}") from e
+
+    def send_patch_spool(self, spool_id, spool_data):
         url = f"{self.base_url}/api/v1/spool/{spool_id}"
         # logger.info("Patch spool %s: %s", spool_id, json.dumps(spool_data))
         try:
             response = requests.patch(url, json=spool_data, timeout=self.timeout)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error("Spoolman spools: %s %s %s", url, response.status_code, response.json())
-                return None
+        finally:
+            # Even a failed request may have been applied, so never serve the cached spools again
+            self.cache.invalidate(RESOURCE_SPOOL)
+        if response.status_code == 200:
+            spool = response.json()
+            self.update_index(spool)
+            return spool
+        else:
+            logger.error("Spoolman spools: %s %s %s", url, response.status_code, response.json())
+            return None
 
+    def create_spool(self, spool_data):
+        # Queue behind any writes still waiting to be replayed, this also stops a tray whose create is still
+        # pending from being created twice
+        if self.is_sync_paused() or self.journal.get_pending_count() > 0:
+            self.journal.record_create(spool_data)
+            raise SpoolmanUnavailableError("Spoolman sync is paused, create journaled for replay")
+
+        try:
+            return self.send_create_spool(spool_data)
         except requests.exceptions.RequestException as e:
-            return {"status_code": None, "status_message": f"Error: {str(e)}"}
+            logger.warning("Spoolman create spool failed, journaled for replay: %s", e)
+            self.journal.record_create(spool_data)
+            raise SpoolmanUnavailableError(f"Spoolman is unavailable: {str(e)}") from e
 
-    def create_spool(self, spool_data):
+    def send_create_spool(self, spool_data):
         url = f"{self.base_url}/api/v1/spool"
         logger.info("Create spool %s", json.dumps(spool_data))
         try:
             response = requests.post(url, json=spool_data, timeout=self.timeout)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error("Spoolman create spool: %s %s %s", url, response.status_code, response.json())
-                return None
+        finally:
+            self.cache.invalidate(RESOURCE_SPOOL)
+        if response.status_code == 200:
+            spool = response.json()
+            self.update_index(spool)
+            return spool
+        else:
+            logger.error("Spoolman create spool: %s %s %s", url, response.status_code, response.json())
+            return None
 
-        except requests.exceptions.RequestException as e:
-            return {"status_code": None, "status_message": f"Error: {str(e)}"}
+    def update_index(self, spool):
+        try:
+            self.index.record_spool(spool, env.get_settings().spoolman_tag_api)
+        except sqlite3.Error:
+            # The index is rebuilt from Spoolman on startup, so a failed write only costs a slower lookup
+            logger.exception("Spoolman index failed to record spool %s", spool.get("id"))
+
+    def reconcile_index(self, spools):
+        """Rebuild the local index from Spoolman, picking up any changes made while this service was not running."""
+        filaments = self.get_internal_filament()
+        if not isinstance(spools, list) or not isinstance(filaments, list):
+            logger.warning("Spoolman index not reconciled, spools and filaments could not be fetched")
+            return
+        self.index.reconcile(spools, filaments, env.get_settings().spoolman_tag_api)
 
     def get_internal_filament(self):
         url = f"{self.base_url}/api/v1/filament"
+        params = {}
+        if self.vendor_id is not None:
+            params["vendor.id"] = self.vendor_id
         try:
-            response = requests.get(url, timeout=self.timeout)
-            if response.status_code == 200:
-                logger.info("Spoolman filaments: %s %s", url, response.status_code)
-                return response.json()
-            else:
-                logger.error("Spoolman filaments: %s %s", url, response.status_code)
-
+            return self.get_cached(RESOURCE_FILAMENT, url, params, paginated=True)
         except requests.exceptions.RequestException as e:
             return {"status_code": None, "status_message": f"Error: {str(e)}"}
 
     def create_internal_filament(self, filament_data):
         url = f"{self.base_url}/api/v1/filament"
-        logger.info(f"Spoolman Creating Spoolman internal filament...")
+        logger.info("Spoolman Creating Spoolman internal filament...")
 
         try:
-            response = requests.post(url, json=filament_data, timeout=self.timeout)
+            try:
+                response = requests.post(url, json=filament_data, timeout=self.timeout)
+            finally:
+                self.cache.invalidate(RESOURCE_FILAMENT)
 
             if response.status_code == 200:
                 logger.info("Spoolman create internal filament: %s %s", url, response.status_code)
-                logger.info(f"Spoolman create internal filament: {response.json()}")
-                return response.json()
+                logger.debug("Spoolman create internal filament: %s", response.text)
+                filament = response.json()
+                if filament.get("external_id"):
+                    self.index.set_filament(filament["external_id"], filament["id"])
+                return filament
             else:
                 logger.error("Spoolman create internal filament: %s %s %s", url, response.status_code, response.json())
 
         except requests.exceptions.RequestException as e:
-            return {"status_code": None, "status_message": f"Error: {str(e)}"}
+            # The spool created for this filament needs its id, so this can't be journaled
+            raise SpoolmanUnavailableError(f"Spoolman is unavailable: {str(e)}") from e
 
     def get_external_filament(self):
         url = f"{self.base_url}/api/v1/external/filament"
         # If this is not cached go and fetch it
         if self.external_bambu_spools is None:
             try:
-                response = requests.get(url, timeout=self.timeout)
-                if response.status_code == 200:
-                    logger.info("Spoolman external filaments: %s %s", url, response.status_code)
-                    self.external_bambu_spools = cache_external_filaments(response.json())
-
-                    return self.external_bambu_spools
-                else:
-                    logger.error("Spoolman external filaments: %s %s", url, response.status_code)
-
-            except requests.exceptions.RequestException as e:
+                # The external DB holds every vendor's filaments, so stream it and keep only the Bambu Lab ones
+                # as they are parsed rather than loading the whole document
+                with requests.get(url, timeout=self.timeout, stream=True) as response:
+                    if response.status_code == 200:
+                        logger.info("Spoolman external filaments: %s %s", url, response.status_code)
+                        response.encoding = response.encoding or "utf-8"
+                        chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE, decode_unicode=True)
+                        self.external_bambu_spools = cache_external_filaments(iter_json_array(chunks))
+
+                        return self.external_bambu_spools
+                    else:
+                        logger.error("Spoolman external filaments: %s %s", url, response.status_code)
+
+            except (requests.exceptions.RequestException, ValueError) as e:
                 return {"status_code": None, "status_message": f"Error: {str(e)}"}
         # Otherwise just return the pre-filtered cache
         else:
             return self.external_bambu_spools
 
+    def get_external_color_index(self):
+        """Get the color index of the external Bambu Lab filaments, built once they have been fetched."""
+        external_filaments = self.get_external_filament()
+        if not isinstance(external_filaments, list):
+            return None
+        if self.external_color_index is None:
+            self.external_color_index = FilamentColorIndex(external_filaments, env.get_settings().color_match_tolerance)
+        return self.external_color_index
+
     def check_and_set_extra_field(self):
-        spoolmanCustomTag = env.get_spoolman_tag()
-        logger.info(f"Spoolman Check Spoolman extra field tag[{spoolmanCustomTag}] is present...")
+        spoolmanCustomTag = env.get_settings().spoolman_tag
+        logger.info("Spoolman Check Spoolman extra field tag[%s] is present...", spoolmanCustomTag)
 
         fields = self.get_fields("spool")
 
@@ -190,22 +410,27 @@ class Spoolman:
                 found = True
 
         if found != True:
-            logger.info(f"Spoolman extra field tag[{spoolmanCustomTag}] not found creating...")
+            logger.info("Spoolman extra field tag[%s] not found creating...", spoolmanCustomTag)
             self.create_extra_field()
         else:
-            logger.info(f"Spoolman extra field tag[{spoolmanCustomTag}] is found continue")
+            logger.info("Spoolman extra field tag[%s] is found continue", spoolmanCustomTag)
 
     def create_extra_field(self):
-        spoolmanCustomTag = env.get_spoolman_tag()
+        spoolmanCustomTag = env.get_settings().spoolman_tag
         url = f"{self.base_url}/api/v1/field/spool/tag"
-        logger.info(f"Spoolman Creating Spoolman extra field tag[{spoolmanCustomTag}] ...")
+        logger.info("Spoolman Creating Spoolman extra field tag[%s] ...", spoolmanCustomTag)
 
         try:
-            response = requests.post(url, json={"name": spoolmanCustomTag, "field_type": "text"}, timeout=self.timeout)
+            try:
+                response = requests.post(
+                    url, json={"name": spoolmanCustomTag, "field_type": "text"}, timeout=self.timeout
+                )
+            finally:
+                self.cache.invalidate(RESOURCE_FIELD)
 
             if response.status_code == 200:
                 logger.info("Spoolman extra tag: %s %s", url, response.status_code)
-                logger.info(f"Spoolman extra field tag: {spoolmanCustomTag} successfully created")
+                logger.info("Spoolman extra field tag: %s successfully created", spoolmanCustomTag)
                 return response.json()
             else:
                 logger.error("Spoolman extra tag: %s %s %s", url, response.status_code, response.json())
@@ -233,11 +458,14 @@ class Spoolman:
     def create_vendor(self):
         url = f"{self.base_url}/api/v1/vendor"
         try:
-            response = requests.post(
-                url,
-                json={"name": "Bambu Lab", "external_id": "Bambu Lab", "empty_spool_weight": 250},
-                timeout=self.timeout,
-            )
+            try:
+                response = requests.post(
+                    url,
+                    json={"name": "Bambu Lab", "external_id": "Bambu Lab", "empty_spool_weight": 250},
+                    timeout=self.timeout,
+                )
+            finally:
+                self.cache.invalidate(RESOURCE_VENDOR)
 
             if response.status_code == 200:
                 logger.info("Spoolman create vendor: %s %s", url, response.status_code)
@@ -255,6 +483,51 @@ class Spoolman:
         self.last_status_check = timestamp
 
 
+def iter_json_array(chunks):
+    """Incrementally parse a JSON array from text chunks, yielding each element as soon as it has been read.
+
+    Only the element currently being read is held in memory, never the whole document.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    finished = False
+    for chunk in chunks:
+        buffer += chunk
+        position = 0
+        while True:
+            # Skip the whitespace and commas between elements
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                finished = True
+                break
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element continues in the next chunk
+                break
+            if end == len(buffer) and not isinstance(element, (dict, list)):
+                # A number at the end of the chunk may continue in the next chunk
+                break
+            yield element
+            position = end
+        if finished:
+            return
+        buffer = buffer[position:]
+
+    if not finished:
+        raise ValueError("JSON array is truncated")
+
+
 def cache_external_filaments(filaments, prefix="bambulab_"):
     bambu_filaments = []
     for filament in filaments:
@@ -14,7 +14,16 @@ class StateTracker:
 
         self._spoolman = None
         self._printers = []
+        # printer serial -> the id the API addresses it by
+        self._printer_numbers = {}
         self._spools = None
+        self._health_monitor = None
+        self._history = None
+        self._analytics = None
+        self._job_ledger = None
+        self._inventory = None
+        self._alerts = None
+        self._alert_delivery = None
 
         logger.info("State instance configured")
 
@@ -27,14 +36,81 @@ class StateTracker:
         else:
             return self._spoolman
 
-    def add_printer(self, printer):
-        # Check if already exists, if so update, else append
-        if printer in self._printers:
-            for i, item in enumerate(self._printers):
-                if item == printer:
-                    mylist[i] = printer
-        else:
-            self._printers.append(printer)
+    def set_health_monitor(self, health_monitor):
+        self._health_monitor = health_monitor
+
+    def get_health_monitor(self):
+        return self._health_monitor
+
+    def set_history(self, history):
+        self._history = history
+
+    def get_history(self):
+        return self._history
+
+    def set_analytics(self, analytics):
+        self._analytics = analytics
+
+    def get_analytics(self):
+        return self._analytics
+
+    def set_job_ledger(self, job_ledger):
+        self._job_ledger = job_ledger
+
+    def get_job_ledger(self):
+        return self._job_ledger
+
+    def set_inventory(self, inventory):
+        self._inventory = inventory
+
+    def get_inventory(self):
+        return self._inventory
+
+    def set_alerts(self, alerts):
+        self._alerts = alerts
+
+    def get_alerts(self):
+        return self._alerts
+
+    def set_alert_delivery(self, alert_delivery):
+        self._alert_delivery = alert_delivery
+
+    def get_alert_delivery(self):
+        return self._alert_delivery
+
+    def add_printer(self, printer, number=None):
+        # A replaced printer keeps its id, a printer without one gets the next id
+        if number is None:
+            number = self._printer_numbers.get(printer.get_printer_id())
+        if number is None:
+            number = max(self._printer_numbers.values(), default=0) + 1
+        self._printer_numbers[printer.get_printer_id()] = number
+
+        # Check if already exists, if so update in place so its index doesn't change, else append
+        for i, item in enumerate(self._printers):
+            if item.get_printer_id() == printer.get_printer_id():
+                self._printers[i] = printer
+                return
+        self._printers.append(printer)
+
+    def remove_printer(self, printer_id):
+        self._printers = [item for item in self._printers if item.get_printer_id() != printer_id]
+        self._printer_numbers.pop(printer_id, None)
+
+    def get_printer(self, printer_id):
+        for item in self._printers:
+            if item.get_printer_id() == printer_id:
+                return item
+        return None
+
+    def get_printer_number(self, printer_id):
+        return self._printer_numbers.get(printer_id)
+
+    def get_printer_by_number(self, number):
+        for item in self._printers:
+            if self._printer_numbers.get(item.get_printer_id()) == number:
+                return item
+        return None
 
     def get_printers(self):
         return self._printers
@@ -1,36 +1,49 @@
+import asyncio
 import logging
 import datetime
-import os
 
 from scheduler.asyncio.scheduler import Scheduler
 
-from spoolman_bambu import state
+from spoolman_bambu import env, state
+from spoolman_bambu.bambu import reconcile
+from spoolman_bambu.exceptions import SpoolmanUnavailableError
+from spoolman_bambu.spoolman.health import HealthMonitor
 
 logger = logging.getLogger(__name__)
 
-DEFAULT_SYNC_INTERVAL = 3600
+# How often the printers' pushall schedules are checked, each printer adds its own jitter
+PUSHALL_TICK_INTERVAL = 1
+# How often disconnected printers are checked against the offline alert
+OFFLINE_CHECK_INTERVAL = 30
 
 app_state = state.get_current_state()
 
 
-# TODO: Move this to env class
-def get_spoolman_sync_interval() -> int:
-    """Get the external database sync interval from environment variables. Defaults to DEFAULT_SYNC_INTERVAL."""
-    return int(os.getenv("SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_INTERVAL", DEFAULT_SYNC_INTERVAL))
-
-
 async def _sync_spoolman() -> None:
-    logger.info("Task: Syncing Spoolman health check connection...")
+    logger.info("Task: Starting Spoolman health monitor...")
 
-    app_state.get_spoolman().check_health()
+    spoolman = app_state.get_spoolman()
+    settings = env.get_settings()
+    monitor = HealthMonitor(
+        spoolman,
+        healthy_interval=settings.spoolman_healthcheck_interval,
+        degraded_interval=settings.spoolman_degraded_healthcheck_interval,
+        max_degraded_interval=settings.spoolman_max_degraded_healthcheck_interval,
+        timeout=spoolman.timeout,
+    )
+    # Pause the sync pipeline while Spoolman is unreachable
+    monitor.add_listener(spoolman.on_health_change)
+    app_state.set_health_monitor(monitor)
+    monitor.start()
 
-    # filaments = _parse_filaments_from_bytes(await _download_file(url + "filaments.json"))
-    # materials = _parse_materials_from_bytes(await _download_file(url + "materials.json"))
+    logger.info("Task: Spoolman health monitor started")
 
-    # _write_to_local_cache("filaments.json", filaments.json().encode())
-    # _write_to_local_cache("materials.json", materials.json().encode())
 
-    logger.info("Task: Spoolman health check connection synced")
+async def _replay_journal() -> None:
+    spoolman = app_state.get_spoolman()
+    if spoolman.journal.get_pending_count() > 0:
+        # Replaying uses the blocking client, so keep it off the event loop
+        await asyncio.to_thread(spoolman.journal.replay, spoolman)
 
 
 def spoolman_schedule_tasks(scheduler: Scheduler) -> None:
@@ -40,17 +53,61 @@ def spoolman_schedule_tasks(scheduler: Scheduler) -> None:
         scheduler: The scheduler to use for scheduling tasks.
 
     """
-    schedule_interval = get_spoolman_sync_interval()
-    logger.info(f"Task: Scheduling Spoolman health check every {schedule_interval} seconds.")
-
-    # Run once on startup
+    schedule_interval = env.get_settings().spoolman_healthcheck_interval
+    if schedule_interval <= 0:
+        logger.info("Task: Sync interval is 0, skipping periodic sync of Spoolman health.")
+        # Without the monitor nothing else replays the journal, and every write would be journaled behind it forever
+        replay_interval = env.get_settings().spoolman_degraded_healthcheck_interval
+        logger.info("Task: Scheduling replay of journaled Spoolman writes every %s seconds.", replay_interval)
+        scheduler.cyclic(datetime.timedelta(seconds=replay_interval), _replay_journal)  # type: ignore[arg-type]
+        return
+
+    logger.info(
+        "Task: Scheduling Spoolman health check every %s seconds, every %s seconds while degraded.",
+        schedule_interval,
+        env.get_settings().spoolman_degraded_healthcheck_interval,
+    )
+
+    # The monitor schedules its own probes, adapting the interval to Spoolman's health
     scheduler.once(datetime.timedelta(seconds=0), _sync_spoolman)  # type: ignore[arg-type]
 
-    sync_interval = schedule_interval
-    if sync_interval > 0:
-        scheduler.cyclic(datetime.timedelta(seconds=sync_interval), _sync_spoolman)  # type: ignore[arg-type]
-    else:
-        logger.info("Task: Sync interval is 0, skipping periodic sync of Spoolman health.")
+
+async def _reconcile_printers() -> None:
+    logger.info("Task: Reconciling printer trays with Spoolman...")
+
+    try:
+        # Blocks on Spoolman requests, so keep it off the event loop
+        result = await asyncio.to_thread(reconcile.reconcile)
+    except SpoolmanUnavailableError as e:
+        logger.info("Task: Reconcile skipped, %s", e)
+        return
+
+    logger.info(
+        "Task: Reconcile complete, %s applied, %s failed, %s unmatched trays",
+        result["applied"],
+        len(result["failed"]),
+        len(result["plan"]["unmatched"]),
+    )
+
+
+async def _request_pushall() -> None:
+    for printer in app_state.get_printers():
+        printer.get_pushall().tick()
+
+
+async def _check_offline_printers(started: datetime.datetime) -> None:
+    alerts = app_state.get_alerts()
+    if alerts is None:
+        return
+
+    now = datetime.datetime.now()
+    for printer in app_state.get_printers():
+        offline_seconds = None
+        if printer.get_status() != "connected":
+            # A printer that hasn't reported since startup has been offline since then
+            last_message = printer.get_last_mqtt_message() or started
+            offline_seconds = (now - last_message).total_seconds()
+        alerts.evaluate_offline(printer.get_printer_id(), offline_seconds)
 
 
 def printer_schedule_tasks(scheduler: Scheduler) -> None:
@@ -60,3 +117,19 @@ def printer_schedule_tasks(scheduler: Scheduler) -> None:
         scheduler: The scheduler to use for scheduling tasks.
 
     """
+    # Publishing only queues the request on the printer's MQTT thread, so it is cheap to check often
+    scheduler.cyclic(datetime.timedelta(seconds=PUSHALL_TICK_INTERVAL), _request_pushall)  # type: ignore[arg-type]
+    # The offline alert depends on the time rather than a reported value, so it is the one rule checked periodically
+    scheduler.cyclic(
+        datetime.timedelta(seconds=OFFLINE_CHECK_INTERVAL),
+        _check_offline_printers,  # type: ignore[arg-type]
+        args=(datetime.datetime.now(),),
+    )
+
+    schedule_interval = env.get_settings().reconcile_interval
+    if schedule_interval <= 0:
+        logger.info("Task: Reconcile interval is 0, skipping periodic reconciliation of printer trays.")
+        return
+
+    logger.info("Task: Scheduling reconciliation of printer trays every %s seconds.", schedule_interval)
+    scheduler.cyclic(datetime.timedelta(seconds=schedule_interval), _reconcile_printers)  # type: ignore[arg-type]
@@ -0,0 +1,50 @@
+import asyncio
+import json
+import os
+import pytest
+import logging
+
+import httpx
+
+from spoolman_bambu.alerts.delivery import WebhookDelivery, deduplicate
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_deduplicate() -> None:
+    """
+    Test deduplicate keeps the latest alert of each key
+    :return: None
+    """
+    alerts = [{"key": "a", "state": "firing"}, {"key": "b", "state": "firing"}, {"key": "a", "state": "resolved"}]
+    assert deduplicate(alerts) == [{"key": "b", "state": "firing"}, {"key": "a", "state": "resolved"}]
+
+
+def test_delivery_batches_and_retries() -> None:
+    """
+    Test WebhookDelivery posts queued alerts in one batch and retries a failed post
+    :return: None
+    """
+    posts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        posts.append(request)
+        return httpx.Response(503 if len(posts) == 1 else 200)
+
+    async def deliver():
+        delivery = WebhookDelivery(
+            ["http://webhook"], batch_wait=0.05, retry_delay=0, transport=httpx.MockTransport(handler)
+        )
+        delivery.start()
+        for key in ("a", "b", "a"):
+            delivery.enqueue({"key": key})
+        while delivery.get_stats()["sent"] == 0:
+            await asyncio.sleep(0.01)
+        delivery.stop()
+        return delivery.get_stats()
+
+    stats = asyncio.run(asyncio.wait_for(deliver(), 5))
+    assert len(posts) == 2
+    assert json.loads(posts[1].content) == {"alerts": [{"key": "b"}, {"key": "a"}]}
+    assert (stats["queued"], stats["sent"], stats["failed"], stats["pending"]) == (3, 2, 0, 0)
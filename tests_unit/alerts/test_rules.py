@@ -0,0 +1,88 @@
+import logging
+
+from spoolman_bambu.alerts.rules import AlertEngine, AlertRules
+from spoolman_bambu.bambu.models import AmsUnit
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_low_stock_fires_once_with_hysteresis(make_tray) -> None:
+    """
+    Test the low stock rule only emits when it starts firing and resolves once back past the hysteresis margin
+    :return: None
+    """
+    emitted = []
+    engine = AlertEngine(AlertRules(low_stock_grams=100), emit=emitted.append)
+
+    assert engine.evaluate_tray("X1", make_tray(remain=50)) == ["PLA"]
+    engine.evaluate_tray("X1", make_tray(remain=10))
+    engine.evaluate_tray("X1", make_tray(remain=9))
+    assert [alert["state"] for alert in emitted] == ["firing"]
+    assert engine.get_firing()[0]["value"] == 90.0
+
+    # Within the hysteresis margin it keeps firing
+    engine.evaluate_tray("X1", make_tray(remain=11))
+    assert len(emitted) == 1
+
+    engine.evaluate_tray("X1", make_tray(remain=12))
+    assert [alert["state"] for alert in emitted] == ["firing", "resolved"]
+    assert engine.get_firing() == []
+
+
+def test_material_and_swapped_tray(make_tray) -> None:
+    """
+    Test evaluate_tray returns the previous material of a swapped tray and the material rule uses the fleet total
+    :return: None
+    """
+    emitted = []
+    engine = AlertEngine(AlertRules(material_low_stock_grams=500), emit=emitted.append)
+
+    engine.evaluate_tray("X1", make_tray(remain=50))
+    assert engine.evaluate_tray("X1", make_tray(remain=50, tray_type="PETG", tray_uuid="UUID1")) == ["PLA", "PETG"]
+
+    engine.evaluate_material("PLA", 0)
+    engine.evaluate_material("PETG", 500)
+    assert sorted(alert["key"] for alert in emitted) == ["material_low_stock:PETG", "material_low_stock:PLA"]
+
+
+def test_humidity_and_offline() -> None:
+    """
+    Test the humidity and offline rules fire above their limits and offline resolves when the printer reconnects
+    :return: None
+    """
+    emitted = []
+    engine = AlertEngine(AlertRules(humidity=4, offline_minutes=10), emit=emitted.append)
+
+    engine.evaluate_ams("X1", AmsUnit.from_report({"id": "0", "humidity": "5"}))
+    engine.evaluate_offline("X1", 300)
+    engine.evaluate_offline("X2", 900)
+    assert [alert["key"] for alert in engine.get_firing()] == ["humidity:X1:A", "offline:X2"]
+
+    engine.evaluate_offline("X2", None)
+    assert emitted[-1]["key"] == "offline:X2"
+    assert emitted[-1]["state"] == "resolved"
+
+    engine.remove_printer("X1")
+    assert engine.get_firing() == []
+
+
+def test_removed_ams_unit_resolves_alerts(make_tray) -> None:
+    """
+    Test removing the trays and AMS unit of a disconnected unit resolves their alerts and forgets the tray material
+    :return: None
+    """
+    emitted = []
+    engine = AlertEngine(AlertRules(low_stock_grams=100, humidity=4), emit=emitted.append)
+    engine.evaluate_tray("X1", make_tray(remain=5))
+    engine.evaluate_ams("X1", AmsUnit.from_report({"id": "0", "humidity": "5"}))
+    assert len(engine.get_firing()) == 2
+
+    assert engine.remove_tray("X1", "A0") == ["PLA"]
+    assert engine.remove_tray("X1", "A0") == []
+    engine.remove_ams("X1", "A")
+    assert engine.get_firing() == []
+    assert [(alert["key"], alert["state"]) for alert in emitted[2:]] == [
+        ("low_stock:X1:A0", "resolved"),
+        ("humidity:X1:A", "resolved"),
+    ]
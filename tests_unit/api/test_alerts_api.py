@@ -0,0 +1,38 @@
+import logging
+
+from spoolman_bambu import state
+from spoolman_bambu.alerts.delivery import WebhookDelivery
+from spoolman_bambu.alerts.rules import AlertEngine, AlertRules
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_alerts_firing(add_printer, client, make_tray, monkeypatch) -> None:
+    """
+    Test the alerts route lists the firing alerts and delivery counts, and removing a printer resolves its alerts
+    :return: None
+    """
+    assert client.get("/alerts").status_code == 404
+
+    app_state = state.get_current_state()
+    engine = AlertEngine(AlertRules(low_stock_grams=100, offline_minutes=10))
+    monkeypatch.setattr(app_state, "_alerts", engine)
+    monkeypatch.setattr(app_state, "_alert_delivery", WebhookDelivery([]))
+    add_printer("X1")
+    engine.evaluate_tray("X1", make_tray("A0", remain=5))
+    engine.evaluate_offline("X2", 900)
+
+    response = client.get("/alerts")
+    assert response.status_code == 200
+    firing = response.json()["firing"]
+    assert [(alert["key"], alert["state"], alert.get("slot")) for alert in firing] == [
+        ("low_stock:X1:A0", "firing", "A0"),
+        ("offline:X2", "firing", None),
+    ]
+    assert firing[0]["value"] == 50.0
+    assert firing[0]["since"].endswith("Z")
+    assert response.json()["delivery"] == {"queued": 0, "sent": 0, "dropped": 0, "failed": 0, "pending": 0}
+
+    client.delete("/printer/1")
+    assert [alert["key"] for alert in client.get("/alerts").json()["firing"]] == ["offline:X2"]
@@ -0,0 +1,71 @@
+import json
+import logging
+
+import pytest
+from starlette.requests import Request
+
+from spoolman_bambu.events import EventRing
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+@pytest.fixture
+def event_ring(client, monkeypatch) -> EventRing:
+    """Stream from a fresh event ring, with the client disconnecting once it has been sent the first events."""
+    ring = EventRing(capacity=3)
+    monkeypatch.setattr("spoolman_bambu.api.v1.events.event_ring", ring)
+
+    async def is_disconnected(self) -> bool:
+        return True
+
+    monkeypatch.setattr(Request, "is_disconnected", is_disconnected)
+    return ring
+
+
+def read_events(response) -> list[dict]:
+    events = []
+    for message in response.text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append({**fields, "data": json.loads(fields["data"])})
+    return events
+
+
+def test_events_snapshot(event_ring, add_printer, client) -> None:
+    """
+    Test a new client is sent a snapshot of every printer and its trays, with the id to resume from
+    :return: None
+    """
+    tray = {"id": "0", "tray_uuid": "UUID0", "tray_type": "PLA", "tray_color": "FF0000FF", "remain": 50}
+    add_printer("X1", [{"id": "0", "tray": [tray]}])
+    event_ring.publish("printer", {"printer_id": "X1", "status": "connected"})
+
+    response = client.get("/events")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("retry: 3000\n\n")
+    [snapshot] = read_events(response)
+    assert (snapshot["id"], snapshot["event"]) == (event_ring.format_id(1), "snapshot")
+    assert [printer["printer_id"] for printer in snapshot["data"]["printers"]] == ["X1"]
+    assert [tray["slot"] for tray in snapshot["data"]["printers"][0]["ams"]["trays"]] == ["A0"]
+
+
+def test_events_resume(event_ring, client) -> None:
+    """
+    Test a client reconnecting with Last-Event-ID is sent the events it missed, and a snapshot when they have been
+    dropped or the id is from before a restart
+    :return: None
+    """
+    for index in range(4):
+        event_ring.publish("ams", {"index": index})
+
+    events = read_events(client.get("/events", headers={"Last-Event-ID": event_ring.format_id(2)}))
+    assert [(event["id"], event["event"]) for event in events] == [
+        (event_ring.format_id(3), "ams"),
+        (event_ring.format_id(4), "ams"),
+    ]
+    assert [event["data"]["index"] for event in events] == [2, 3]
+
+    for last_event_id in (event_ring.format_id(0), "1-2", "2"):
+        events = read_events(client.get("/events", headers={"Last-Event-ID": last_event_id}))
+        assert [(event["id"], event["event"]) for event in events] == [(event_ring.format_id(4), "snapshot")]
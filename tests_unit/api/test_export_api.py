@@ -0,0 +1,52 @@
+import csv
+import io
+import json
+import logging
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_export_printers_and_trays(add_printer, client) -> None:
+    """
+    Test the printers and trays are exported as CSV and NDJSON attachments
+    :return: None
+    """
+    tray = {"id": "0", "tray_uuid": "UUID0", "tray_type": "PLA", "tray_color": "FF0000FF", "remain": 50}
+    add_printer("X1", [{"id": "0", "tray": [tray, {**tray, "id": "1", "tray_uuid": "UUID1"}]}])
+    add_printer("X2")
+
+    response = client.get("/export/printers")
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"].startswith('attachment; filename="printers-')
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["printer_id"], row["ams_active_spools_count"]) for row in rows] == [("X1", "2"), ("X2", "0")]
+
+    response = client.get("/export/trays", params={"format": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["content-disposition"].endswith('.ndjson"')
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["printer_id"], row["slot"], row["tray_uuid"]) for row in rows] == [
+        ("X1", "A0", "UUID0"),
+        ("X1", "A1", "UUID1"),
+    ]
+
+    assert client.get("/export/trays", params={"format": "xml"}).status_code == 422
+
+
+def test_export_spools(spoolman, client) -> None:
+    """
+    Test the spools are exported with the tray each is claimed by, and 503 is returned without Spoolman spools
+    :return: None
+    """
+    spoolman.add_spool(10, "bambulab_pla_basic_red", "UUID0")
+    spoolman.add_spool(11, "bambulab_pla_basic_black")
+
+    rows = list(csv.DictReader(io.StringIO(client.get("/export/spools").text)))
+    assert [(row["id"], row["external_id"], row["tray_uuid"]) for row in rows] == [
+        ("10", "bambulab_pla_basic_red", "UUID0"),
+        ("11", "bambulab_pla_basic_black", ""),
+    ]
+
+    spoolman.get_spools = lambda: {"message": "Spoolman unavailable"}
+    assert client.get("/export/spools").status_code == 503
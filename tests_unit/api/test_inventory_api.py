@@ -0,0 +1,32 @@
+import logging
+
+from spoolman_bambu import state
+from spoolman_bambu.bambu.inventory import Inventory
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_inventory_etag(client, make_tray, monkeypatch) -> None:
+    """
+    Test the inventory route returns 304 for the current ETag and a new ETag once a tray changes
+    :return: None
+    """
+    assert client.get("/inventory").status_code == 404
+
+    inventory = Inventory()
+    monkeypatch.setattr(state.get_current_state(), "_inventory", inventory)
+    inventory.update_tray("X1", make_tray("A0", remain=50))
+
+    response = client.get("/inventory")
+    assert response.status_code == 200
+    assert response.json()["remaining_weight"] == 500.0
+    etag = response.headers["ETag"]
+    response = client.get("/inventory", headers={"If-None-Match": etag})
+    assert (response.status_code, response.headers["ETag"], response.content) == (304, etag, b"")
+
+    inventory.update_tray("X1", make_tray("A0", remain=40))
+    response = client.get("/inventory", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [(group["key"], group["remaining_weight"]) for group in response.json()["materials"]] == [("PLA", 400.0)]
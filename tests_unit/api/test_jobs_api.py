@@ -0,0 +1,49 @@
+import logging
+
+from spoolman_bambu import state
+from spoolman_bambu.bambu.jobs import JobLedger
+from spoolman_bambu.bambu.models import Printer
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def make_ams_unit(remain) -> dict:
+    tray = {"id": "0", "tray_uuid": "UUID0", "tray_type": "PLA", "remain": remain, "tray_weight": "1000"}
+    return {"id": "0", "tray": [tray]}
+
+
+def test_jobs_active_and_usage(add_printer, client, data_dir, monkeypatch) -> None:
+    """
+    Test the jobs routes return the filament the running job has used, then its ledger records once it ends
+    :return: None
+    """
+    assert client.get("/jobs").status_code == 404
+
+    ledger = JobLedger(data_dir.joinpath("job_ledger.ndjson"))
+    monkeypatch.setattr(state.get_current_state(), "_job_ledger", ledger)
+    printer = add_printer("X1", [make_ams_unit(80)])
+    tracker = printer.get_job_tracker()
+    tracker.ledger = ledger
+
+    tracker.update({"gcode_state": "IDLE"}, printer.get_printer_state(), 0)
+    assert client.get("/jobs/active").json() == []
+
+    report = {"gcode_state": "RUNNING", "task_id": "100", "subtask_name": "Benchy", "ams": {"tray_now": "0"}}
+    tracker.update(report, None, 10)
+    tracker.update({"mc_percent": 50}, Printer.from_report("X1", [make_ams_unit(75)]), 20)
+    [job] = client.get("/jobs/active").json()
+    assert (job["job_id"], job["name"], job["progress"], job["active_slot"], job["grams"]) == (
+        "100",
+        "Benchy",
+        50,
+        "A0",
+        50.0,
+    )
+
+    tracker.update({"gcode_state": "FINISH"}, Printer.from_report("X1", [make_ams_unit(70)]), 30)
+    assert client.get("/jobs/active").json() == []
+    [record] = client.get("/jobs").json()
+    assert (record["job_id"], record["state"], record["slot"], record["grams"]) == ("100", "FINISH", "A0", 100.0)
+    assert client.get("/jobs", params={"printer_id": "X2"}).json() == []
+    assert client.get("/jobs", params={"limit": 0}).status_code == 422
@@ -0,0 +1,110 @@
+import logging
+
+import pytest
+
+from spoolman_bambu import state
+from spoolman_bambu.bambu.fleet import load_printer_configs
+from spoolman_bambu.api.v1 import printer as printer_api
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+PRINTER = {"printer_id": "X1", "printer_ip": "192.168.1.4", "printer_code": "AAAA"}
+
+
+def test_add_update_remove_printer(client) -> None:
+    """
+    Test printers added, updated and removed through the API are persisted and keep their id
+    :return: None
+    """
+    response = client.post("/printer", json=PRINTER)
+    assert response.status_code == 200
+    assert (response.json()["id"], response.json()["printer_id"]) == (1, "X1")
+    assert client.post("/printer", json=PRINTER).status_code == 409
+
+    response = client.get("/printer")
+    assert response.headers["x-total-count"] == "1"
+    assert [printer["printer_ip"] for printer in response.json()] == ["192.168.1.4"]
+
+    current = state.get_current_state().get_printer("X1")
+    response = client.patch("/printer/1", json={"printer_ip": "192.168.1.10"})
+    assert response.status_code == 200
+    assert (response.json()["id"], response.json()["printer_ip"]) == (1, "192.168.1.10")
+    assert current.stopped
+    # The access code is kept when only the IP address changes
+    assert state.get_current_state().get_printer("X1").get_printer_code() == "AAAA"
+    assert [config.printer_ip for config in load_printer_configs()] == ["192.168.1.10"]
+
+    response = client.delete("/printer/1")
+    assert response.json() == {"message": "Success!"}
+    assert client.get("/printer/1").status_code == 404
+    assert load_printer_configs() == []
+
+    # Ids aren't reused for a different printer
+    response = client.post("/printer", json={**PRINTER, "printer_id": "X2"})
+    assert response.json()["id"] == 2
+
+
+def test_failed_printer_update_keeps_printer(client, monkeypatch) -> None:
+    """
+    Test a printer whose replacement fails to be created is reconnected with its previous configuration
+    :return: None
+    """
+    client.post("/printer", json=PRINTER)
+    current = state.get_current_state().get_printer("X1")
+    create_printer = printer_api.Bambu
+    connected = []
+
+    def connect(printer_id, printer_ip, printer_code):
+        # The running printer has stopped before its replacement connects with the same MQTT client id
+        assert current.stopped
+        if printer_ip == "192.168.1.10":
+            raise ConnectionError("Printer unreachable")
+        connected.append(printer_ip)
+        return create_printer(printer_id, printer_ip, printer_code)
+
+    monkeypatch.setattr("spoolman_bambu.api.v1.printer.Bambu", connect)
+    with pytest.raises(ConnectionError):
+        client.patch("/printer/1", json={"printer_ip": "192.168.1.10"})
+
+    assert connected == ["192.168.1.4"]
+    assert not state.get_current_state().get_printer("X1").stopped
+    assert client.get("/printer/1").json()["printer_ip"] == "192.168.1.4"
+    assert [config.printer_ip for config in load_printer_configs()] == ["192.168.1.4"]
+
+
+def test_unknown_printer(client) -> None:
+    """
+    Test the printer routes return 404 for an id no printer has
+    :return: None
+    """
+    assert client.get("/printer/7").status_code == 404
+    assert client.patch("/printer/7", json={"printer_ip": "192.168.1.10"}).status_code == 404
+    assert client.delete("/printer/7").status_code == 404
+
+
+def test_printer_ams_since(add_printer, client) -> None:
+    """
+    Test the AMS route returns every tray, then only those changed since a version, and every tray for a version
+    from before a restart
+    :return: None
+    """
+    tray_report = {"id": "0", "tray_uuid": "UUID0", "tray_type": "PLA", "tray_color": "FF0000FF", "remain": 50}
+    printer = add_printer("X1", [{"id": "0", "tray": [tray_report, {**tray_report, "id": "1", "tray_uuid": "UUID1"}]}])
+
+    response = client.get("/printer/1/ams")
+    assert response.json()["full"] is True
+    assert [tray["slot"] for tray in response.json()["trays"]] == ["A0", "A1"]
+    version = response.json()["version"]
+
+    printer.report([{"id": "0", "tray": [tray_report, {**tray_report, "id": "1", "tray_uuid": "UUID1", "remain": 40}]}])
+    response = client.get("/printer/1/ams", params={"since": version})
+    assert response.json()["full"] is False
+    assert [(tray["slot"], tray["remain"]) for tray in response.json()["trays"]] == [("A1", 40)]
+
+    printer.report([])
+    response = client.get("/printer/1/ams", params={"since": response.json()["version"]})
+    assert (response.json()["trays"], response.json()["removed"]) == ([], ["A0", "A1"])
+
+    response = client.get("/printer/1/ams", params={"since": "1-1"})
+    assert (response.json()["full"], response.json()["trays"]) == (True, [])
@@ -0,0 +1,62 @@
+import logging
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def make_ams_unit() -> dict:
+    tray = {
+        "tray_type": "PLA",
+        "tray_sub_brands": "PLA Basic",
+        "remain": 40,
+        "tray_weight": "1000",
+    }
+    return {
+        "id": "0",
+        "tray": [
+            {**tray, "id": "0", "tray_uuid": "UUID0", "tray_color": "FF0000FF", "cols": ["FF0000FF"]},
+            {**tray, "id": "1", "tray_uuid": "UUID1", "tray_color": "000000FF", "cols": ["000000FF"]},
+        ],
+    }
+
+
+def test_reconcile_plan_and_apply(spoolman, add_printer, client) -> None:
+    """
+    Test the reconcile routes plan without writing, then apply the plan and record the spools against the trays
+    :return: None
+    """
+    spoolman.add_spool(10, "bambulab_pla_basic_red", "UUID0")
+    spoolman.add_spool(11, "bambulab_pla_basic_black")
+    add_printer("X1", [make_ams_unit()])
+
+    response = client.get("/spoolman/reconcile")
+    assert response.status_code == 200
+    assert [(action["action"], action["spool_id"]) for action in response.json()["actions"]] == [
+        ("patch", 10),
+        ("claim", 11),
+    ]
+    assert spoolman.patches == []
+
+    response = client.post("/spoolman/reconcile")
+    assert (response.json()["applied"], response.json()["skipped"], response.json()["failed"]) == (2, 0, [])
+    assert sorted(spool_id for spool_id, _ in spoolman.patches) == [10, 11]
+    trays = client.get("/printer/1/ams").json()["trays"]
+    assert [(tray["slot"], tray["spool_id"], tray["remaining_weight"]) for tray in trays] == [
+        ("A0", 10, 400.0),
+        ("A1", 11, 400.0),
+    ]
+
+    # Already in sync, so nothing is left to apply
+    assert client.get("/spoolman/reconcile").json()["in_sync"] == 2
+
+
+def test_reconcile_spoolman_unavailable(spoolman, add_printer, client) -> None:
+    """
+    Test the reconcile routes return 503 while Spoolman is unavailable
+    :return: None
+    """
+    add_printer("X1", [make_ams_unit()])
+    spoolman.available = False
+
+    assert client.get("/spoolman/reconcile").status_code == 503
+    assert client.post("/spoolman/reconcile").status_code == 503
@@ -1,12 +1,24 @@
+import datetime
 import os
 import pytest
 import logging
 
-from spoolman_bambu.bambu.ams_processor import calculate_spool_remaining_weight
+from spoolman_bambu.bambu.ams_processor import (
+    calculate_spool_remaining_weight,
+    flush_held_trays,
+    process_ams,
+    update_bound_spool,
+)
+from spoolman_bambu.bambu.models import Printer
+from spoolman_bambu.bambu.print_sync import HeldTrays
+from spoolman_bambu.bambu.snapshot import AmsSnapshot
 
 # Set Logging
 logging.basicConfig(level=logging.BASIC_FORMAT)
 
+NOW = datetime.datetime(2025, 1, 9, 16, 17, 12)
+TRAY_UUID = "0123456789ABCDEF0123456789ABCDEF"
+
 
 def test_calculate_weight_full() -> None:
     """
@@ -24,3 +36,151 @@ def test_calculate_weight_25() -> None:
     """
     response = calculate_spool_remaining_weight(1000, 25)
     assert response == 250.0
+
+
+def make_ams_unit(remain=40, tray_uuid=TRAY_UUID, color="FF0000"):
+    tray = {
+        "id": "0",
+        "tray_uuid": tray_uuid,
+        "tray_type": "PLA",
+        "tray_sub_brands": "PLA Basic",
+        "tray_color": f"{color}FF",
+        "cols": [f"{color}FF"],
+        "remain": remain,
+        "tray_weight": "1000",
+    }
+    return Printer.from_report("X1", [{"id": "0", "tray": [tray]}]).ams_units[0]
+
+
+def bind(snapshot, ams_unit, spool_id, remaining_weight=500.0) -> None:
+    tray = ams_unit.trays[0]
+    snapshot.set_slot(tray.slot, "previous", tray.tray_uuid, spool_id, remaining_weight)
+
+
+def test_process_ams_skips_unchanged_trays(spoolman) -> None:
+    """
+    Test a tray that hasn't changed since it was last synced isn't written or matched again
+    :return: None
+    """
+    spoolman.add_spool(10, "bambulab_pla_basic_red", TRAY_UUID)
+    snapshot = AmsSnapshot("X1")
+    ams_unit = make_ams_unit()
+    bind(snapshot, ams_unit, 10)
+
+    process_ams("X1", snapshot, ams_unit, NOW)
+    assert len(spoolman.patches) == 1
+    process_ams("X1", snapshot, ams_unit, NOW)
+    assert len(spoolman.patches) == 1
+    assert spoolman.list_fetches == 0
+
+
+def test_process_ams_patches_bound_spool(spoolman) -> None:
+    """
+    Test the spool a tray is bound to is patched without fetching the spool and filament lists
+    :return: None
+    """
+    spoolman.add_spool(10, "bambulab_pla_basic_red", TRAY_UUID)
+    snapshot = AmsSnapshot("X1")
+    ams_unit = make_ams_unit(remain=40)
+    bind(snapshot, ams_unit, 10)
+
+    process_ams("X1", snapshot, ams_unit, NOW)
+    assert spoolman.list_fetches == 0
+    assert [(spool_id, patch["remaining_weight"]) for spool_id, patch in spoolman.patches] == [(10, 400.0)]
+    assert snapshot.get_slot("A0")["spool_id"] == 10
+    assert snapshot.get_slot("A0")["remaining_weight"] == 400.0
+    assert snapshot.is_unchanged("A0", ams_unit.trays[0].fingerprint())
+
+
+def test_process_ams_deleted_spool_falls_back(spoolman) -> None:
+    """
+    Test a tray bound to a spool removed from Spoolman is matched again, claiming an unclaimed spool
+    :return: None
+    """
+    spoolman.add_spool(11, "bambulab_pla_basic_red")
+    snapshot = AmsSnapshot("X1")
+    ams_unit = make_ams_unit()
+    bind(snapshot, ams_unit, 10)
+
+    process_ams("X1", snapshot, ams_unit, NOW)
+    assert [spool_id for spool_id, _ in spoolman.patches] == [10, 11]
+    assert spoolman.list_fetches > 0
+    assert snapshot.get_slot("A0")["spool_id"] == 11
+    assert spoolman.index.get_binding(TRAY_UUID)["spool_id"] == 11
+
+
+def test_process_ams_holds_then_flushes(spoolman) -> None:
+    """
+    Test a bound tray's weight is held during a print, and written and recorded once flushed
+    :return: None
+    """
+    spoolman.add_spool(10, "bambulab_pla_basic_red", TRAY_UUID)
+    snapshot = AmsSnapshot("X1")
+    held = HeldTrays()
+    ams_unit = make_ams_unit(remain=45)
+    bind(snapshot, ams_unit, 10)
+    process_ams("X1", snapshot, ams_unit, NOW, held)
+    process_ams("X1", snapshot, make_ams_unit(remain=40), NOW, held)
+    assert spoolman.patches == []
+    assert held.is_held("A0", TRAY_UUID)
+    # Left out of the snapshot until flushed
+    assert snapshot.get_slot("A0")["fingerprint"] == "previous"
+
+    assert flush_held_trays("X1", snapshot, held.take_all()) == 1
+    assert [(spool_id, patch["remaining_weight"]) for spool_id, patch in spoolman.patches] == [(10, 400.0)]
+    assert snapshot.get_slot("A0")["remaining_weight"] == 400.0
+
+
+def test_flush_held_trays_while_unavailable(spoolman) -> None:
+    """
+    Test a held tray flushed while Spoolman is unavailable is recorded with the journaled weight
+    :return: None
+    """
+    snapshot = AmsSnapshot("X1")
+    ams_unit = make_ams_unit(remain=40)
+    bind(snapshot, ams_unit, 10)
+    spoolman.available = False
+
+    tray = ams_unit.trays[0]
+    assert flush_held_trays("X1", snapshot, [(tray.fingerprint(), tray, NOW)]) == 0
+    assert snapshot.get_slot("A0")["remaining_weight"] == 400.0
+    assert snapshot.is_unchanged("A0", tray.fingerprint())
+
+
+def test_update_bound_spool_uses_index(spoolman) -> None:
+    """
+    Test update_bound_spool falls back to the index binding of a tray missing from the snapshot
+    :return: None
+    """
+    tray = make_ams_unit(remain=40).trays[0]
+    assert update_bound_spool(None, tray, "X1", NOW) is None
+
+    spoolman.add_spool(10, "bambulab_pla_basic_red", TRAY_UUID)
+    spool = update_bound_spool(None, tray, "X1", NOW)
+    assert spool["id"] == 10
+    assert spool["remaining_weight"] == 400.0
+    assert spoolman.list_fetches == 0
+
+
+def test_update_bound_spool_checks_cached_spools(spoolman) -> None:
+    """
+    Test update_bound_spool falls back when the cached spools show the bound spool was unclaimed or archived
+    :return: None
+    """
+    tray = make_ams_unit(remain=40).trays[0]
+    spoolman.add_spool(10, "bambulab_pla_basic_red", TRAY_UUID)
+    spoolman.cached_spools = [dict(spool) for spool in spoolman.spools.values()]
+    assert update_bound_spool(None, tray, "X1", NOW)["id"] == 10
+
+    # Unclaimed by hand in Spoolman, without the index knowing
+    spoolman.cached_spools = [{**spoolman.spools[10], "extra": {spoolman.tag: '""'}}]
+    spoolman.patches.clear()
+    assert update_bound_spool(None, tray, "X1", NOW) is None
+    assert spoolman.index.get_binding(TRAY_UUID) is None
+
+    # Archived by hand, so it is missing from the active spools
+    spoolman.add_spool(10, "bambulab_pla_basic_red", TRAY_UUID)
+    spoolman.cached_spools = []
+    assert update_bound_spool(None, tray, "X1", NOW) is None
+    assert spoolman.patches == []
+    assert spoolman.list_fetches == 0
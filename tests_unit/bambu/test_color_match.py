@@ -0,0 +1,75 @@
+import pytest
+import logging
+
+from spoolman_bambu.bambu.color_match import FilamentColorIndex, KDTree, delta_e, hex_to_lab
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+FILAMENTS = [
+    {"id": "bambulab_pla_basic_red", "color_hex": "C12E1F", "color_hexes": None},
+    {"id": "bambulab_pla_basic_black", "color_hex": "000000", "color_hexes": None},
+    {"id": "bambulab_pla_basic_white", "color_hex": "FFFFFF", "color_hexes": None},
+    {"id": "bambulab_pla_silk_dual_red_blue", "color_hex": None, "color_hexes": ["FF0000", "0000FF"]},
+    {"id": "bambulab_petg_hf_red", "color_hex": "FF0000", "color_hexes": None},
+]
+
+
+def test_hex_to_lab() -> None:
+    """
+    Test hex_to_lab converts the sRGB reference colors
+    :return: None
+    """
+    assert hex_to_lab("FFFFFF") == pytest.approx((100.0, 0.0, 0.0), abs=0.01)
+    assert hex_to_lab("000000") == pytest.approx((0.0, 0.0, 0.0), abs=0.01)
+    assert hex_to_lab("FF0000") == pytest.approx((53.24, 80.09, 67.20), abs=0.05)
+
+
+def test_kd_tree_nearest_matches_linear_scan() -> None:
+    """
+    Test KDTree.nearest finds the same point as comparing against every point
+    :return: None
+    """
+    colors = [
+        f"{red:02X}{green:02X}{blue:02X}" for red in range(0, 256, 51) for green in (0, 128, 255) for blue in (0, 200)
+    ]
+    tree = KDTree([(hex_to_lab(color), color) for color in colors])
+
+    for target in ("123456", "FEDCBA", "808080", "00FF7F"):
+        lab = hex_to_lab(target)
+        expected = min(colors, key=lambda color: delta_e(hex_to_lab(color), lab))
+        assert tree.nearest(lab) == (pytest.approx(delta_e(hex_to_lab(expected), lab)), expected)
+
+
+def test_match_nearest_within_tolerance(make_tray) -> None:
+    """
+    Test FilamentColorIndex.match returns the nearest color for the tray's filament and None beyond the tolerance
+    :return: None
+    """
+    index = FilamentColorIndex(FILAMENTS, 10)
+    assert index.match(make_tray("A0", "PLA", color="C12E1FFF"))["id"] == "bambulab_pla_basic_red"
+    assert index.match(make_tray("A1", "PLA", color="C5301EFF"))["id"] == "bambulab_pla_basic_red"
+    assert index.match(make_tray("A2", "PETG", color="F80404FF", sub_brands="PETG HF"))["id"] == "bambulab_petg_hf_red"
+    assert index.match(make_tray("A3", "PLA", color="00AE42FF")) is None
+
+
+def test_match_multi_color(make_tray) -> None:
+    """
+    Test FilamentColorIndex.match compares multi-color trays against the multi-color filaments
+    :return: None
+    """
+    index = FilamentColorIndex(FILAMENTS, 10)
+    tray = make_tray("A0", "PLA", color="FF0000FF", sub_brands="PLA Silk", colors=["0000FFFF", "FF0000FF"])
+    assert index.match(tray)["id"] == "bambulab_pla_silk_dual_red_blue"
+
+
+def test_match_trays(make_tray) -> None:
+    """
+    Test FilamentColorIndex.match_trays matches a whole AMS unit by slot
+    :return: None
+    """
+    index = FilamentColorIndex(FILAMENTS, 0)
+    trays = [make_tray("A0", "PLA", color="000000FF"), make_tray("A1", "PLA", color="010101FF")]
+    matches = index.match_trays(trays)
+    assert matches["A0"]["id"] == "bambulab_pla_basic_black"
+    assert matches["A1"] is None
@@ -0,0 +1,58 @@
+import os
+import pytest
+import logging
+
+from spoolman_bambu.api.v1.models import PrinterConfig
+from spoolman_bambu.bambu.fleet import (
+    get_printer_number,
+    load_printer_configs,
+    remove_printer_config,
+    save_printer_config,
+)
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_printer_configs_overlay_env(data_dir, monkeypatch) -> None:
+    """
+    Test persisted printers override and remove env configured printers
+    :return: None
+    """
+    monkeypatch.setenv("SPOOLMAN_BAMBU_PRINTER_1_ID", "X1")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_PRINTER_1_IP", "192.168.1.4")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_PRINTER_1_CODE", "AAAA")
+    assert [printer.printer_id for printer in load_printer_configs()] == ["X1"]
+
+    save_printer_config(PrinterConfig(printer_id="X1", printer_ip="192.168.1.10", printer_code="AAAA"))
+    save_printer_config(PrinterConfig(printer_id="X2", printer_ip="192.168.1.5", printer_code="BBBB"))
+    configs = {printer.printer_id: printer for printer in load_printer_configs()}
+    assert configs["X1"].printer_ip == "192.168.1.10"
+    assert "X2" in configs
+
+    remove_printer_config("X1")
+    assert [printer.printer_id for printer in load_printer_configs()] == ["X2"]
+
+
+def test_printer_numbers_are_stable(data_dir) -> None:
+    """
+    Test printer ids are kept across removals and never reused
+    :return: None
+    """
+    assert get_printer_number("X1") == 1
+    assert get_printer_number("X2") == 2
+    remove_printer_config("X1")
+    assert get_printer_number("X2") == 2
+    assert get_printer_number("X3") == 3
+    assert get_printer_number("X1") == 1
+
+
+def test_hand_edited_printer_configs(data_dir) -> None:
+    """
+    Test a persisted configuration missing its keys is filled in rather than failing
+    :return: None
+    """
+    data_dir.joinpath("printers.json").write_text('{"version": 1}', encoding="utf-8")
+    save_printer_config(PrinterConfig(printer_id="X2", printer_ip="192.168.1.5", printer_code="BBBB"))
+    remove_printer_config("X1")
+    assert [printer.printer_id for printer in load_printer_configs()] == ["X2"]
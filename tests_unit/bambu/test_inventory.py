@@ -0,0 +1,106 @@
+import pytest
+import logging
+
+from spoolman_bambu import state
+from spoolman_bambu.alerts.rules import AlertEngine, AlertRules
+from spoolman_bambu.bambu.bambu import Bambu
+from spoolman_bambu.bambu.inventory import Inventory
+from spoolman_bambu.bambu.models import Printer
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_inventory_aggregates(make_tray) -> None:
+    """
+    Test Inventory keeps the totals per material, color and printer, and counts empty and invalid trays
+    :return: None
+    """
+    inventory = Inventory()
+    inventory.update_tray("X1", make_tray("A0", remain=50))
+    inventory.update_tray("X1", make_tray("A1", "PETG", color="000000FF", remain=25))
+    inventory.update_tray("X1", make_tray("A2", None))
+    inventory.update_tray("X2", make_tray("A0", remain=0))
+
+    result = inventory.get_inventory()
+    assert (result["trays"], result["empty_trays"], result["invalid_trays"]) == (4, 1, 1)
+    assert (result["loaded_weight"], result["remaining_weight"]) == (2000.0, 750.0)
+    assert [(group["key"], group["remaining_weight"]) for group in result["materials"]] == [
+        ("PLA", 500.0),
+        ("PETG", 250.0),
+    ]
+    assert [group["key"] for group in result["colors"]] == ["FF0000FF", "000000FF"]
+    assert [(group["key"], group["trays"], group["invalid_trays"]) for group in result["printers"]] == [
+        ("X1", 3, 0),
+        ("X2", 1, 1),
+    ]
+
+
+def test_inventory_incremental_updates(make_tray) -> None:
+    """
+    Test Inventory replaces the contribution of a changed tray, and drops removed trays and printers
+    :return: None
+    """
+    inventory = Inventory()
+    inventory.update_tray("X1", make_tray("A0", remain=50))
+    version = inventory.get_inventory()["version"]
+
+    # Unchanged trays don't bump the version
+    assert inventory.update_tray("X1", make_tray("A0", remain=50)) is False
+    assert inventory.get_inventory()["version"] == version
+
+    inventory.update_tray("X1", make_tray("A0", "PETG", remain=40))
+    result = inventory.get_inventory()
+    assert result["version"] > version
+    assert [(group["key"], group["remaining_weight"]) for group in result["materials"]] == [("PETG", 400.0)]
+
+    inventory.update_tray("X1", make_tray("A1", remain=10))
+    assert inventory.remove_tray("X1", "A1") is True
+    assert inventory.remove_tray("X1", "A1") is False
+    assert inventory.get_inventory()["remaining_weight"] == 400.0
+
+    inventory.remove_printer("X1")
+    result = inventory.get_inventory()
+    assert result["trays"] == 0
+    assert result["materials"] == [] and result["printers"] == []
+
+
+def test_disconnected_ams_unit_applied(monkeypatch) -> None:
+    """
+    Test the removed trays of a disconnected AMS unit leave the inventory, resolve their alerts and re-evaluate the
+    fleet total of their material
+    :return: None
+    """
+    app_state = state.get_current_state()
+    inventory = Inventory()
+    alerts = AlertEngine(AlertRules(low_stock_grams=400, material_low_stock_grams=500, humidity=4))
+    monkeypatch.setattr(app_state, "_inventory", inventory)
+    monkeypatch.setattr(app_state, "_alerts", alerts)
+
+    tray = {"id": "0", "tray_type": "PLA", "tray_color": "FF0000FF", "remain": 30, "tray_weight": "1000"}
+    ams_units = [
+        {"id": str(ams_id), "humidity": "5", "tray": [{**tray, "tray_uuid": f"UUID{ams_id}"}]} for ams_id in range(2)
+    ]
+    bambu = Bambu.__new__(Bambu)
+    bambu.printer_id = "X1"
+    bambu.printer_state = Printer.from_report("X1", ams_units)
+    bambu.apply_tray_changes({"trays": [{"slot": "A0"}, {"slot": "B0"}], "removed": []})
+    for ams_unit in bambu.printer_state.ams_units:
+        alerts.evaluate_ams("X1", ams_unit)
+    assert inventory.get_material_remaining("PLA") == pytest.approx(600.0)
+    assert sorted(alert["key"] for alert in alerts.get_firing()) == [
+        "humidity:X1:A",
+        "humidity:X1:B",
+        "low_stock:X1:A0",
+        "low_stock:X1:B0",
+    ]
+
+    bambu.printer_state = Printer.from_report("X1", ams_units[:1])
+    bambu.apply_tray_changes({"trays": [], "removed": ["B0"]})
+    assert inventory.get_material_remaining("PLA") == pytest.approx(300.0)
+    assert sorted(alert["key"] for alert in alerts.get_firing()) == [
+        "humidity:X1:A",
+        "low_stock:X1:A0",
+        "material_low_stock:PLA",
+    ]
+    assert alerts.tray_materials == {("X1", "A0"): "PLA"}
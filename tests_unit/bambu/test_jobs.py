@@ -0,0 +1,114 @@
+import os
+import pytest
+import logging
+
+from spoolman_bambu.bambu import jobs
+from spoolman_bambu.bambu.jobs import JobLedger, JobTracker, get_tray_now_slot
+from spoolman_bambu.bambu.models import Printer
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def make_printer(remain_a0, remain_a1) -> Printer:
+    trays = [
+        {
+            "id": str(tray_id),
+            "tray_uuid": f"UUID{tray_id}",
+            "tray_type": "PLA",
+            "tray_sub_brands": "PLA Basic",
+            "tray_color": "FF0000FF",
+            "cols": ["FF0000FF"],
+            "remain": remain,
+            "tray_weight": "1000",
+        }
+        for tray_id, remain in enumerate([remain_a0, remain_a1])
+    ]
+    return Printer.from_report("X1", [{"id": "0", "tray": trays}])
+
+
+def test_get_tray_now_slot() -> None:
+    """
+    Test get_tray_now_slot converts the tray index to a slot and ignores the external spool and no tray
+    :return: None
+    """
+    assert get_tray_now_slot("0") == "A0"
+    assert get_tray_now_slot("5") == "B1"
+    assert get_tray_now_slot("254") is None
+    assert get_tray_now_slot("255") is None
+    assert get_tray_now_slot(None) is None
+
+
+def test_job_tracker_attributes_active_tray(tmp_path) -> None:
+    """
+    Test JobTracker attributes drops in remaining % of the trays which fed the job and appends them when it ends
+    :return: None
+    """
+    ledger = JobLedger(tmp_path.joinpath("job_ledger.ndjson"))
+    ended_jobs = []
+    tracker = JobTracker("X1", ledger, spool_resolver=lambda tray_uuid: 7, on_job_end=ended_jobs.append)
+
+    assert tracker.update({"gcode_state": "IDLE"}, make_printer(80, 50), 0) is None
+    tracker.update(
+        {"gcode_state": "RUNNING", "task_id": "100", "subtask_name": "Benchy", "ams": {"tray_now": "0"}}, None, 10
+    )
+    # A1 isn't feeding the job, its drop isn't attributed
+    tracker.update({"mc_percent": 50}, make_printer(78, 45), 20)
+    assert tracker.get_job()["grams"] == 20.0
+    assert tracker.get_job()["progress"] == 50
+
+    tracker.update({"ams": {"tray_now": "1"}}, None, 30)
+    records = tracker.update({"gcode_state": "FINISH"}, make_printer(77, 44), 40)
+
+    assert tracker.get_job() is None
+    assert [(record["slot"], record["grams"]) for record in records] == [("A0", 30.0), ("A1", 10.0)]
+    assert records[0]["job_id"] == "100"
+    assert records[0]["name"] == "Benchy"
+    assert records[0]["state"] == "FINISH"
+    assert records[0]["spool_id"] == 7
+    assert ended_jobs == [records]
+    assert ledger.read() == list(reversed(records))
+
+
+def test_job_tracker_new_task_ends_job() -> None:
+    """
+    Test JobTracker ends a job whose end wasn't seen when the printer reports a new task
+    :return: None
+    """
+    tracker = JobTracker("X1", None)
+    tracker.update({"gcode_state": "RUNNING", "task_id": "100"}, None, 10)
+    records = tracker.update({"task_id": "200"}, None, 20)
+
+    assert records == []
+    assert tracker.get_job()["job_id"] == "200"
+
+
+def test_job_ledger_read(tmp_path) -> None:
+    """
+    Test JobLedger.read returns the newest records first, filtered by printer, and skips a torn line
+    :return: None
+    """
+    path = tmp_path.joinpath("job_ledger.ndjson")
+    ledger = JobLedger(path)
+    assert ledger.read() == []
+
+    ledger.append([{"printer_id": "X1", "job_id": "1"}, {"printer_id": "X2", "job_id": "2"}])
+    ledger.append([{"printer_id": "X1", "job_id": "3"}])
+    with path.open("a") as f:
+        f.write('{"printer_id": "X1", "jo')
+
+    assert [record["job_id"] for record in ledger.read()] == ["3", "2", "1"]
+    assert [record["job_id"] for record in ledger.read("X1", limit=1)] == ["3"]
+
+
+def test_job_ledger_read_across_blocks(tmp_path, monkeypatch) -> None:
+    """
+    Test JobLedger.read reassembles records split across the blocks it reads backwards
+    :return: None
+    """
+    monkeypatch.setattr(jobs, "READ_BLOCK_SIZE", 16)
+    ledger = JobLedger(tmp_path.joinpath("job_ledger.ndjson"))
+    ledger.append([{"printer_id": "X1", "job_id": str(job_id), "name": "Benchy" * job_id} for job_id in range(20)])
+
+    assert [record["job_id"] for record in ledger.read(limit=3)] == ["19", "18", "17"]
+    assert [record["job_id"] for record in ledger.read(limit=100)] == [str(job_id) for job_id in reversed(range(20))]
@@ -0,0 +1,78 @@
+import os
+import pytest
+import logging
+
+from spoolman_bambu.bambu.models import AmsUnit, Printer, Tray
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+AMS_UNIT = {
+    "id": "1",
+    "humidity": "4",
+    "temp": "24.5",
+    "tray": [
+        {
+            "id": "0",
+            "tray_uuid": "0123456789ABCDEF0123456789ABCDEF",
+            "tray_type": "PLA",
+            "tray_sub_brands": "PLA Basic",
+            "tray_color": "FF0000FF",
+            "cols": ["FF0000FF"],
+            "remain": 80,
+            "tray_weight": "1000",
+        },
+        {"id": "1"},
+    ],
+}
+
+
+def test_ams_unit_from_report() -> None:
+    """
+    Test AmsUnit.from_report parses the numeric fields and trays
+    :return: None
+    """
+    ams_unit = AmsUnit.from_report(AMS_UNIT)
+    assert ams_unit.id == "B"
+    assert ams_unit.humidity == 4
+    assert ams_unit.temp == 24.5
+    assert len(ams_unit.trays) == 2
+
+    tray = ams_unit.trays[0]
+    assert tray.slot == "B0"
+    assert tray.remain == 80
+    assert tray.weight == 1000.0
+    assert tray.colors == ("FF0000FF",)
+    assert tray.is_valid()
+
+
+def test_tray_empty() -> None:
+    """
+    Test an empty tray slot is neither valid nor has filament data
+    :return: None
+    """
+    tray = AmsUnit.from_report(AMS_UNIT).trays[1]
+    assert tray.is_empty()
+    assert not tray.is_valid()
+
+
+def test_tray_petg_translucent_color() -> None:
+    """
+    Test PETG Translucent trays reporting no color are given a transparent white
+    :return: None
+    """
+    tray = Tray.from_report(
+        "A",
+        {**AMS_UNIT["tray"][0], "tray_sub_brands": "PETG Translucent", "tray_color": "00000000"},
+    )
+    assert tray.color == "FFFFFF00"
+    assert tray.is_valid()
+
+
+def test_printer_reports_equal() -> None:
+    """
+    Test identical reports build equal models
+    :return: None
+    """
+    assert Printer.from_report("X1", [AMS_UNIT]) == Printer.from_report("X1", [AMS_UNIT])
+    assert len(Printer.from_report("X1", [AMS_UNIT]).get_trays()) == 2
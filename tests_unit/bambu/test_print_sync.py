@@ -0,0 +1,43 @@
+import logging
+
+from spoolman_bambu.bambu.print_sync import HeldTrays
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_held_trays_keeps_latest_update(make_tray) -> None:
+    """
+    Test HeldTrays keeps only the latest update of each slot and is emptied when they are all taken
+    :return: None
+    """
+    held = HeldTrays()
+    assert held.is_due(0) is False
+
+    held.hold("a", make_tray(remain=80, tray_uuid="UUID0"), 1)
+    held.hold("b", make_tray(remain=70, tray_uuid="UUID0"), 2)
+    assert held.get_count() == 1
+    assert held.is_due(0) is True
+    assert held.is_due(3600) is False
+
+    [(fingerprint, tray, current_time)] = held.take_all()
+    assert (fingerprint, tray.remain, current_time) == ("b", 70, 2)
+    assert held.get_count() == 0
+    assert held.is_due(0) is False
+
+
+def test_held_trays_take_swapped(make_tray) -> None:
+    """
+    Test HeldTrays.take_swapped only takes the held update of a slot once a different tray is loaded in it
+    :return: None
+    """
+    held = HeldTrays()
+    held.hold("a", make_tray(tray_uuid="UUID0"), 1)
+
+    assert held.take_swapped(make_tray(remain=60, tray_uuid="UUID0")) is None
+    assert held.get_count() == 1
+
+    swapped = held.take_swapped(make_tray(tray_uuid="UUID1"))
+    assert swapped[1].tray_uuid == "UUID0"
+    assert held.get_count() == 0
+    assert held.is_due(0) is False
@@ -0,0 +1,90 @@
+import os
+import pytest
+import logging
+
+from spoolman_bambu.bambu.pushall import PushallScheduler, get_min_interval, get_printer_model
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_get_printer_model() -> None:
+    """
+    Test get_printer_model reads the model from the serial number, and unknown models get the longest throttle
+    :return: None
+    """
+    assert get_printer_model("01P00A000000000") == "P1S"
+    assert get_printer_model("00M00A000000000") == "X1C"
+    assert get_printer_model("ZZZ00A000000000") is None
+    assert get_min_interval("P1S") == 300
+    assert get_min_interval(None) == 300
+
+
+def test_pushall_scheduler_cadence() -> None:
+    """
+    Test PushallScheduler requests on connect and then on the interval, and stops while disconnected
+    :return: None
+    """
+    requests = []
+    scheduler = PushallScheduler("00M00A000000000", lambda payload: requests.append(payload) or True, 120, 0)
+
+    assert scheduler.tick(0) is False
+    scheduler.on_connect(10)
+    assert scheduler.tick(10) is True
+    assert requests[0]["pushing"]["command"] == "pushall"
+    assert requests[0]["pushing"]["sequence_id"] == "1"
+
+    assert scheduler.tick(100) is False
+    assert scheduler.tick(130) is True
+
+    scheduler.on_disconnect()
+    assert scheduler.tick(1000) is False
+    assert len(requests) == 2
+
+
+def test_pushall_scheduler_throttles_model() -> None:
+    """
+    Test PushallScheduler never requests a P1 printer more often than its model allows, even across reconnects
+    :return: None
+    """
+    requests = []
+    scheduler = PushallScheduler("01S00A000000000", lambda payload: requests.append(payload) or True, 60, 0)
+    assert scheduler.interval == 300
+
+    scheduler.on_connect(0)
+    assert scheduler.tick(0) is True
+    scheduler.on_disconnect()
+    scheduler.on_connect(5)
+    assert scheduler.tick(5) is False
+    assert scheduler.get_next_due() == 300
+    assert scheduler.tick(300) is True
+
+
+def test_pushall_scheduler_jitter() -> None:
+    """
+    Test PushallScheduler adds up to the jitter to each request
+    :return: None
+    """
+    scheduler = PushallScheduler("00M00A000000000", lambda payload: True, 0, 10)
+    scheduler.on_connect(0)
+    assert 0 <= scheduler.get_next_due() <= 10
+
+    # With no interval only the connect is requested
+    assert scheduler.tick(10) is True
+    assert scheduler.get_next_due() is None
+
+
+def test_pushall_scheduler_set_interval() -> None:
+    """
+    Test PushallScheduler follows a changed interval from the next request, still throttled to the model
+    :return: None
+    """
+    scheduler = PushallScheduler("01S00A000000000", lambda payload: True, 600, 0)
+    scheduler.on_connect(0)
+    assert scheduler.tick(0) is True
+    assert scheduler.get_next_due() == 600
+
+    scheduler.set_interval(60, 0)
+    assert scheduler.interval == 300
+    assert scheduler.tick(600) is True
+    assert scheduler.get_next_due() == 900
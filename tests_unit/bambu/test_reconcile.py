@@ -0,0 +1,230 @@
+import datetime
+import os
+import pytest
+import logging
+
+from spoolman_bambu import env, state
+from spoolman_bambu.bambu.color_match import FilamentColorIndex
+from spoolman_bambu.bambu.models import Printer
+from spoolman_bambu.bambu.print_sync import HeldTrays
+from spoolman_bambu.bambu.reconcile import apply_plan, build_plan, plan as plan_reconcile
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+NOW = datetime.datetime(2025, 1, 9, 16, 17, 12)
+
+EXTERNAL_FILAMENTS = [
+    {"id": "bambulab_pla_basic_red", "color_hex": "FF0000", "color_hexes": None},
+    {"id": "bambulab_pla_basic_black", "color_hex": "000000", "color_hexes": None},
+    {"id": "bambulab_pla_basic_white", "color_hex": "FFFFFF", "color_hexes": None},
+]
+INTERNAL_FILAMENTS = [
+    {"id": 1, "external_id": "bambulab_pla_basic_red"},
+    {"id": 2, "external_id": "bambulab_pla_basic_black"},
+    {"id": 3, "external_id": "bambulab_pla_basic_white"},
+]
+
+
+class FakePrinter:
+    def __init__(self, printer_id, trays):
+        self.printer_id = printer_id
+        self.printer_state = None
+        if trays is not None:
+            self.printer_state = Printer.from_report(printer_id, [{"id": "0", "tray": trays}])
+
+    def get_printer_id(self):
+        return self.printer_id
+
+    def get_printer_state(self):
+        return self.printer_state
+
+
+class SyncingPrinter(FakePrinter):
+    def __init__(self, printer_id, trays):
+        super().__init__(printer_id, trays)
+        self.held_trays = HeldTrays()
+        self.synced = []
+
+    def get_held_trays(self):
+        return self.held_trays
+
+    def set_synced_tray(self, slot, fingerprint, spool):
+        self.synced.append((slot, fingerprint, spool["id"]))
+        return True
+
+
+def make_tray(tray_id, tray_uuid, color, remain=50) -> dict:
+    return {
+        "id": tray_id,
+        "tray_uuid": tray_uuid,
+        "tray_type": "PLA",
+        "tray_sub_brands": "PLA Basic",
+        "tray_color": f"{color}FF",
+        "cols": [f"{color}FF"],
+        "remain": remain,
+        "tray_weight": "1000",
+    }
+
+
+def make_spool(spool_id, external_id, tray_uuid=None, location="X1", remaining_weight=500.0) -> dict:
+    extra = {}
+    if tray_uuid is not None:
+        extra["tag"] = f'"{tray_uuid}"'
+    return {
+        "id": spool_id,
+        "filament": {"id": 1, "external_id": external_id},
+        "location": location,
+        "remaining_weight": remaining_weight,
+        "extra": extra,
+    }
+
+
+def test_build_plan(tmp_path, monkeypatch) -> None:
+    """
+    Test build_plan diffs the loaded trays against the spools into creates, claims, patches and releases
+    :return: None
+    """
+    monkeypatch.setenv("SPOOLMAN_BAMBU_DIR_DATA", str(tmp_path))
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_IP", "192.168.1.2")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_PORT", "7912")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_TAG", "Tag")
+    monkeypatch.setattr(env, "_settings", None)
+
+    printers = [
+        FakePrinter(
+            "X1",
+            [
+                make_tray("0", "UUID0", "FF0000", remain=40),
+                make_tray("1", "UUID1", "000000"),
+                make_tray("2", "UUID2", "FFFFFF"),
+                make_tray("3", "UUID3", "00FF00"),
+            ],
+        ),
+        FakePrinter("X2", [make_tray("0", "UUID4", "FF0000")]),
+        # Hasn't reported yet, so the spools located at it are left alone
+        FakePrinter("X3", None),
+    ]
+    spools = [
+        make_spool(10, "bambulab_pla_basic_red", "UUID0"),
+        make_spool(11, "bambulab_pla_basic_black"),
+        make_spool(12, "bambulab_pla_basic_red", "UUID4", location="X2"),
+        make_spool(13, "bambulab_pla_basic_red", "UUID5"),
+        make_spool(14, "bambulab_pla_basic_red", "UUID6", location="X3"),
+    ]
+    color_index = FilamentColorIndex(EXTERNAL_FILAMENTS, 10)
+
+    plan = build_plan(printers, spools, INTERNAL_FILAMENTS, color_index, NOW)
+    actions = [(action["action"], action["tray_uuid"], action.get("spool_id")) for action in plan["actions"]]
+    assert actions == [
+        ("patch", "UUID0", 10),
+        ("claim", "UUID1", 11),
+        ("create", "UUID2", None),
+        ("release", "UUID5", 13),
+    ]
+    assert plan["in_sync"] == 1
+    assert plan["unmatched"] == [{"printer_id": "X1", "slot": "A3", "tray_uuid": "UUID3"}]
+
+    patch, claim, create, release = plan["actions"]
+    assert patch["patch"] == {"remaining_weight": 400.0, "location": "X1", "last_used": NOW.isoformat()}
+    assert claim["patch"]["extra"] == {"tag": '"UUID1"'}
+    assert create["filament_id"] == 3
+    assert create["filament"] is None
+    assert create["spool"]["filament_id"] == 3
+    # The spool keeps its tag, so it is recognised when the tray is loaded again
+    assert release["patch"] == {"location": ""}
+
+
+def test_apply_plan_skips_stale_and_held(spoolman, monkeypatch) -> None:
+    """
+    Test apply_plan skips claims synced since the plan was made and held patches, and records the applied actions
+    :return: None
+    """
+    printer = SyncingPrinter(
+        "X1",
+        [
+            make_tray("0", "UUID0", "FF0000", remain=40),
+            make_tray("1", "UUID1", "000000"),
+            make_tray("2", "UUID2", "FF0000"),
+            make_tray("3", "UUID3", "000000", remain=40),
+        ],
+    )
+    monkeypatch.setattr(state.get_current_state(), "_printers", [printer])
+    spools = [
+        spoolman.add_spool(10, "bambulab_pla_basic_red", "UUID0"),
+        spoolman.add_spool(11, "bambulab_pla_basic_black"),
+        spoolman.add_spool(12, "bambulab_pla_basic_red"),
+        spoolman.add_spool(13, "bambulab_pla_basic_black", "UUID3"),
+    ]
+    plan = build_plan([printer], spools, INTERNAL_FILAMENTS, spoolman.color_index, NOW)
+    assert [(action["action"], action["spool_id"]) for action in plan["actions"]] == [
+        ("patch", 10),
+        ("claim", 11),
+        ("claim", 12),
+        ("patch", 13),
+    ]
+
+    # An MQTT report claims spool 12 for the tray before the plan is applied, and tray A3 is held during a print
+    spoolman.patch_spool(12, {"extra": {spoolman.tag: '"UUID2"'}})
+    held_tray = printer.get_printer_state().get_trays()[3]
+    printer.held_trays.hold(held_tray.fingerprint(), held_tray, NOW)
+    spoolman.patches.clear()
+
+    result = apply_plan(plan)
+    assert (result["applied"], result["skipped"], result["failed"]) == (2, 2, [])
+    assert sorted(spool_id for spool_id, _ in spoolman.patches) == [10, 11]
+    assert sorted(printer.synced) == [
+        ("A0", plan["actions"][0]["fingerprint"], 10),
+        ("A1", plan["actions"][1]["fingerprint"], 11),
+    ]
+
+
+def test_plan_leaves_index_unchanged(spoolman, monkeypatch) -> None:
+    """
+    Test planning doesn't write to the index, and applying the plan drops a binding Spoolman no longer has
+    :return: None
+    """
+    printer = SyncingPrinter("X1", [make_tray("0", "UUID0", "000000")])
+    monkeypatch.setattr(state.get_current_state(), "_printers", [printer])
+    spoolman.add_spool(11, "bambulab_pla_basic_black")
+    # Spool 10 was claimed by the tray, then archived by hand in Spoolman
+    spoolman.add_spool(10, "bambulab_pla_basic_red", "UUID0")
+    del spoolman.spools[10]
+
+    plan = plan_reconcile()
+    assert [(action["action"], action["spool_id"]) for action in plan["actions"]] == [("claim", 11)]
+    assert spoolman.index.get_binding("UUID0")["spool_id"] == 10
+
+    spoolman.available = False
+    result = apply_plan(plan)
+    assert (result["applied"], result["skipped"], len(result["failed"])) == (0, 0, 1)
+    assert spoolman.index.get_binding("UUID0") is None
+
+    spoolman.available = True
+    result = apply_plan(plan_reconcile())
+    assert (result["applied"], result["skipped"], result["failed"]) == (1, 0, [])
+    assert spoolman.index.get_binding("UUID0")["spool_id"] == 11
+
+
+def test_apply_plan_skips_changed_trays(spoolman, monkeypatch) -> None:
+    """
+    Test apply_plan skips patches of trays changed since the plan was made and releases of trays loaded again
+    :return: None
+    """
+    printer = SyncingPrinter("X1", [make_tray("0", "UUID0", "FF0000", remain=40)])
+    monkeypatch.setattr(state.get_current_state(), "_printers", [printer])
+    spools = [
+        spoolman.add_spool(10, "bambulab_pla_basic_red", "UUID0"),
+        spoolman.add_spool(11, "bambulab_pla_basic_black", "UUID1"),
+    ]
+    plan = build_plan([printer], spools, INTERNAL_FILAMENTS, spoolman.color_index, NOW)
+    assert [(action["action"], action["spool_id"]) for action in plan["actions"]] == [("patch", 10), ("release", 11)]
+
+    # The tray has been used further, and the released tray loaded again, since the plan was made
+    printer.printer_state = Printer.from_report(
+        "X1", [{"id": "0", "tray": [make_tray("0", "UUID0", "FF0000", remain=30), make_tray("1", "UUID1", "000000")]}]
+    )
+    result = apply_plan(plan)
+    assert (result["applied"], result["skipped"], result["failed"]) == (0, 2, [])
+    assert spoolman.patches == []
+    assert printer.synced == []
@@ -0,0 +1,70 @@
+import os
+import pytest
+import logging
+
+from spoolman_bambu.bambu.models import Tray
+from spoolman_bambu.bambu.snapshot import AmsSnapshot, load_snapshot
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+TRAY = {
+    "id": "0",
+    "tray_uuid": "0123456789ABCDEF0123456789ABCDEF",
+    "tray_sub_brands": "PLA Basic",
+    "tray_color": "FF0000FF",
+    "remain": 80,
+    "tray_weight": "1000",
+}
+
+
+def test_tray_fingerprint_changes_with_remain() -> None:
+    """
+    Test Tray.fingerprint changes when the remaining filament changes
+    :return: None
+    """
+    tray = Tray.from_report("A", TRAY)
+    assert tray.fingerprint() == Tray.from_report("A", dict(TRAY)).fingerprint()
+    assert tray.fingerprint() != Tray.from_report("A", {**TRAY, "remain": 79}).fingerprint()
+
+
+def test_snapshot_is_unchanged() -> None:
+    """
+    Test AmsSnapshot only reports slots with the same fingerprint as unchanged
+    :return: None
+    """
+    snapshot = AmsSnapshot("printer")
+    assert not snapshot.is_unchanged("A0", "abc")
+    snapshot.set_slot("A0", "abc", "uuid", 1, 800.0)
+    assert snapshot.is_unchanged("A0", "abc")
+    assert not snapshot.is_unchanged("A0", "def")
+
+
+def test_snapshot_save_and_load(data_dir) -> None:
+    """
+    Test a saved snapshot is restored by load_snapshot
+    :return: None
+    """
+    snapshot = load_snapshot("printer")
+    snapshot.set_slot("A0", "abc", "uuid", 1, 800.0)
+    snapshot.save()
+
+    assert not snapshot.dirty
+    restored = load_snapshot("printer")
+    assert restored.get_slot("A0") == {
+        "fingerprint": "abc",
+        "tray_uuid": "uuid",
+        "spool_id": 1,
+        "remaining_weight": 800.0,
+    }
+
+
+def test_snapshot_load_corrupt(data_dir) -> None:
+    """
+    Test an unreadable snapshot falls back to an empty one
+    :return: None
+    """
+    snapshot = load_snapshot("printer")
+    snapshot.path.write_text("{not json")
+
+    assert load_snapshot("printer").slots == {}
@@ -0,0 +1,111 @@
+import os
+import pytest
+import logging
+
+from spoolman_bambu.bambu.models import Printer
+from spoolman_bambu.bambu.snapshot import AmsSnapshot
+from spoolman_bambu.bambu.tray_state import TrayState
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+TRAY_UUID = "0123456789ABCDEF0123456789ABCDEF"
+
+
+def make_printer(remain=80, units=1) -> Printer:
+    ams_units = [
+        {
+            "id": str(unit),
+            "humidity": "4",
+            "temp": "24.5",
+            "tray": [
+                {
+                    "id": "0",
+                    "tray_uuid": TRAY_UUID,
+                    "tray_type": "PLA",
+                    "tray_sub_brands": "PLA Basic",
+                    "tray_color": "FF0000FF",
+                    "cols": ["FF0000FF"],
+                    "remain": remain,
+                    "tray_weight": "1000",
+                },
+                {"id": "1"},
+            ],
+        }
+        for unit in range(units)
+    ]
+    return Printer.from_report("X1", ams_units)
+
+
+def test_tray_state_full_and_since() -> None:
+    """
+    Test TrayState.get_changes returns every tray without a version and only the changed trays since one
+    :return: None
+    """
+    snapshot = AmsSnapshot("X1")
+    tray_state = TrayState()
+    tray_state.update(make_printer(), snapshot)
+
+    changes = tray_state.get_changes()
+    assert changes["full"] is True
+    assert [tray["slot"] for tray in changes["trays"]] == ["A0", "A1"]
+    assert changes["trays"][1]["tray_uuid"] is None
+    version = changes["version"]
+
+    # An identical report changes nothing
+    assert tray_state.update(make_printer(), snapshot) == 0
+    assert tray_state.get_changes(version) == {"version": version, "full": False, "trays": [], "removed": []}
+
+    snapshot.set_slot("A0", "fingerprint", TRAY_UUID, 3, 700.0)
+    tray_state.update(make_printer(remain=70), snapshot)
+    changes = tray_state.get_changes(version)
+    assert changes["version"] > version
+    assert [tray["slot"] for tray in changes["trays"]] == ["A0"]
+    assert changes["trays"][0]["remain"] == 70
+    assert changes["trays"][0]["spool_id"] == 3
+    assert changes["trays"][0]["remaining_weight"] == 700.0
+
+
+def test_tray_state_removed_units() -> None:
+    """
+    Test TrayState.get_changes reports the slots of a disconnected AMS unit and falls back to every tray for an
+    unknown version
+    :return: None
+    """
+    snapshot = AmsSnapshot("X1")
+    tray_state = TrayState()
+    tray_state.update(make_printer(units=2), snapshot)
+    version = tray_state.get_version()
+
+    tray_state.update(make_printer(units=1), snapshot)
+    changes = tray_state.get_changes(version)
+    assert changes["trays"] == []
+    assert changes["removed"] == ["B0", "B1"]
+
+    counter = int(version.rsplit("-", 1)[1])
+    changes = tray_state.get_changes(f"{tray_state.epoch}-{counter + 100}")
+    assert changes["full"] is True
+    assert changes["removed"] == []
+    assert len(changes["trays"]) == 2
+
+
+def test_tray_state_other_epoch() -> None:
+    """
+    Test TrayState.get_changes returns every tray for a version handed out by the tray state of a previous connection
+    :return: None
+    """
+    snapshot = AmsSnapshot("X1")
+    previous = TrayState()
+    previous.update(make_printer(), snapshot)
+    previous.update(make_printer(remain=70), snapshot)
+    version = previous.get_version()
+
+    # Reconnected, so the counter restarts and is behind the version the client saw
+    tray_state = TrayState()
+    tray_state.update(make_printer(remain=70), snapshot)
+    tray_state.update(make_printer(remain=60), snapshot)
+    tray_state.update(make_printer(remain=50), snapshot)
+    changes = tray_state.get_changes(version)
+    assert changes["full"] is True
+    assert len(changes["trays"]) == 2
+    assert tray_state.get_changes("not-a-version")["full"] is True
@@ -0,0 +1,242 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from spoolman_bambu import env, state
+from spoolman_bambu.api.v1.router import app
+from spoolman_bambu.bambu import ams_processor
+from spoolman_bambu.bambu.color_match import FilamentColorIndex
+from spoolman_bambu.bambu.jobs import JobTracker
+from spoolman_bambu.bambu.models import Printer, Tray
+from spoolman_bambu.bambu.print_sync import HeldTrays
+from spoolman_bambu.bambu.snapshot import AmsSnapshot
+from spoolman_bambu.bambu.tray_state import TrayState
+from spoolman_bambu.exceptions import SpoolmanUnavailableError
+from spoolman_bambu.spoolman.index import SpoolIndex
+
+EXTERNAL_FILAMENTS = [
+    {"id": "bambulab_pla_basic_red", "color_hex": "FF0000", "color_hexes": None},
+    {"id": "bambulab_pla_basic_black", "color_hex": "000000", "color_hexes": None},
+]
+INTERNAL_FILAMENTS = [
+    {"id": 1, "external_id": "bambulab_pla_basic_red"},
+    {"id": 2, "external_id": "bambulab_pla_basic_black"},
+]
+
+
+def build_tray(
+    slot="A0", tray_type="PLA", remain=50, color="FF0000FF", tray_uuid=None, sub_brands=None, colors=()
+) -> Tray:
+    """Build a tray as reported by the printer, a tray_type of None builds an empty slot."""
+    tray = {"id": slot[1:]}
+    if tray_type is not None:
+        tray.update(
+            {
+                "tray_uuid": tray_uuid or f"UUID{slot}",
+                "tray_type": tray_type,
+                "tray_sub_brands": sub_brands or f"{tray_type} Basic",
+                "tray_color": color,
+                "cols": list(colors),
+                "remain": remain,
+                "tray_weight": "1000",
+            }
+        )
+    return Tray.from_report(slot[0], tray)
+
+
+class FakeSpoolman:
+    """In-memory Spoolman client, recording the list fetches and writes made to it."""
+
+    def __init__(self):
+        self.index = SpoolIndex(None)
+        self.tag = env.get_settings().spoolman_tag_api
+        self.spools: dict[int, dict] = {}
+        self.filaments = list(INTERNAL_FILAMENTS)
+        self.color_index = FilamentColorIndex(EXTERNAL_FILAMENTS, 10)
+        self.available = True
+        self.list_fetches = 0
+        self.patches = []
+        self.creates = []
+        # The spool list as if it were cached, None as if it weren't
+        self.cached_spools = None
+
+    def add_spool(self, spool_id, external_id, tray_uuid=None, remaining_weight=500.0, location="X1") -> dict:
+        filament = next(filament for filament in self.filaments if filament["external_id"] == external_id)
+        spool = {
+            "id": spool_id,
+            "filament": filament,
+            "remaining_weight": remaining_weight,
+            "location": location,
+            "first_used": None,
+            "extra": {self.tag: f'"{tray_uuid}"'} if tray_uuid is not None else {},
+        }
+        self.spools[spool_id] = spool
+        self.index.record_spool(spool, self.tag)
+        return spool
+
+    def is_sync_paused(self):
+        return not self.available
+
+    def get_vendor_id(self):
+        return 1
+
+    def get_spools(self):
+        self.list_fetches += 1
+        return [dict(spool) for spool in self.spools.values()]
+
+    def get_cached_spools(self):
+        return self.cached_spools
+
+    def get_internal_filament(self):
+        self.list_fetches += 1
+        return list(self.filaments)
+
+    def get_external_color_index(self):
+        return self.color_index
+
+    def patch_spool(self, spool_id, spool_data):
+        if not self.available:
+            # The real client journals the write before raising
+            raise SpoolmanUnavailableError("Spoolman sync is paused, patch journaled for replay")
+        self.patches.append((spool_id, spool_data))
+        spool = self.spools.get(spool_id)
+        if spool is None:
+            # Spoolman rejects a patch of a spool that has been removed
+            return None
+        spool.update({**spool_data, "extra": {**spool["extra"], **spool_data.get("extra", {})}})
+        self.index.record_spool(spool, self.tag)
+        return dict(spool)
+
+    def create_spool(self, spool_data):
+        self.creates.append(spool_data)
+        filament = next(filament for filament in self.filaments if filament["id"] == spool_data["filament_id"])
+        spool = {
+            "id": max(self.spools, default=0) + 1,
+            "filament": filament,
+            "remaining_weight": spool_data["initial_weight"],
+            "location": spool_data["location"],
+            "first_used": spool_data["first_used"],
+            "extra": spool_data["extra"],
+        }
+        self.spools[spool["id"]] = spool
+        self.index.record_spool(spool, self.tag)
+        return dict(spool)
+
+
+class FakeBambu:
+    """Printer that never connects, its AMS reports are fed in by the test."""
+
+    def __init__(self, printer_id, printer_ip, printer_code):
+        self.printer_id = printer_id
+        self.printer_ip = printer_ip
+        self.printer_code = printer_code
+        self.status = "connected"
+        self.stopped = False
+        self.printer_state = None
+        self.snapshot = AmsSnapshot(printer_id)
+        self.tray_state = TrayState()
+        self.held_trays = HeldTrays()
+        self.job_tracker = JobTracker(printer_id, None)
+
+    def report(self, ams_units) -> None:
+        self.printer_state = Printer.from_report(self.printer_id, ams_units)
+        self.tray_state.update(self.printer_state, self.snapshot)
+
+    def set_synced_tray(self, slot, fingerprint, spool):
+        tray = next((tray for tray in self.printer_state.get_trays() if tray.slot == slot), None)
+        if tray is None or tray.fingerprint() != fingerprint:
+            return False
+        ams_processor.set_synced_slot(self.printer_id, self.snapshot, fingerprint, tray, spool)
+        self.tray_state.update(self.printer_state, self.snapshot)
+        return True
+
+    def stop(self):
+        self.stopped = True
+        self.status = "disconnected"
+
+    def get_printer_id(self):
+        return self.printer_id
+
+    def get_printer_ip(self):
+        return self.printer_ip
+
+    def get_printer_code(self):
+        return self.printer_code
+
+    def get_status(self):
+        return self.status
+
+    def get_printer_state(self):
+        return self.printer_state
+
+    def get_ams_unit_count(self):
+        return len(self.printer_state.ams_units) if self.printer_state is not None else 0
+
+    def get_ams_active_spools_count(self):
+        return len(self.printer_state.get_trays()) if self.printer_state is not None else 0
+
+    def get_last_mqtt_message(self):
+        return None
+
+    def get_last_mqtt_ams_message(self):
+        return None
+
+    def get_tray_state(self):
+        return self.tray_state
+
+    def get_held_trays(self):
+        return self.held_trays
+
+    def get_job_tracker(self):
+        return self.job_tracker
+
+
+@pytest.fixture
+def make_tray():
+    """Factory of trays as reported by the printer."""
+    return build_tray
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Resolve the settings afresh, with a temporary data directory, for the duration of a test."""
+    monkeypatch.setenv("SPOOLMAN_BAMBU_DIR_DATA", str(tmp_path))
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_IP", "192.168.1.2")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_PORT", "7912")
+    monkeypatch.setattr(env, "_settings", None)
+    monkeypatch.setattr(env, "_settings_listeners", [])
+    return tmp_path
+
+
+@pytest.fixture
+def spoolman(data_dir, monkeypatch) -> FakeSpoolman:
+    """Install an in-memory Spoolman client as the app's Spoolman for the duration of a test."""
+    fake_spoolman = FakeSpoolman()
+    monkeypatch.setattr(state.get_current_state(), "_spoolman", fake_spoolman)
+    return fake_spoolman
+
+
+@pytest.fixture
+def client(data_dir, monkeypatch):
+    """Serve the v1 API against an empty app state, with printers that never connect, for the duration of a test."""
+    app_state = state.get_current_state()
+    monkeypatch.setattr(app_state, "_printers", [])
+    monkeypatch.setattr(app_state, "_printer_numbers", {})
+    for attribute in ("_spools", "_inventory", "_alerts", "_alert_delivery", "_job_ledger"):
+        monkeypatch.setattr(app_state, attribute, None)
+    monkeypatch.setattr("spoolman_bambu.api.v1.printer.Bambu", FakeBambu)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def add_printer(client):
+    """Factory of connected printers, added to the app state as if they were configured."""
+
+    def add(printer_id, ams_units=None) -> FakeBambu:
+        printer = FakeBambu(printer_id, "192.168.1.4", "AAAA")
+        if ams_units is not None:
+            printer.report(ams_units)
+        state.get_current_state().add_printer(printer)
+        return printer
+
+    return add
@@ -0,0 +1,112 @@
+import pytest
+import logging
+
+from spoolman_bambu.bambu.models import Printer
+from spoolman_bambu.history.analytics import FleetAnalytics
+from spoolman_bambu.history.timeseries import TimeSeriesStore
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def make_ams_unit(*trays) -> dict:
+    return {
+        "id": "0",
+        "humidity": "4",
+        "temp": "24.5",
+        "tray": [
+            {
+                "id": str(index),
+                "tray_uuid": tray.tray_uuid,
+                "tray_type": tray.tray_type,
+                "tray_sub_brands": tray.sub_brands,
+                "tray_color": tray.color,
+                "remain": tray.remain,
+                "tray_weight": "1000",
+            }
+            for index, tray in enumerate(trays)
+        ],
+    }
+
+
+def test_analytics_consumption_and_groups(make_tray) -> None:
+    """
+    Test analytics sum drops in remaining %, ignore refills and group spools by material
+    :return: None
+    """
+    history = TimeSeriesStore(None, sample_interval=0)
+    trays = {("X1", "A0"): make_tray("A0"), ("X1", "A1"): make_tray("A1", "PETG")}
+    for timestamp, remain in ((0, 80), (1800, 70), (2400, 90), (3600, 85)):
+        history.record("X1", f"{trays[('X1', 'A0')].tray_uuid}.spool", timestamp, remain)
+    for timestamp, remain in ((0, 60), (3600, 50)):
+        history.record("X1", f"{trays[('X1', 'A1')].tray_uuid}.spool", timestamp, remain)
+
+    result = FleetAnalytics(history).get_analytics(3600, trays, 3600)
+
+    spools = {spool["slot"]: spool for spool in result["spools"]}
+    assert spools["A0"]["grams_consumed"] == pytest.approx(150.0)
+    assert spools["A0"]["remaining_weight"] == pytest.approx(850.0)
+    assert spools["A0"]["usage_rate"] == pytest.approx(150.0)
+    assert spools["A1"]["run_out"].timestamp() == pytest.approx(3600 + 5 * 3600)
+    assert [group["key"] for group in result["materials"]] == ["PLA", "PETG"]
+    assert result["printers"][0]["grams_consumed"] == pytest.approx(250.0)
+
+
+def test_analytics_cached_until_new_sample(make_tray) -> None:
+    """
+    Test analytics are reused for a window until the history records a new spool sample
+    :return: None
+    """
+    history = TimeSeriesStore(None, sample_interval=0)
+    tray = make_tray("A0")
+    history.record("X1", f"{tray.tray_uuid}.spool", 0, 80)
+    trays = {("X1", "A0"): tray}
+    fleet_analytics = FleetAnalytics(history)
+
+    result = fleet_analytics.get_analytics(3600, trays, 3600)
+    assert fleet_analytics.get_analytics(3600, trays, 3601) is result
+
+    history.record("X1", "A.humidity", 3000, 4)
+    history.record("X1", "A0.remain", 3000, 70)
+    assert fleet_analytics.get_analytics(3600, trays, 3602) is result
+
+    history.record("X1", f"{tray.tray_uuid}.spool", 3000, 70)
+    assert fleet_analytics.get_analytics(3600, trays, 3603) is not result
+
+
+def test_analytics_spool_swap_not_consumption(make_tray) -> None:
+    """
+    Test swapping a fuller spool out of a slot for an emptier one isn't counted as consumption
+    :return: None
+    """
+    history = TimeSeriesStore(None, sample_interval=0)
+    full, empty = make_tray("A0", remain=90), make_tray("A1", remain=20)
+    history.record_printer(Printer.from_report("X1", [make_ams_unit(full, empty)]), 0)
+    # The spools are swapped between the slots
+    history.record_printer(Printer.from_report("X1", [make_ams_unit(empty, full)]), 1800)
+
+    result = FleetAnalytics(history).get_analytics(3600, {("X1", "A0"): empty, ("X1", "A1"): full}, 3600)
+    assert [spool["grams_consumed"] for spool in result["spools"]] == [0.0, 0.0]
+
+
+def test_analytics_counts_used_up_spools(make_tray, tmp_path) -> None:
+    """
+    Test a spool used up and unloaded during the window is still counted, from the metadata of its series
+    :return: None
+    """
+    history = TimeSeriesStore(tmp_path, sample_interval=0)
+    tray = make_tray("A0", "PETG", remain=20)
+    history.record_printer(Printer.from_report("X1", [make_ams_unit(tray)]), 0)
+    used_up = make_ams_unit(tray)
+    used_up["tray"][0]["remain"] = 0
+    history.record_printer(Printer.from_report("X1", [used_up]), 1800)
+    history.record_printer(Printer.from_report("X1", [{"id": "0", "tray": [{"id": "0"}]}]), 2400)
+
+    restored = TimeSeriesStore(tmp_path)
+    restored.load()
+    result = FleetAnalytics(restored).get_analytics(3600, {}, 3600)
+    [spool] = result["spools"]
+    assert (spool["slot"], spool["tray_uuid"], spool["material"], spool["remain"]) == (None, tray.tray_uuid, "PETG", 0)
+    assert spool["grams_consumed"] == pytest.approx(200.0)
+    assert [(group["key"], group["grams_consumed"]) for group in result["materials"]] == [("PETG", 200.0)]
+    assert [group["key"] for group in result["printers"]] == ["X1"]
@@ -0,0 +1,158 @@
+import os
+import pytest
+import logging
+
+from spoolman_bambu.bambu.models import Printer
+from spoolman_bambu.history import timeseries
+from spoolman_bambu.history.timeseries import RingBuffer, Series, TimeSeriesStore
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+AMS_UNIT = {
+    "id": "0",
+    "humidity": "4",
+    "temp": "24.5",
+    "tray": [
+        {
+            "id": "0",
+            "tray_uuid": "0123456789ABCDEF0123456789ABCDEF",
+            "tray_sub_brands": "PLA Basic",
+            "tray_color": "FF0000FF",
+            "remain": 80,
+            "tray_weight": "1000",
+        }
+    ],
+}
+
+
+def test_ring_buffer_overwrites_oldest() -> None:
+    """
+    Test RingBuffer keeps only the newest samples once full and range queries them in order
+    :return: None
+    """
+    ring = RingBuffer(3)
+    for timestamp in range(5):
+        ring.append(float(timestamp), timestamp * 10.0)
+
+    assert len(ring) == 3
+    assert ring.range(0, 10) == [(2.0, 20.0), (3.0, 30.0), (4.0, 40.0)]
+    assert ring.range(3, 3) == [(3.0, 30.0)]
+    assert ring.latest() == (4.0, 40.0)
+
+
+def test_ring_buffer_grows_lazily() -> None:
+    """
+    Test RingBuffer only holds the samples appended so far until it reaches its capacity
+    :return: None
+    """
+    ring = RingBuffer(1000)
+    ring.append(1.0, 10.0)
+    ring.append(2.0, 20.0)
+
+    assert len(ring.times) == 2
+    assert ring.range(0, 10) == [(1.0, 10.0), (2.0, 20.0)]
+    assert ring.covers(0)
+
+
+def test_series_downsamples() -> None:
+    """
+    Test Series averages samples into minute buckets
+    :return: None
+    """
+    series = Series("A0.remain")
+    series.append(0, 10)
+    series.append(30, 20)
+    series.append(60, 40)
+
+    assert series.query(0, 120, "minute") == ("minute", [(0, 15.0), (60, 40.0)])
+    assert series.query(0, 120) == ("raw", [(0, 10), (30, 20), (60, 40)])
+
+
+def test_store_sample_interval() -> None:
+    """
+    Test TimeSeriesStore drops samples inside the sample interval and unchanged values inside the heartbeat
+    :return: None
+    """
+    history = TimeSeriesStore(None, sample_interval=30, heartbeat_interval=600)
+    assert history.record("X1", "A0.remain", 0, 80)
+    assert not history.record("X1", "A0.remain", 10, 79)
+    assert not history.record("X1", "A0.remain", 100, 80)
+    assert history.record("X1", "A0.remain", 100, 79)
+    assert history.record("X1", "A0.remain", 700, 79)
+
+
+def test_store_persists_and_loads(tmp_path) -> None:
+    """
+    Test recorded samples are restored from the segment files by a new store
+    :return: None
+    """
+    history = TimeSeriesStore(tmp_path)
+    history.record_printer(Printer.from_report("X1", [AMS_UNIT]), 1000)
+
+    restored = TimeSeriesStore(tmp_path)
+    restored.load()
+    assert restored.get_series_names("X1") == [
+        "0123456789ABCDEF0123456789ABCDEF.spool",
+        "A.humidity",
+        "A.temp",
+        "A0.remain",
+    ]
+    assert restored.query("X1", "A0.remain", 0, 2000) == ("raw", [(1000, 80)])
+
+
+def test_store_appends_to_open_segment(tmp_path) -> None:
+    """
+    Test samples appended through the open segment file are read back, and reading releases the mapping
+    :return: None
+    """
+    history = TimeSeriesStore(tmp_path, sample_interval=0)
+    for timestamp in range(3):
+        history.record("X1", "A0.remain", timestamp * 60, 80 - timestamp)
+
+    restored = TimeSeriesStore(tmp_path)
+    restored.load()
+    assert restored.query("X1", "A0.remain", 0, 200) == ("raw", [(0, 80), (60, 79), (120, 78)])
+
+    history.record("X1", "A0.remain", 180, 77)
+    history.close()
+    assert list(history.writers.values())[0].file is None
+
+
+def test_store_bounds_open_writers(tmp_path, monkeypatch) -> None:
+    """
+    Test only the most recently written segment files are kept open, and closed writers reopen their segment
+    :return: None
+    """
+    monkeypatch.setattr(timeseries, "MAX_OPEN_WRITERS", 2)
+    history = TimeSeriesStore(tmp_path, sample_interval=0)
+    for spool in range(5):
+        history.record("X1", f"UUID{spool}.spool", 0, 80)
+    history.record("X1", "UUID0.spool", 60, 70)
+
+    assert list(history.writers) == [("X1", "UUID4.spool"), ("X1", "UUID0.spool")]
+    restored = TimeSeriesStore(tmp_path)
+    restored.load()
+    assert restored.query("X1", "UUID0.spool", 0, 100) == ("raw", [(0, 80), (60, 70)])
+    assert len(restored.get_series_names("X1")) == 5
+
+
+def test_store_expires_idle_series(tmp_path) -> None:
+    """
+    Test series without a sample for the TTL are dropped with their segment files
+    :return: None
+    """
+    history = TimeSeriesStore(tmp_path, sample_interval=0, series_ttl=3600)
+    history.record("X1", "UUID0.spool", 0, 80)
+    history.record("X1", "UUID1.spool", 0, 80)
+    history.record("X1", "UUID1.spool", 3000, 70)
+    version = history.get_version("spool")
+
+    assert history.expire(4000) == 1
+    assert history.get_series_names("X1") == ["UUID1.spool"]
+    assert history.get_version("spool") != version
+    assert [path.name for path in tmp_path.joinpath("X1").glob("*.seg")] == ["UUID1.spool.000000.seg"]
+
+    assert history.expire(7000) == 1
+    assert history.series == {}
+    assert history.writers == {}
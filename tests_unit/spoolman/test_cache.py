@@ -0,0 +1,135 @@
+import os
+import pytest
+import logging
+import threading
+import time
+
+from spoolman_bambu.spoolman.cache import RESOURCE_SPOOL, RESOURCE_VENDOR, ResponseCache
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+KEY = ("http://spoolman/api/v1/spool", ())
+
+
+def test_cache_hit_returns_copy() -> None:
+    """
+    Test a stored response is served until it expires, as a copy callers can modify
+    :return: None
+    """
+    cache = ResponseCache()
+    value, entry, generation = cache.lookup(RESOURCE_SPOOL, KEY)
+    assert value is None and entry is None
+    cache.store(RESOURCE_SPOOL, KEY, [{"id": 1}], generation)
+
+    value, _, _ = cache.lookup(RESOURCE_SPOOL, KEY)
+    value.append({"id": 2})
+    assert cache.lookup(RESOURCE_SPOOL, KEY)[0] == [{"id": 1}]
+    assert cache.get_stats()[RESOURCE_SPOOL]["hits"] == 2
+    assert cache.get_stats()[RESOURCE_SPOOL]["misses"] == 1
+
+
+def test_cache_invalidate_drops_in_flight_response() -> None:
+    """
+    Test invalidating a resource drops its entries and a response fetched before the write is not stored
+    :return: None
+    """
+    cache = ResponseCache()
+    _, _, generation = cache.lookup(RESOURCE_SPOOL, KEY)
+    cache.store(RESOURCE_VENDOR, ("vendor", ()), [], 0)
+    cache.invalidate(RESOURCE_SPOOL)
+    cache.store(RESOURCE_SPOOL, KEY, [{"id": 1}], generation)
+
+    assert cache.lookup(RESOURCE_SPOOL, KEY)[0] is None
+    assert cache.lookup(RESOURCE_VENDOR, ("vendor", ()))[0] == []
+
+
+def test_cache_expired_entry_revalidated() -> None:
+    """
+    Test an expired entry is returned for revalidation and refreshed on a 304
+    :return: None
+    """
+    cache = ResponseCache({RESOURCE_SPOOL: 0})
+    cache.store(RESOURCE_SPOOL, KEY, [{"id": 1}], 0, etag='"abc"')
+
+    value, entry, generation = cache.lookup(RESOURCE_SPOOL, KEY)
+    assert value is None
+    assert entry.get_validators() == {"If-None-Match": '"abc"'}
+    assert cache.refresh(RESOURCE_SPOOL, KEY, entry, generation) == [{"id": 1}]
+
+    cache.invalidate(RESOURCE_SPOOL)
+    assert cache.refresh(RESOURCE_SPOOL, KEY, entry, generation) is None
+
+
+def test_cache_coalesce_shares_in_flight_fetch() -> None:
+    """
+    Test concurrent coalesced fetches of the same request share a single fetch, each getting its own copy
+    :return: None
+    """
+    cache = ResponseCache()
+    started = threading.Event()
+    release = threading.Event()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        started.set()
+        release.wait(5)
+        return [{"id": 1}]
+
+    results = []
+
+    def get():
+        results.append(cache.coalesce(RESOURCE_SPOOL, KEY, 0, fetch))
+
+    leader = threading.Thread(target=get)
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=get) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    # Wait until every follower has joined the flight
+    while cache.get_stats()[RESOURCE_SPOOL]["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert len(fetches) == 1
+    assert results == [[{"id": 1}]] * 4
+    assert len({id(result) for result in results}) == 4
+    assert cache.flights == {}
+
+
+def test_cache_coalesce_window() -> None:
+    """
+    Test a completed fetch is reused within the window, but not after the resource is written to or on error
+    :return: None
+    """
+    cache = ResponseCache(coalesce_window=60)
+    assert cache.coalesce(RESOURCE_SPOOL, KEY, 0, lambda: [1]) == [1]
+    assert cache.coalesce(RESOURCE_SPOOL, KEY, 0, lambda: [2]) == [1]
+    assert cache.coalesce(RESOURCE_SPOOL, KEY, 1, lambda: [3]) == [3]
+
+    def fail():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        cache.coalesce(RESOURCE_VENDOR, ("vendor", ()), 0, fail)
+    assert cache.coalesce(RESOURCE_VENDOR, ("vendor", ()), 0, lambda: [4]) == [4]
+
+
+def test_cache_peek() -> None:
+    """
+    Test peek only returns fresh responses of the resource
+    :return: None
+    """
+    cache = ResponseCache({RESOURCE_SPOOL: 30})
+    assert cache.peek(RESOURCE_SPOOL, KEY) is None
+
+    cache.store(RESOURCE_SPOOL, KEY, [{"id": 1}], 0)
+    assert cache.peek(RESOURCE_SPOOL, KEY) == [{"id": 1}]
+    assert cache.peek(RESOURCE_VENDOR, KEY) is None
+
+    cache.invalidate(RESOURCE_SPOOL)
+    assert cache.peek(RESOURCE_SPOOL, KEY) is None
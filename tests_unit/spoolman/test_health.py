@@ -0,0 +1,103 @@
+import asyncio
+import os
+import pytest
+import logging
+import httpx
+
+from spoolman_bambu.spoolman.health import HealthMonitor
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+class FakeJournal:
+    def get_pending_count(self):
+        return 0
+
+
+class FakeSpoolman:
+    def __init__(self):
+        self.base_url = "http://spoolman"
+        self.status = "disconnected"
+        self.last_status_check = None
+        self.journal = FakeJournal()
+
+    def get_status(self):
+        return self.status
+
+    def set_status(self, status):
+        self.status = status
+
+    def set_last_status_check(self, timestamp):
+        self.last_status_check = timestamp
+
+
+def test_interval_backs_off_while_disconnected() -> None:
+    """
+    Test the probe interval is fast while disconnected, backs off, and is slow once healthy
+    :return: None
+    """
+    monitor = HealthMonitor(FakeSpoolman(), healthy_interval=600, degraded_interval=5, max_degraded_interval=30)
+    monitor.set_status("disconnected")
+    assert monitor.get_interval() == 5
+    monitor.set_status("disconnected")
+    assert monitor.get_interval() == 10
+    monitor.set_status("disconnected")
+    monitor.set_status("disconnected")
+    assert monitor.get_interval() == 30
+    monitor.set_status("connected")
+    assert monitor.get_interval() == 600
+
+
+@pytest.mark.asyncio
+async def test_probe_publishes_transitions() -> None:
+    """
+    Test probing publishes status transitions to listeners and tracks latency
+    :return: None
+    """
+    healthy = True
+
+    def handler(request):
+        return httpx.Response(200 if healthy else 500)
+
+    spoolman = FakeSpoolman()
+    monitor = HealthMonitor(spoolman, healthy_interval=600, degraded_interval=5, max_degraded_interval=30)
+    transitions = []
+    monitor.add_listener(lambda old, new: transitions.append((old, new)))
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        monitor.set_status(await monitor.probe(client))
+        monitor.set_status(await monitor.probe(client))
+        healthy = False
+        monitor.set_status(await monitor.probe(client))
+
+    # The first probe is always published, whatever the status was before the monitor started
+    assert transitions == [("unknown", "connected"), ("connected", "disconnected")]
+    assert spoolman.get_status() == "disconnected"
+    assert monitor.get_latency_stats()["last"] is not None
+
+
+@pytest.mark.asyncio
+async def test_run_survives_failed_check() -> None:
+    """
+    Test an unexpected error during a health check is logged and the monitor keeps probing
+    :return: None
+    """
+    results = [RuntimeError("Probe failed"), "connected"]
+
+    async def probe(client):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monitor = HealthMonitor(FakeSpoolman(), healthy_interval=600, degraded_interval=0, max_degraded_interval=0)
+    monitor.probe = probe
+    transitions = []
+    monitor.add_listener(lambda old, new: transitions.append((old, new)))
+
+    monitor.start()
+    while len(transitions) == 0:
+        await asyncio.sleep(0)
+    monitor.stop()
+    assert transitions == [("unknown", "connected")]
@@ -0,0 +1,65 @@
+import os
+import pytest
+import logging
+
+from spoolman_bambu.spoolman.index import SpoolIndex, get_spool_tray_uuid
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+TRAY_UUID = "0123456789ABCDEF0123456789ABCDEF"
+
+
+def make_spool(spool_id, tray_uuid=None, remaining_weight=800.0) -> dict:
+    return {
+        "id": spool_id,
+        "remaining_weight": remaining_weight,
+        "filament": {"id": 7, "external_id": "bambulab_pla_basic_red"},
+        "extra": {"tag": f'"{tray_uuid}"'} if tray_uuid is not None else {},
+    }
+
+
+def test_get_spool_tray_uuid() -> None:
+    """
+    Test get_spool_tray_uuid decodes the JSON tag and treats empty tags as unclaimed
+    :return: None
+    """
+    assert get_spool_tray_uuid(make_spool(1, TRAY_UUID), "tag") == TRAY_UUID
+    assert get_spool_tray_uuid({"extra": {"tag": '""'}}, "tag") is None
+    assert get_spool_tray_uuid({"extra": {}}, "tag") is None
+
+
+def test_index_record_spool() -> None:
+    """
+    Test record_spool binds the tray and filament, and moves the binding when the spool is claimed by another tray
+    :return: None
+    """
+    index = SpoolIndex(None)
+    index.record_spool(make_spool(1, TRAY_UUID), "tag")
+    assert index.get_binding(TRAY_UUID) == {"tray_uuid": TRAY_UUID, "spool_id": 1, "remaining_weight": 800.0}
+    assert index.get_filament_id("bambulab_pla_basic_red") == 7
+
+    index.record_spool(make_spool(1, "OTHER"), "tag")
+    assert index.get_binding(TRAY_UUID) is None
+    assert index.get_binding("OTHER")["spool_id"] == 1
+    assert index.get_spool_tray_uuid(1) == "OTHER"
+    assert index.get_spool_tray_uuid(2) is None
+
+
+def test_index_reconcile_persists(tmp_path) -> None:
+    """
+    Test reconcile replaces stale bindings and the index survives reopening
+    :return: None
+    """
+    path = tmp_path.joinpath("index.sqlite")
+    index = SpoolIndex(path)
+    index.record_spool(make_spool(1, "STALE"), "tag")
+    index.set_tray_slot("X1", "A0", TRAY_UUID)
+    index.reconcile([make_spool(2, TRAY_UUID, 500.0), make_spool(3)], [{"id": 9, "external_id": "ext"}], "tag")
+    index.close()
+
+    reopened = SpoolIndex(path)
+    assert reopened.get_binding("STALE") is None
+    assert reopened.get_binding(TRAY_UUID)["spool_id"] == 2
+    assert reopened.get_filament_id("ext") == 9
+    assert reopened.get_tray_uuid("X1", "A0") == TRAY_UUID
@@ -0,0 +1,113 @@
+import os
+import pytest
+import logging
+import requests
+
+from spoolman_bambu.spoolman.journal import WriteJournal, compact_entries
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+class FakeSpoolman:
+    def __init__(self, available=True):
+        self.available = available
+        self.sent = []
+
+    def send_create_spool(self, spool_data):
+        if not self.available:
+            raise requests.exceptions.ConnectionError("down")
+        self.sent.append(("create", None, spool_data))
+        return {"id": 1}
+
+    def send_patch_spool(self, spool_id, spool_data):
+        if not self.available:
+            raise requests.exceptions.ConnectionError("down")
+        self.sent.append(("patch", spool_id, spool_data))
+        return {"id": spool_id}
+
+
+def test_compact_entries_merges_patches() -> None:
+    """
+    Test compact_entries merges patches for the same spool, keeping the first position
+    :return: None
+    """
+    entries = [
+        {"op": "patch", "spool_id": 1, "data": {"remaining_weight": 900, "first_used": "a"}},
+        {"op": "patch", "spool_id": 2, "data": {"remaining_weight": 500}},
+        {"op": "patch", "spool_id": 1, "data": {"remaining_weight": 800, "first_used": "b"}},
+    ]
+    compacted = compact_entries(entries)
+
+    assert len(compacted) == 2
+    assert compacted[0]["spool_id"] == 1
+    assert compacted[0]["data"] == {"remaining_weight": 800, "first_used": "a"}
+    assert compacted[1]["spool_id"] == 2
+
+
+def test_compact_entries_merges_creates_for_same_tray() -> None:
+    """
+    Test compact_entries merges creates for the same tray tag
+    :return: None
+    """
+    entries = [
+        {"op": "create", "spool_id": None, "data": {"initial_weight": 900, "extra": {"tag": '"uuid"'}}},
+        {"op": "create", "spool_id": None, "data": {"initial_weight": 800, "extra": {"tag": '"uuid"'}}},
+    ]
+    compacted = compact_entries(entries)
+
+    assert len(compacted) == 1
+    assert compacted[0]["data"]["initial_weight"] == 800
+
+
+def test_journal_replay_in_order(tmp_path) -> None:
+    """
+    Test the journal is replayed in order and persists across instances until drained
+    :return: None
+    """
+    path = tmp_path / "journal.jsonl"
+    journal = WriteJournal(path, fsync_batch=1)
+    journal.record_patch(1, {"remaining_weight": 900})
+    journal.record_create({"initial_weight": 500, "extra": {"tag": '"uuid"'}})
+    journal.record_patch(1, {"remaining_weight": 800})
+    journal.flush()
+
+    restored = WriteJournal(path)
+    assert restored.get_pending_count() == 2
+
+    spoolman = FakeSpoolman(available=False)
+    assert restored.replay(spoolman) == 0
+    assert restored.get_pending_count() == 2
+
+    spoolman.available = True
+    assert restored.replay(spoolman) == 2
+    assert spoolman.sent[0] == ("patch", 1, {"remaining_weight": 800})
+    assert spoolman.sent[1][0] == "create"
+    assert WriteJournal(path).get_pending_count() == 0
+
+
+def test_journal_records_during_replay(tmp_path) -> None:
+    """
+    Test writes journaled while a replay is sending are neither blocked nor lost when the replay trims the journal
+    :return: None
+    """
+    path = tmp_path / "journal.jsonl"
+    journal = WriteJournal(path, fsync_batch=1)
+    journal.record_patch(1, {"remaining_weight": 900})
+
+    class ConcurrentSpoolman(FakeSpoolman):
+        def send_patch_spool(self, spool_id, spool_data):
+            # An MQTT thread journaling a newer write of the same spool while this one is being sent
+            if len(self.sent) == 0:
+                journal.record_patch(1, {"remaining_weight": 800})
+            return super().send_patch_spool(spool_id, spool_data)
+
+    spoolman = ConcurrentSpoolman()
+    assert journal.replay(spoolman) == 1
+    assert spoolman.sent == [("patch", 1, {"remaining_weight": 900})]
+    assert journal.get_pending_count() == 1
+    assert WriteJournal(path).entries[0]["data"] == {"remaining_weight": 800}
+
+    assert journal.replay(spoolman) == 1
+    assert spoolman.sent[-1] == ("patch", 1, {"remaining_weight": 800})
+    assert WriteJournal(path).get_pending_count() == 0
@@ -0,0 +1,59 @@
+import os
+import pytest
+import logging
+import threading
+import time
+
+from spoolman_bambu.spoolman.locks import KeyedLock
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_keyed_lock_serialises_same_key() -> None:
+    """
+    Test KeyedLock only lets one thread at a time hold a key, and drops the lock once released
+    :return: None
+    """
+    locks = KeyedLock("tray")
+    holding = []
+    overlaps = []
+
+    def write(key):
+        with locks.hold(key):
+            holding.append(key)
+            if holding.count(key) > 1:
+                overlaps.append(key)
+            time.sleep(0.01)
+            holding.remove(key)
+
+    threads = [threading.Thread(target=write, args=("UUID0",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == []
+    assert locks.get_held_count() == 0
+
+
+def test_keyed_lock_parallel_keys() -> None:
+    """
+    Test KeyedLock lets different keys be held at the same time, and a thread take a key it already holds
+    :return: None
+    """
+    locks = KeyedLock("filament")
+    other_held = threading.Event()
+
+    def hold_other():
+        with locks.hold("bambulab_pla_basic_black"):
+            other_held.set()
+
+    with locks.hold("bambulab_pla_basic_red"):
+        with locks.hold("bambulab_pla_basic_red"):
+            thread = threading.Thread(target=hold_other)
+            thread.start()
+            assert other_held.wait(5)
+            thread.join()
+        assert locks.get_held_count() == 1
+    assert locks.get_held_count() == 0
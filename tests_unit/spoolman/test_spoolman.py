@@ -0,0 +1,138 @@
+import os
+import json
+import pytest
+import logging
+import requests
+
+from spoolman_bambu.spoolman import spoolman
+from spoolman_bambu.spoolman.cache import ResponseCache
+from spoolman_bambu.spoolman.spoolman import Spoolman, cache_external_filaments, iter_json_array
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+class FakeResponse:
+    def __init__(self, items, total):
+        self.status_code = 200
+        self.items = items
+        self.headers = {"x-total-count": str(total)}
+
+    def json(self):
+        return list(self.items) if isinstance(self.items, list) else dict(self.items)
+
+    def raise_for_status(self):
+        pass
+
+
+def make_spoolman(vendor_id=None) -> Spoolman:
+    instance = Spoolman.__new__(Spoolman)
+    instance.base_url = "http://spoolman"
+    instance.timeout = 5
+    instance.vendor_id = vendor_id
+    instance.cache = ResponseCache()
+    return instance
+
+
+def test_get_spools_fetches_filtered_pages(monkeypatch) -> None:
+    """
+    Test get_spools filters server side and merges every page in offset order
+    :return: None
+    """
+    spools = [{"id": spool_id} for spool_id in range(250)]
+    requests_made = []
+
+    def fake_get(url, params, timeout):
+        requests_made.append(params)
+        return FakeResponse(spools[params["offset"] : params["offset"] + params["limit"]], len(spools))
+
+    monkeypatch.setattr(spoolman, "PAGE_SIZE", 100)
+    monkeypatch.setattr(requests, "get", fake_get)
+    assert make_spoolman(vendor_id=3).get_spools() == spools
+    assert sorted(params["offset"] for params in requests_made) == [0, 100, 200]
+    assert all(params["filament.vendor.id"] == 3 for params in requests_made)
+    assert all(params["allow_archived"] == "false" for params in requests_made)
+    assert all(params["sort"] == "id:asc" for params in requests_made)
+
+
+def test_get_spools_dedupes_shifted_pages(monkeypatch) -> None:
+    """
+    Test a spool returned on two pages, as the pages shifted between requests, is only returned once
+    :return: None
+    """
+    spools = [{"id": spool_id} for spool_id in range(150)]
+
+    def fake_get(url, params, timeout):
+        offset = params["offset"]
+        if offset > 0:
+            # The pages shifted after the first was fetched, so spool 99 is returned again
+            offset -= 1
+        return FakeResponse(spools[offset : offset + params["limit"]], len(spools))
+
+    monkeypatch.setattr(spoolman, "PAGE_SIZE", 100)
+    monkeypatch.setattr(requests, "get", fake_get)
+    assert make_spoolman().get_spools() == spools
+
+
+def test_get_spools_page_failure(monkeypatch) -> None:
+    """
+    Test get_spools reports an error if any page can't be fetched
+    :return: None
+    """
+
+    def fake_get(url, params, timeout):
+        if params["offset"] > 0:
+            raise requests.exceptions.ConnectionError("down")
+        return FakeResponse([{"id": 1}], 200)
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    assert not isinstance(make_spoolman().get_spools(), list)
+
+
+def test_iter_json_array_across_chunks() -> None:
+    """
+    Test iter_json_array yields every element however the document is split into chunks
+    :return: None
+    """
+    filaments = [{"id": "eSun_pla", "name": "PLA [red], blue"}, {"id": "bambulab_pla_basic", "weight": 1000}]
+    document = json.dumps(filaments)
+    for size in (1, 5, len(document)):
+        chunks = (document[index : index + size] for index in range(0, len(document), size))
+        assert list(iter_json_array(chunks)) == filaments
+
+    assert cache_external_filaments(iter_json_array([document])) == filaments[1:]
+
+
+def test_iter_json_array_truncated() -> None:
+    """
+    Test iter_json_array raises if the document ends before the array is closed
+    :return: None
+    """
+    with pytest.raises(ValueError):
+        list(iter_json_array(['[{"id": "bambulab_pla"}, {"id"']))
+
+
+def test_get_spools_cached_until_write(monkeypatch) -> None:
+    """
+    Test get_spools is served from the cache until a spool is patched
+    :return: None
+    """
+    requests_made = []
+
+    def fake_get(url, params, timeout):
+        requests_made.append(params)
+        return FakeResponse([{"id": 1}], 1)
+
+    def fake_patch(url, json, timeout):
+        return FakeResponse({"id": 1}, 1)
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    monkeypatch.setattr(requests, "patch", fake_patch)
+    instance = make_spoolman()
+    instance.update_index = lambda spool: None
+    assert instance.get_spools() == instance.get_spools()
+    assert len(requests_made) == 1
+
+    instance.send_patch_spool(1, {"remaining_weight": 10})
+    instance.get_spools()
+    assert len(requests_made) == 2
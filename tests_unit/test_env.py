@@ -2,7 +2,8 @@ import os
 import pytest
 import logging
 
-from spoolman_bambu.env import convert_id_to_char, get_logging_level
+from spoolman_bambu import env
+from spoolman_bambu.env import convert_id_to_char, get_logging_level, get_settings
 
 # Set Logging
 logging.basicConfig(level=logging.BASIC_FORMAT)
@@ -77,3 +78,64 @@ def test_get_logging_level_critical() -> None:
     os.environ["SPOOLMAN_BAMBU_LOGGING_LEVEL"] = "CRITICAL"
     response = get_logging_level()
     assert response == logging.CRITICAL
+
+
+def test_get_settings_cached(tmp_path, monkeypatch) -> None:
+    """
+    Test get_settings resolves the settings once, later configuration changes take effect on reload
+    :return: None
+    """
+    monkeypatch.setenv("SPOOLMAN_BAMBU_DIR_DATA", str(tmp_path))
+    monkeypatch.setenv("SPOOLMAN_BAMBU_LOGGING_LEVEL", "INFO")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_IP", "192.168.1.2")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_PORT", "7912")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_TAG", "Bambu")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_ALERT_WEBHOOKS", "http://a, http://b")
+    monkeypatch.setattr(env, "_settings", None)
+    settings = get_settings()
+    assert settings.data_dir == tmp_path.resolve()
+    assert settings.history_dir == tmp_path.resolve().joinpath("history")
+    assert settings.spoolman_tag_api == "bambu"
+    assert settings.alert_webhooks == ("http://a", "http://b")
+
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_TAG", "Other")
+    assert get_settings() is settings
+    assert get_settings().spoolman_tag == "Bambu"
+
+
+def test_reload_settings(data_dir, monkeypatch) -> None:
+    """
+    Test reloading the settings notifies the listeners, keeping the settings that only change on restart
+    :return: None
+    """
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_TAG", "Bambu")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_PUSHALL_INTERVAL", "600")
+    settings = get_settings()
+    reloaded = []
+    env.add_settings_listener(reloaded.append)
+
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_TAG", "Other")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_PUSHALL_INTERVAL", "300")
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_PORT", "7913")
+    assert env.reload_settings() is get_settings()
+    assert reloaded == [get_settings()]
+    assert (settings.pushall_interval, get_settings().pushall_interval) == (600, 300)
+    assert get_settings().spoolman_port == "7913"
+    assert get_settings().spoolman_tag == "Bambu"
+    assert get_settings().data_dir == settings.data_dir
+
+
+def test_reload_settings_listener_fails(data_dir) -> None:
+    """
+    Test a failing settings listener doesn't stop the other listeners being notified
+    :return: None
+    """
+    reloaded = []
+
+    def fail(settings) -> None:
+        raise ValueError("Failed")
+
+    env.add_settings_listener(fail)
+    env.add_settings_listener(reloaded.append)
+    env.reload_settings()
+    assert reloaded == [get_settings()]
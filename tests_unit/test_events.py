@@ -0,0 +1,63 @@
+import asyncio
+import os
+import pytest
+import logging
+import threading
+
+from spoolman_bambu.events import EventRing
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def test_event_ring_replay() -> None:
+    """
+    Test EventRing.get_since replays the missed events and returns None once they have been dropped
+    :return: None
+    """
+    ring = EventRing(capacity=3)
+    assert ring.get_since(0) == []
+
+    for index in range(5):
+        ring.publish("ams", {"index": index})
+    assert ring.get_sequence() == 5
+
+    assert [event[0] for event in ring.get_since(2)] == [3, 4, 5]
+    assert [event[3]["index"] for event in ring.get_since(3)] == [3, 4]
+    assert ring.get_since(5) == []
+    # Event 2 has been dropped, so a client that last saw event 1 can't be caught up
+    assert ring.get_since(1) is None
+    # Handed out before a restart
+    assert ring.get_since(6) is None
+
+
+def test_event_ring_wait() -> None:
+    """
+    Test EventRing.wait wakes a stream for an event published from another thread
+    :return: None
+    """
+    ring = EventRing()
+
+    async def wait_for_event():
+        threading.Timer(0.05, ring.publish, ("sync", {"spool_id": 1})).start()
+        await ring.wait(0, 5)
+        return ring.get_since(0)
+
+    events = asyncio.run(wait_for_event())
+    assert [(event[0], event[1]) for event in events] == [(1, "sync")]
+    assert len(ring.waiters) == 0
+
+
+def test_event_ring_ids() -> None:
+    """
+    Test EventRing ids are qualified with the boot epoch, and ids from another epoch aren't parsed
+    :return: None
+    """
+    ring = EventRing()
+    sequence = ring.publish("ams", {})
+    assert ring.parse_id(ring.format_id(sequence)) == sequence
+
+    # Handed out by the ring before a restart
+    assert ring.parse_id(f"{ring.epoch - 1}-{sequence}") is None
+    assert ring.parse_id(str(sequence)) is None
+    assert ring.parse_id("not-an-id") is None
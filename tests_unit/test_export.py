@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+import os
+import pytest
+import logging
+
+from spoolman_bambu import export
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+SPOOLS = [
+    {
+        "id": spool_id,
+        "filament": {"id": 1, "name": "PLA Basic", "material": "PLA", "external_id": "bambulab_pla_basic_red"},
+        "remaining_weight": 500.0,
+        "location": "X1",
+        "extra": {"tag": '"UUID0"'} if spool_id == 1 else {},
+        "archived": False,
+    }
+    for spool_id in range(1, 1201)
+]
+
+
+def test_stream_csv_chunks() -> None:
+    """
+    Test stream_csv writes a header and the rows of spools in chunks of CHUNK_ROWS
+    :return: None
+    """
+    chunks = list(export.stream_csv(export.SPOOL_COLUMNS, export.iter_spool_rows(SPOOLS, "tag")))
+    assert len(chunks) == 3
+
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert len(rows) == 1200
+    assert rows[0]["tray_uuid"] == "UUID0"
+    assert rows[0]["material"] == "PLA"
+    assert rows[1]["tray_uuid"] == ""
+
+
+def test_stream_ndjson_trays() -> None:
+    """
+    Test stream_ndjson writes one JSON object per tray row, with only the export columns
+    :return: None
+    """
+    tray_snapshot = [("X1", [{"slot": "A0", "tray_uuid": "UUID0", "colors": ["FF0000FF"], "spool_id": 1}])]
+    chunks = list(export.stream_rows(export.FORMAT_NDJSON, export.TRAY_COLUMNS, export.iter_tray_rows(tray_snapshot)))
+
+    [row] = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert list(row.keys()) == list(export.TRAY_COLUMNS)
+    assert row["printer_id"] == "X1"
+    assert row["colors"] == ["FF0000FF"]
+    assert row["remain"] is None
@@ -0,0 +1,80 @@
+import os
+import json
+import pytest
+import logging
+
+from spoolman_bambu.log import JsonFormatter, RateLimitFilter
+
+# Set Logging
+logging.basicConfig(level=logging.BASIC_FORMAT)
+
+
+def make_record(
+    msg, level=logging.INFO, args=(), extra=None, name="spoolman_bambu.bambu.ams_processor"
+) -> logging.LogRecord:
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    for key, value in (extra or {}).items():
+        setattr(record, key, value)
+    return record
+
+
+def test_rate_limit_filter_suppresses_repeats() -> None:
+    """
+    Test RateLimitFilter suppresses a message type after the rate limit, but not other types or warnings
+    :return: None
+    """
+    rate_filter = RateLimitFilter(rate_limit=2)
+    assert rate_filter.filter(make_record("tray %s", args=(1,)))
+    assert rate_filter.filter(make_record("tray %s", args=(2,)))
+    assert not rate_filter.filter(make_record("tray %s", args=(3,)))
+    assert rate_filter.filter(make_record("other"))
+    assert rate_filter.filter(make_record("tray %s", level=logging.WARNING, args=(4,)))
+
+
+def test_rate_limit_filter_skips_other_loggers() -> None:
+    """
+    Test RateLimitFilter leaves the records of loggers outside the printers' report handling alone
+    :return: None
+    """
+    rate_filter = RateLimitFilter(rate_limit=1)
+    for name in ("uvicorn.access", "spoolman_bambu.api.v1.printer", "spoolman_bambu.bambuish"):
+        assert all(rate_filter.filter(make_record("request", name=name)) for _ in range(3))
+    assert rate_filter.filter(make_record("request", name="spoolman_bambu.bambu"))
+    assert not rate_filter.filter(make_record("request", name="spoolman_bambu.bambu"))
+
+
+def test_rate_limit_filter_reports_suppressed() -> None:
+    """
+    Test RateLimitFilter notes how many records were suppressed once the period rolls over
+    :return: None
+    """
+    rate_filter = RateLimitFilter(rate_limit=1, period=60)
+    assert rate_filter.filter(make_record("tray"))
+    assert not rate_filter.filter(make_record("tray"))
+    rate_filter.period = 0
+    record = make_record("tray")
+    assert rate_filter.filter(record)
+    assert record.suppressed == 1
+
+
+def test_rate_limit_filter_samples() -> None:
+    """
+    Test RateLimitFilter keeps one in every sample_rate records
+    :return: None
+    """
+    rate_filter = RateLimitFilter(rate_limit=0)
+    kept = [rate_filter.filter(make_record("sampled", extra={"sample_rate": 3})) for _ in range(6)]
+    assert kept == [True, False, False, True, False, False]
+
+
+def test_json_formatter_includes_extra() -> None:
+    """
+    Test JsonFormatter formats the message lazily and includes structured extra fields
+    :return: None
+    """
+    record = make_record("tray %s", args=("A0",), extra={"printer_id": "X1", "sample_rate": 10})
+    doc = json.loads(JsonFormatter().format(record))
+    assert doc["message"] == "tray A0"
+    assert doc["printer_id"] == "X1"
+    assert "sample_rate" not in doc
+    assert doc["level"] == "INFO"
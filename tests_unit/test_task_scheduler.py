@@ -1,27 +1,45 @@
-import os
 import pytest
 import logging
 
-from spoolman_bambu.task_scheduler import get_spoolman_sync_interval
+from spoolman_bambu import env
+from spoolman_bambu.task_scheduler import _replay_journal, spoolman_schedule_tasks
 
 # Set Logging
 logging.basicConfig(level=logging.BASIC_FORMAT)
 
 
-def test_get_spoolman_sync_interval_default() -> None:
+def test_spoolman_healthcheck_interval_default(data_dir, monkeypatch) -> None:
     """
-    Test get_spoolman_sync_interval function with default
+    Test the Spoolman health check interval defaults to 600 seconds
     :return: None
     """
-    response = get_spoolman_sync_interval()
-    assert response == 600
+    monkeypatch.delenv("SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_INTERVAL", raising=False)
+    assert env.get_settings().spoolman_healthcheck_interval == 600
 
 
-def test_get_spoolman_sync_interval_env_var() -> None:
+def test_spoolman_healthcheck_interval_env_var(data_dir, monkeypatch) -> None:
     """
-    Test get_spoolman_sync_interval function with env var[SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_INTERVAL] set
+    Test the Spoolman health check interval with env var[SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_INTERVAL] set
     :return: None
     """
-    os.environ["SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_INTERVAL"] = "1200"
-    response = get_spoolman_sync_interval()
-    assert response == 1200
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_INTERVAL", "1200")
+    assert env.get_settings().spoolman_healthcheck_interval == 1200
+
+
+def test_journal_replayed_without_health_checks(data_dir, monkeypatch) -> None:
+    """
+    Test journaled writes are still replayed when the periodic health check is disabled
+    :return: None
+    """
+    monkeypatch.setenv("SPOOLMAN_BAMBU_SPOOLMAN_HEALTHCHECK_INTERVAL", "0")
+    scheduled = []
+
+    class FakeScheduler:
+        def once(self, delay, task, **kwargs):
+            scheduled.append(("once", task))
+
+        def cyclic(self, interval, task, **kwargs):
+            scheduled.append(("cyclic", task))
+
+    spoolman_schedule_tasks(FakeScheduler())
+    assert scheduled == [("cyclic", _replay_journal)]